@@ -25,13 +25,132 @@ class Storage ( ):
 		return pformat( self.__dict__, indent=2)
 	__repr__ = __str__
 
+class ParamKeys ( object ):
+	"""\
+The keys and model values of one parameter at one stochastic point, shared by
+every TreeNode at that point.  The keys are in the same order as every rate
+and value vector of the tree's Params of this parameter and point.
+"""
+	__slots__ = ('name', 'spoint', 'param', 'model_keys', 'my_keys', 'index',
+	             'values', 'string_keys', 'rates', 'shared')
+
+	def __init__ ( self, name, spoint, param, model_keys, my_keys, string_keys ):
+		self.name        = name
+		self.spoint      = spoint
+		self.param       = param
+		self.model_keys  = model_keys   # these keys are linked -- in the same
+		self.my_keys     = my_keys      #   order -- for zip()-ability
+		self.index       = dict( (k, i) for i, k in enumerate(my_keys) )
+		self.values      = tuple( param[ k ].value for k in model_keys )
+		self.string_keys = string_keys  # for later, string keys
+		self.rates       = dict()       # decision rates -> rate vector
+		self.shared      = dict()       # parent ParamKeys -> key positions
+
+	def rate_vector ( self, rates ):
+		"""\
+Return the rate of each key under a decision's rates: the rate of the first
+(pattern, rate) pair whose pattern matches the key, or 1.  Computed once per
+decision, and shared by every node of it at this point.
+"""
+		try:
+			return self.rates[ rates ]
+		except KeyError:
+			pass
+
+		patterns = [ (pattern.split(','), r) for pattern, r in rates ]
+		vector = list()
+		for mine in self.my_keys:
+			rate = 1
+			for keys, r in patterns:
+				match = True
+				for p, t in zip(keys, mine):  # "pattern", "test"
+					if '*' == p: continue
+					if t != p:
+						match = False
+						break
+				if match:
+					rate = r
+					break
+			vector.append( rate )
+
+		vector = self.rates[ rates ] = tuple( vector )
+		return vector
+
+	def shared_with ( self, parent ):
+		"""\
+Return the (my position, parent's position) pairs of the keys this point
+shares with the parent's point.
+"""
+		try:
+			return self.shared[ parent ]
+		except KeyError:
+			pass
+
+		pairs = tuple(
+		  (self.index[ k ], j)
+		  for j, k in enumerate( parent.my_keys )
+		  if k in self.index
+		)
+		self.shared[ parent ] = pairs
+		return pairs
+
+
+# (parameter name, stochastic point) -> ParamKeys
+param_keys = dict()
+
+def get_param_keys ( name, spoint, pidx ):
+	"""\
+Return the ParamKeys of the parameter name at spoint.  The parameter's keys
+are read from the model and split by stochastic point once, on the first call
+for the parameter, rather than once per tree node.
+"""
+	try:
+		return param_keys[ name, spoint ]
+	except KeyError:
+		pass
+
+	param = getattr( instance, name ) # intentionally die if not found.
+	pindex = param.index()
+
+	if isinstance( pindex, _SetProduct ):
+		string_keys = lambda model_keys: (
+		  ' '.join(str(i) for i in k) for k in model_keys )
+
+	elif isinstance( pindex, _SetContainer):
+		# this is under sparse keys
+		string_keys = lambda model_keys: (
+		  ' '.join(str(i) for i in model_keys) )
+
+	# we filter out the spoint because it's inherently known by TreeNode,
+	# which "owns" the Param
+	by_spoint = dict()
+	for key in param.keys():
+		mine = tuple(key[0:pidx] + key[pidx+1:])
+		    # reduce keys to remove stochastic parameter
+		by_spoint.setdefault( key[pidx], ([], []) )
+		by_spoint[ key[pidx] ][0].append( key )
+		by_spoint[ key[pidx] ][1].append( mine )
+
+	for point, (model_keys, my_keys) in by_spoint.iteritems():
+		param_keys[ name, point ] = ParamKeys(
+		  name, point, param, model_keys, my_keys, string_keys )
+
+	if (name, spoint) not in param_keys:
+		param_keys[ name, spoint ] = ParamKeys(
+		  name, spoint, param, [], [], string_keys )
+
+	return param_keys[ name, spoint ]
+
+
 class Param ( object ):
 	# will be common to all Parameters, so no sense in storing it N times
 	stochasticset = None
 
-	  # this saves a noticeable amount of memory, and mild decrease in time
-	__slots__ = ('items', 'name', 'spoint', 'param', 'my_keys', 'model_keys',
-	             'skeys')
+	  # Every node has a Param per stochastic parameter, so a Param holds only
+	  # references to what the nodes of its point and decision share: the keys
+	  # and model values, and the rate vector.  Its own values exist only while
+	  # its node's file is written (see TreeNode.write_dat_files).
+	__slots__ = ('keys', 'rates', 'values')
 
 	def __init__ ( self, **kwargs ):
 
@@ -43,71 +162,46 @@ class Param ( object ):
 		rates  = kwargs.pop('rates')   # how much to vary the parameter
 		pidx   = int( kwargs.pop('stochastic_index') )
 
-		param = getattr( instance, name ) # intentionally die if not found.
+		self.keys   = get_param_keys( name, spoint, pidx )
+		self.rates  = self.keys.rate_vector( tuple(rates) )
+		self.values = None    # until inherit(); the model's values
 
-		indices = tuple()
-		pindex = param.index()
+	name       = property( lambda self: self.keys.name )
+	spoint     = property( lambda self: self.keys.spoint )
+	param      = property( lambda self: self.keys.param )
+	my_keys    = property( lambda self: self.keys.my_keys )
+	model_keys = property( lambda self: self.keys.model_keys )
 
-		if isinstance( pindex, _SetProduct ):
-			getname = lambda x: x.name
-			indices = [ getname(i) for i in param._index_set ]
-			skeys = lambda: (' '.join(str(i) for i in k) for k in self.model_keys)
+	def skeys ( self ):
+		return self.keys.string_keys( self.keys.model_keys )
 
-			keys = param.keys()
-			f = lambda x: x[pidx] == spoint
-			r = lambda x: tuple(x[0:pidx] + x[pidx+1:])
-			    # reduce keys to remove stochastic parameter
 
-		elif isinstance( pindex, _SetContainer):
-			# this is under sparse keys
-			indices = (param._index.name,)
-			skeys = lambda: (' '.join(str(i) for i in self.model_keys) )
-
-			keys = param.keys()
-			f = lambda x: x[pidx] == spoint
-			r = lambda x: tuple(x[0:pidx] + x[pidx +1:])
-
-		# we filter out the spoint because it's inherently known by TreeNode,
-		# which "owns" /this/ Param
-		model_keys = filter( f, keys )
-		my_keys    = map( r, model_keys )
-
-		items = dict()
-
-		for actual, mine in zip(model_keys, my_keys):
-			rate = 1
-			for pattern, r in rates:
-				keys = pattern.split(',')
-				match = True
-				for p, t in zip(keys, mine):  # "pattern", "test"
-					if '*' == p: continue
-					if t != p:
-						match = False
-						break
-				if match:
-					rate = r
-					break
+	def current ( self ):
+		if self.values is None:
+			return self.keys.values
+		return self.values
 
-			items[ mine ] = Storage()
-			items[ mine ].value = param[ actual ].value   # pulled from model
-			items[ mine ].rate  = rate
 
-		self.items      = items
-		self.name       = name
-		self.spoint     = spoint
-		self.param      = param
-		self.my_keys    = my_keys      # these keys are linked -- in the same
-		self.model_keys = model_keys   #   order -- for zip()-ability
-		self.skeys      = skeys        # for later, string keys
+	def inherit ( self, parent ):
+		"""\
+Set this node's values: those of the parent's at the keys they share, times
+this node's rates, and otherwise the model's.
+"""
+		values = list( self.keys.values )
+		pvalues = parent.current()
+		rates = self.rates
+		for i, j in self.keys.shared_with( parent.keys ):
+			values[ i ] = pvalues[ j ] * rates[ i ]
+		self.values = values
 
 
 	def __iter__ ( self ):
-		return self.items.__iter__()
+		return iter( self.keys.my_keys )
 
 
 	def __getitem__ ( self, i ):
 		try:
-			return self.items[ i ]
+			pos = self.keys.index[ i ]
 		except:
 			# it's likely the element did not exist, which hopefully means 0?
 			class _tmp:
@@ -115,16 +209,20 @@ class Param ( object ):
 				value = 0
 			return _tmp()
 
+		item = Storage()
+		item.value = self.current()[ pos ]
+		item.rate  = self.rates[ pos ]
+		return item
+
 
 	def __str__ ( self ):
-		x = '; '.join("(%s, %s)" % (self[i].value, self[i].rate) for i in self )
+		x = '; '.join("(%s, %s)" % (v, r) for v, r in zip(self.current(), self.rates))
 		return 'Param(%s): %s' % (self.name, x)
 
 	__repr__ = __str__
 
 
 	def as_ampl ( self, comment='' ):
-		pindex = self.param.index()
 		if comment:
 			comment = '# Decision: %s\n\n' % str(comment)
 
@@ -144,7 +242,7 @@ class Param ( object ):
 			return anonymous_function
 
 		keys = tuple( tuple(i.split()) for i in keys )
-		vals = tuple( self[i].value for i in self.my_keys )
+		vals = self.current()
 		int_padding = max(map( get_int_padding, vals ))
 		str_padding = [
 		  max(map( get_str_padding(i), keys ))
@@ -159,8 +257,7 @@ class Param ( object ):
 
 		data = StringIO()
 		data.write( comment + 'param  %s  :=' % self.name )
-		for actual_key, this_key in sorted( zip( self.model_keys, self.my_keys )):
-			v = self[this_key].value
+		for actual_key, v in sorted( zip( self.model_keys, vals )):
 			int_part = str(int(abs(v)))
 			if int_part != str(abs(v)):
 				dec_part = str(abs(v))[len(int_part):]
@@ -246,11 +343,13 @@ class TreeNode ( object ):
 		# Step 2: Tell my children to write their files
 		for c in self.children:
 			for p in self.params:
-				cp = c.params[p]
-				for key in self.params[p]:
-					cp[key].value = self.params[p][key].value * cp[key].rate
+				c.params[p].inherit( self.params[p] )
 			c.write_dat_files()
 
+		# Step 3: My values are no longer needed
+		for p in self.params.itervalues():
+			p.values = None
+
 	def get_scenario_data ( self ):
 		nodes     = [ self.bname ]
 		nodestage = [( self.bname, 's' + str(self.spoint) )]
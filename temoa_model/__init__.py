@@ -1,3 +1,8 @@
 __all__ = ('model',)
 
-from temoa_model import model
+import temoa_model as _temoa_model
+from temoa_lib import lazy_model_module
+
+# Importing the package (or any helper module within it) does not declare the
+# model; that happens on the first access to 'model'.
+lazy_model_module(__name__, lambda: _temoa_model.model)
@@ -1,3 +1,31 @@
+from sys import argv
+
+# Subcommands that work on saved results rather than solving a model
+if len(argv) > 1 and 'diff' == argv[1]:
+    from results_diff import main
+    main(argv[2:])
+    raise SystemExit
+
+if len(argv) > 1 and 'convert' == argv[1]:
+    from input_db import main
+    main(argv[2:])
+    raise SystemExit
+
+if len(argv) > 1 and 'lint' == argv[1]:
+    from data_lint import main
+    main(argv[2:])
+    raise SystemExit
+
+if len(argv) > 1 and 'diagrams' == argv[1]:
+    from temoa_graphviz import main
+    main(argv[2:])
+    raise SystemExit
+
+if len(argv) > 1 and 'view' == argv[1]:
+    from diagram_server import main
+    main(argv[2:])
+    raise SystemExit
+
 from temoa_model import model
 from temoa_lib import temoa_solve, TemoaError
 
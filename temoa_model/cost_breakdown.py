@@ -0,0 +1,145 @@
+"""\
+Post-solve attribution of the objective to its loan, fixed, and marginal costs
+by (period, tech, vintage), in discounted and undiscounted terms.
+
+TotalCost_rule weighs each of three variables by a coefficient built only from
+parameters:
+
+  loan      V_CapacityInvest[t, v]
+              * CostInvest * LoanAnnualize * sum of discount factors over the
+                loan's years
+  fixed     V_CapacityFixed[t, v]
+              * CostFixed[p, t, v] * sum of discount factors over the years of
+                period p the process is alive
+  marginal  V_ActivityByPeriodTechAndVintage[p, t, v]
+              * CostMarginal[p, t, v] * PeriodRate[p]
+
+cost_coefficients computes those coefficients once, as arrays (the undiscounted
+variants count years instead of summing discount factors), and attribute_costs
+multiplies them by the solution vectors.  Loan payments are attributed to the
+periods in which they fall, so a loan taken in one period and paid off over
+several is spread across them.  The discounted costs sum to the objective.
+"""
+
+__all__ = ('COST_COLUMNS', 'CostCoefficients', 'attribute_costs',
+           'cost_coefficients', 'write_cost_breakdown')
+
+from array import array
+from bisect import bisect_right
+
+COST_COLUMNS = (
+    'loan', 'fixed', 'marginal',
+    'loan_undiscounted', 'fixed_undiscounted', 'marginal_undiscounted',
+)
+
+
+class CostCoefficients(object):
+    """\
+The objective coefficients of one cost type.  Row n attributes 'discounted[n]'
+(and 'undiscounted[n]') times the value of variable[var_keys[n]] to the (period,
+tech, vintage) keys[n].
+"""
+    __slots__ = ('name', 'variable', 'keys', 'var_keys', 'discounted',
+                 'undiscounted')
+
+    def __init__(self, name, variable):
+        self.name = name
+        self.variable = variable
+        self.keys = list()
+        self.var_keys = list()
+        self.discounted = array('d')
+        self.undiscounted = array('d')
+
+    def append(self, key, var_key, discounted, undiscounted):
+        self.keys.append(key)
+        self.var_keys.append(var_key)
+        self.discounted.append(discounted)
+        self.undiscounted.append(undiscounted)
+
+
+def cost_coefficients(instance):
+    """\
+Return the CostCoefficients of the loan, fixed, and marginal costs of a model
+instance, as a tuple in that order.  Only parameters are read; the solution
+need not be loaded.
+"""
+    from coopr.pyomo import value
+
+    M = instance
+    periods = sorted(M.time_optimize)
+    P_0 = periods[0]
+    GDR = value(M.GlobalDiscountRate)
+
+    loan = CostCoefficients('loan', 'V_CapacityInvest')
+    for t, v in M.CostInvest.sparse_iterkeys():
+        base = value(M.CostInvest[t, v]) * value(M.LoanAnnualize[t, v])
+        by_period = dict()
+        for year in range(v, v + value(M.ModelLoanLife[t, v])):
+            p = periods[max(bisect_right(periods, year) - 1, 0)]
+            disc, years = by_period.get(p, (0.0, 0))
+            by_period[p] = (disc + (1 + GDR) ** (P_0 - year), years + 1)
+        for p in sorted(by_period):
+            disc, years = by_period[p]
+            loan.append((p, t, v), (t, v), base * disc, base * years)
+
+    fixed = CostCoefficients('fixed', 'V_CapacityFixed')
+    for p, t, v in M.CostFixed.sparse_iterkeys():
+        base = value(M.CostFixed[p, t, v])
+        years = value(M.ModelTechLife[p, t, v])
+        disc = sum((1 + GDR) ** -y for y in range(p - P_0, p - P_0 + years))
+        fixed.append((p, t, v), (t, v), base * disc, base * years)
+
+    marginal = CostCoefficients('marginal', 'V_ActivityByPeriodTechAndVintage')
+    for p, t, v in M.CostMarginal.sparse_iterkeys():
+        base = value(M.CostMarginal[p, t, v])
+        marginal.append((p, t, v), (p, t, v), base * value(M.PeriodRate[p]),
+                        base * value(M.PeriodLength[p]))
+
+    return loan, fixed, marginal
+
+
+def attribute_costs(coefficients, sol):
+    """\
+Multiply the 'coefficients' (from cost_coefficients) by the solution values in
+the solution.SolutionArrays 'sol'.  Returns a dictionary of (period, tech,
+vintage) -> list of costs, in the order of COST_COLUMNS.
+"""
+    from operator import mul
+
+    ncosts = len(coefficients)
+    rows = dict()
+    for n, coef in enumerate(coefficients):
+        if coef.variable in sol:
+            values = sol[coef.variable].as_dict()
+        else:
+            values = dict()
+        x = array('d', (values.get(k, 0.0) for k in coef.var_keys))
+
+        disc = map(mul, coef.discounted, x)
+        undisc = map(mul, coef.undiscounted, x)
+        for key, d, u in zip(coef.keys, disc, undisc):
+            if key not in rows:
+                rows[key] = [0.0] * (2 * ncosts)
+            row = rows[key]
+            row[n] += d
+            row[ncosts + n] += u
+
+    return rows
+
+
+def write_cost_breakdown(fname, rows):
+    """\
+Write the output of attribute_costs to fname as CSV, one line per (period,
+tech, vintage), followed by a total line.
+"""
+    from csv import writer
+
+    with open(fname, 'wb') as fp:
+        out = writer(fp)
+        out.writerow(('period', 'tech', 'vintage') + COST_COLUMNS)
+        totals = [0.0] * len(COST_COLUMNS)
+        for key in sorted(rows):
+            row = rows[key]
+            out.writerow(key + tuple(row))
+            totals = map(sum, zip(totals, row))
+        out.writerow(('total', '', '') + tuple(totals))
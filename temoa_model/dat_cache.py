@@ -0,0 +1,161 @@
+"""\
+Per-file cache of parsed dot dat files.
+
+Parsing the AMPL data format is a large share of a short run for the big
+datasets (e.g., iew2012.dat).  read_dat_files parses each file on its own, and
+keeps the result (the ModelData dictionaries) in the dat directory of
+temoa_cache_dir(), keyed by the file's absolute path.  An entry is reused while
+the file keeps its modification time and size, or, if those changed, its
+content hash; when several files are given, only those that changed are parsed
+again, and then merged with the others exactly as ModelData.read merges them.
+
+A file's 'include' commands are not followed when checking whether it changed.
+"""
+
+__all__ = ('read_dat_files',)
+
+import os
+
+# Bump when the layout of the cache entries changes
+_format = 1
+
+
+def _cache_file(fname):
+    from hashlib import sha1
+
+    from temoa_lib import temoa_cache_dir
+
+    cdir = os.path.join(temoa_cache_dir(), 'dat')
+    if not os.path.isdir(cdir):
+        try:
+            os.makedirs(cdir)
+        except OSError:
+            pass    # created concurrently; anything else surfaces on write
+    return os.path.join(cdir, sha1(fname).hexdigest() + '.pickle')
+
+
+def _model_key(model):
+    """\
+Identify what the parser depends on in the model: the names and dimensions of
+the Sets and Params.
+"""
+    from coopr.pyomo import Param, Set
+
+    items = list()
+    for ctype in (Set, Param):
+        components = model.active_components(ctype)
+        items.extend((name, components[name].dim()) for name in sorted(components))
+    return (_format, model.name, tuple(items))
+
+
+def _content_hash(fname):
+    from hashlib import sha1
+
+    digest = sha1()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse(model, fname):
+    from coopr.pyomo import ModelData
+
+    mdata = ModelData()
+    mdata.add(fname)
+    mdata.read(model)
+    return mdata._data, mdata._default
+
+
+def _cached_parse(model, model_key, fname):
+    """\
+Return the (data, default) dictionaries of one file, from the cache if
+possible.  Each cache entry holds two pickles: a small header, which is all
+that is read to validate the entry, and then the parsed data.
+"""
+    from cPickle import load
+
+    fname = os.path.abspath(fname)
+    cache_file = _cache_file(fname)
+    st = os.stat(fname)
+    digest = None
+
+    try:
+        with open(cache_file, 'rb') as f:
+            header = load(f)
+            if header['model'] == model_key:
+                if (header['mtime'], header['size']) == (st.st_mtime, st.st_size):
+                    return load(f)
+                digest = _content_hash(fname)
+                if header['hash'] == digest:
+                    data = load(f)
+                    _write_entry(cache_file, fname, st, digest, model_key, data)
+                    return data
+    except Exception:
+        pass    # missing, unreadable, or from another version: parse anew
+
+    data = _parse(model, fname)
+    _write_entry(cache_file, fname, st, digest or _content_hash(fname),
+                 model_key, data)
+    return data
+
+
+def _write_entry(cache_file, fname, st, digest, model_key, data):
+    from cPickle import dump, HIGHEST_PROTOCOL
+
+    header = dict(path=fname, mtime=st.st_mtime, size=st.st_size, hash=digest,
+                  model=model_key)
+    tmpname = '%s.%d' % (cache_file, os.getpid())
+    try:
+        with open(tmpname, 'wb') as f:
+            dump(header, f, HIGHEST_PROTOCOL)
+            dump(data, f, HIGHEST_PROTOCOL)
+        os.rename(tmpname, cache_file)   # atomic: readers never see half a file
+    except (IOError, OSError):
+        # a cache that can not be written is only a missed opportunity
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+
+def read_dat_files(model, dot_dats, use_cache=True, filters=None):
+    """\
+Return a ModelData for 'model' holding the data of the files 'dot_dats', in
+order (later files add to, or override, earlier ones).  With use_cache=False,
+every file is parsed, and the cache is neither read nor written.
+
+Files ending in one of input_db.INPUT_DB_SUFFIXES are SQLite input databases,
+and directories holding columnar input data are read by input_columns; both
+are read (with the optional 'filters') rather than parsed.
+"""
+    from coopr.pyomo import ModelData
+
+    from input_columns import is_columnar, read_columnar
+    from input_db import INPUT_DB_SUFFIXES, read_input_db
+
+    model_key = use_cache and _model_key(model)
+
+    data, default = dict(), dict()
+    for fname in dot_dats:
+        if fname.lower().endswith(INPUT_DB_SUFFIXES):
+            fdata, fdefault = read_input_db(fname, filters)
+        elif is_columnar(fname):
+            fdata, fdefault = read_columnar(fname, filters)
+        elif use_cache:
+            fdata, fdefault = _cached_parse(model, model_key, fname)
+        else:
+            fdata, fdefault = _parse(model, fname)
+
+        # The same merge ModelData.read performs across files: per component,
+        # a later file's entries update an earlier file's.
+        for namespace, components in fdata.iteritems():
+            merged = data.setdefault(namespace, dict())
+            for name, values in components.iteritems():
+                if name in merged:
+                    merged[name].update(values)
+                else:
+                    merged[name] = values
+        default.update(fdefault)
+
+    mdata = ModelData(model=model, data_dict=data)
+    mdata._default = default
+    return mdata
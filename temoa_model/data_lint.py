@@ -0,0 +1,275 @@
+"""\
+Check Temoa input data for problems before building a model instance.
+
+The model validates its data in BuildActions (validate_time, validate_SegFrac,
+CreateDemands, validate_TechOutputSplit) and warns in
+InitializeProcessParameters, but those run only once the data are loaded into
+Pyomo, and stop at the first error.  lint_data instead makes one pass over the
+raw parsed data (as ModelData, the input database, or the columnar reader
+return it), and reports every problem it finds:
+
+  $ python temoa_model/ lint  data.dat  [more.dat ...]
+
+Errors are what would stop the model; warnings are what the model would warn
+about, plus a few other likely mistakes (e.g., a demand that no process
+supplies).  The exit status is 1 if there were any errors.
+"""
+
+__all__ = ('LintProblem', 'lint_data', 'main')
+
+from itertools import product as cross_product
+from sys import maxint
+
+# The tolerance of the model's own sum checks
+_tolerance = 1e-15
+
+# Param index column -> the Set its items must belong to (see
+# input_db.INPUT_COLUMNS).  Union sets are spelled as tuples of data Sets.
+# Periods must be in time_optimize, and vintages in time_exist or
+# time_optimize (the model's vintage_all).
+_column_sets = {
+    'season':      ('time_season',),
+    'time_of_day': ('time_of_day',),
+    'tech':        ('tech_resource', 'tech_production'),
+    'emission':    ('commodity_emissions',),
+    'input':       ('commodity_physical',),
+    'output':      ('commodity_physical', 'commodity_demand'),
+}
+
+# Columns whose Set is particular to the Param
+_param_column_sets = {
+    ('Demand', 'commodity'):                     ('commodity_demand',),
+    ('DemandSpecificDistribution', 'commodity'): ('commodity_demand',),
+    ('ResourceBound', 'commodity'):              ('commodity_physical',),
+    ('ExistingCapacity', 'vintage'):             ('time_exist',),
+}
+
+
+class LintProblem(object):
+    """One problem found in the data: severity is 'error' or 'warning'."""
+    __slots__ = ('severity', 'component', 'message')
+
+    def __init__(self, severity, component, message):
+        self.severity = severity
+        self.component = component
+        self.message = message
+
+    def __str__(self):
+        return '%s: %s: %s' % (self.severity, self.component, self.message)
+
+
+class _Problems(list):
+    def error(self, component, message, *args):
+        self.append(LintProblem('error', component, message.format(*args)))
+
+    def warning(self, component, message, *args):
+        self.append(LintProblem('warning', component, message.format(*args)))
+
+
+def _group_sums(values, group):
+    sums = dict()
+    for key, val in values.iteritems():
+        g = group(key)
+        sums[g] = sums.get(g, 0) + val
+    return sums
+
+
+def _check_sum(problems, name, total, what=''):
+    if abs(float(total) - 1.0) > _tolerance:
+        problems.error(name, 'values{} sum to {!r}, not 1', what, total)
+
+
+def lint_data(data, default=None, model_defaults=None):
+    """\
+Check 'data' (component name -> values, in ModelData's form; see
+input_db.write_input_db) and the Param 'default's.  'model_defaults' holds the
+defaults declared in the model (e.g., LifetimeTech: 30), for Params the data
+do not give values.  Returns a list of LintProblem.
+"""
+    from input_db import component_columns
+
+    default = dict(model_defaults or (), **(default or {}))
+    problems = _Problems()
+
+    def items(name):
+        values = data.get(name)
+        if values is None:
+            return set()
+        return set(values.get(None, ()))
+
+    def params(name):
+        values = data.get(name, {})
+        if None in values and not isinstance(values[None], (int, long, float)):
+            return dict()
+        return values
+
+    time_exist = items('time_exist')
+    time_horizon = items('time_horizon')
+    time_future = items('time_future')
+    sets = dict((name, items(name)) for name in data
+                if isinstance(data[name].get(None), list))
+
+    # validate_time
+    if not time_horizon:
+        problems.error('time_horizon', 'empty; specify at least one period')
+    if not time_future:
+        problems.error('time_future', 'empty; specify at least one year, so that '
+                       'the final period has a length')
+    if time_horizon and time_future:
+        exist = time_exist and max(time_exist) or -maxint
+        if not exist < min(time_horizon):
+            problems.error('time_horizon', 'all items must be larger than those '
+                           'of time_exist ({} >= {})', exist, min(time_horizon))
+        if not max(time_horizon) < min(time_future):
+            problems.error('time_future', 'all items must be larger than those '
+                           'of time_horizon ({} >= {})', max(time_horizon),
+                           min(time_future))
+    time_optimize = sorted(time_horizon | time_future)[:-1]
+
+    # Set membership of every Param index, one column at a time
+    tech_all = items('tech_resource') | items('tech_production')
+    for name in ('tech_baseload', 'tech_storage'):
+        for t in sorted(items(name) - tech_all):
+            problems.error(name, "'{}' is not in tech_resource or tech_production", t)
+
+    for name in sorted(data):
+        values = params(name)
+        if name in sets or not values or None in values:
+            continue
+        keys = values.keys()
+        columns = component_columns(name, len(keys[0]) if isinstance(keys[0], tuple)
+                                    else 1)
+        for n, column in enumerate(columns):
+            override = _param_column_sets.get((name, column))
+            if 'period' == column:
+                allowed, set_names = set(time_optimize), ('time_optimize',)
+            elif 'vintage' == column and override is None:
+                allowed = time_exist | set(time_optimize)
+                set_names = ('time_exist', 'time_optimize')
+            else:
+                set_names = override or _column_sets.get(column)
+                if set_names is None:
+                    continue
+                allowed = set().union(*(items(s) for s in set_names))
+            if 1 == len(columns):
+                used = set(keys)
+            else:
+                used = set(key[n] for key in keys)
+            for item in sorted(used - allowed):
+                problems.error(name, "{} '{}' is not in {}", column, item,
+                               ' or '.join(set_names))
+
+    # validate_SegFrac
+    segfrac = params('SegFrac')
+    if segfrac:
+        _check_sum(problems, 'SegFrac', sum(segfrac.itervalues()))
+        slices = set(cross_product(items('time_season'), items('time_of_day')))
+        for tslice in sorted(slices - set(segfrac)):
+            problems.warning('SegFrac', 'no value for time slice {}', tslice)
+    else:
+        problems.error('SegFrac', 'no values')
+
+    # CreateDemands
+    demand = params('Demand')
+    used_dems = set(dem for p, dem in demand)
+    for dem in sorted(items('commodity_demand') - used_dems):
+        problems.warning('Demand', "demand '{}' is unused", dem)
+
+    ddd = dict(segfrac)
+    ddd.update(params('DemandDefaultDistribution'))
+    if ddd:
+        _check_sum(problems, 'DemandDefaultDistribution', sum(ddd.itervalues()),
+                   ' (with SegFrac filling unspecified slices)')
+
+    dsd_sums = _group_sums(params('DemandSpecificDistribution'), lambda k: k[2])
+    for dem in sorted(dsd_sums):
+        _check_sum(problems, 'DemandSpecificDistribution', dsd_sums[dem],
+                   " of demand '%s'" % dem)
+
+    # validate_TechOutputSplit
+    split_sums = _group_sums(params('TechOutputSplit'), lambda k: k[:2])
+    for it in sorted(split_sums):
+        _check_sum(problems, 'TechOutputSplit', split_sums[it],
+                   ' of (input, tech) %s' % (it,))
+
+    # InitializeProcessParameters
+    efficiency = params('Efficiency')
+    existing = params('ExistingCapacity')
+    lifetime = params('LifetimeTech')
+    life_default = default.get('LifetimeTech')
+    first_period = time_horizon and min(time_horizon) or None
+    used_techs = set()
+    outputs = set()
+    for (i, t, v, o), eff in sorted(efficiency.iteritems()):
+        if v in time_exist:
+            if (t, v) not in existing:
+                problems.warning('Efficiency', '{} has an Efficiency, but no '
+                                 'ExistingCapacity', (t, v))
+                continue
+            if 0 == existing[t, v]:
+                problems.warning('ExistingCapacity', 'unnecessary zero for {}',
+                                 (t, v))
+                continue
+            life = lifetime.get((t, v), life_default)
+            if life is not None and first_period and v + life <= first_period:
+                problems.warning('LifetimeTech', '{} is ExistingCapacity, but its '
+                                 'lifetime ({}) ends before the first period ({})',
+                                 (t, v), life, first_period)
+                continue
+        if 0 == eff:
+            problems.warning('Efficiency', 'unnecessary zero for {}', (i, t, v, o))
+            continue
+        used_techs.add(t)
+        outputs.add(o)
+
+    for t in sorted(tech_all - used_techs):
+        problems.warning('Efficiency', "technology '{}' is not used", t)
+    for dem in sorted(used_dems - outputs):
+        problems.error('Efficiency', "no process outputs demand '{}'", dem)
+
+    return problems
+
+
+def main(argv):
+    from argparse import ArgumentParser
+    from sys import stdout
+
+    parser = ArgumentParser(
+        prog='temoa lint',
+        description='Check Temoa input data, reporting all problems at once.')
+    parser.add_argument('dot_dat',
+                        help='Dot dat files (merged in order), input databases, or '
+                        'columnar input directories.',
+                        nargs='+')
+    parser.add_argument('--elastic',
+                        help='Parse the data with the elastic demand model.  [Default: '
+                        'the standard model]',
+                        action='store_true',
+                        dest='elastic',
+                        default=False)
+
+    options = parser.parse_args(argv)
+
+    from coopr.pyomo import Param
+
+    from dat_cache import read_dat_files
+
+    if options.elastic:
+        from temoa_elastic_model import model
+    else:
+        from temoa_model import model
+
+    mdata = read_dat_files(model, options.dot_dat)
+    model_defaults = dict(
+        (name, param._default_val)
+        for name, param in model.active_components(Param).iteritems()
+        if param._default_val is not None
+    )
+    problems = lint_data(mdata._data.get(None, {}), mdata._default, model_defaults)
+
+    for problem in problems:
+        stdout.write('%s\n' % problem)
+    errors = sum(1 for p in problems if 'error' == p.severity)
+    stdout.write('%d error(s), %d warning(s)\n' % (errors, len(problems) - errors))
+    if errors:
+        raise SystemExit(1)
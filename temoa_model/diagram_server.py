@@ -0,0 +1,305 @@
+"""\
+A local web server for the diagrams of a solved run, rendered on demand.
+
+temoa_solve's --graph_format renders every diagram up front: for a results
+run, thousands of files, most of which nobody looks at.  Instead, save the
+run's processes and flows with --save_graph, and browse them:
+
+  $ python temoa_model/ utopia-15.dat  --save_graph utopia.graph
+  $ python temoa_model/ view  utopia.graph
+  Serving the diagrams of utopia.graph at http://localhost:8000/
+
+As with the diagrams command, --solution or --db shows the results of another
+solution of the same processes instead of those saved with the graph:
+
+  $ python temoa_model/ view  utopia.graph  --db results.sqlite utopia-high
+
+A diagram is rendered the first time it is requested (the DOT files of its
+family are written then too), and kept in the diagrams directory of
+temoa_cache_dir().  The links within the diagrams, to commodities, processes,
+and periods, lead to further diagrams, each rendered in turn.  The cached
+images are bounded by size (TEMOA_DIAGRAM_CACHE_MB, default 256 MB): when an
+image is rendered, the least recently viewed images are removed until the
+total fits.
+"""
+
+__all__ = ('DiagramCache', 'main')
+
+import os
+import re
+
+# Diagram name (the image file name without its format, relative to the
+# images directory) -> the diagram family that writes it.  The first match wins.
+_families = tuple((re.compile(pattern + '$'), family) for pattern, family in (
+    (r'all_vintages_model',                 'CreateCompleteEnergySystemDiagram'),
+    (r'simple_model',                       'CreateMainModelDiagram'),
+    (r'commodities/commodity_.+',           'CreateCommodityPartialGraphs'),
+    (r'commodities/rc_.+',                  'CreateCommodityPartialResults'),
+    (r'processes/process_.+',               'CreateProcessPartialGraphs'),
+    (r'results/results\d+',                 'CreateMainResultsDiagram'),
+    (r'results/results_.+_p\d+v\d+_segments', 'CreatePartialSegmentsDiagram'),
+    (r'results/results_.+',                 'CreateTechResultsDiagrams'),
+))
+
+_content_types = {
+    'gif':  'image/gif',
+    'jpg':  'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'pdf':  'application/pdf',
+    'png':  'image/png',
+    'svg':  'image/svg+xml',
+}
+
+
+def _cache_limit():
+    return int(os.environ.get('TEMOA_DIAGRAM_CACHE_MB', 256)) << 20
+
+
+def _family(name):
+    for pattern, family in _families:
+        if pattern.match(name):
+            return family
+    return None
+
+
+class DiagramCache(object):
+    """\
+The DOT files and rendered images of one GraphModel, kept in the directory
+dname.  'options' are the Graphviz options of temoa_graphviz.diagram_kwargs.
+
+The total size of the cached images (of all runs, in dname's parent) is
+counted once, here, and then kept up to date as images are rendered, so the
+cache is only walked again when the total may be over the limit.
+"""
+
+    def __init__(self, graph, dname, image_format, options):
+        from temoa_graphviz import diagram_kwargs
+
+        self.graph = graph
+        self.dname = dname
+        self.image_format = image_format
+        self.kwargs = diagram_kwargs(graph, os.path.basename(dname), image_format,
+                                     options)
+        self.dot_files = dict()   # family -> set of the DOT files it wrote
+
+        for subdir in ('commodities', 'processes', 'results'):
+            subdir = os.path.join(dname, subdir)
+            if not os.path.isdir(subdir):
+                os.makedirs(subdir)
+
+        self.limit = _cache_limit()
+        self.image_bytes = _trim(os.path.dirname(dname), self.limit)
+
+    def _write_family(self, family):
+        import temoa_graphviz
+
+        # The diagram functions write their files relative to the current
+        # directory, as they would in the images directory
+        cwd = os.getcwd()
+        os.chdir(self.dname)
+        try:
+            written = getattr(temoa_graphviz, family)(**self.kwargs)
+        finally:
+            os.chdir(cwd)
+        self.dot_files[family] = set(dot_fname for dot_fname, digest in written)
+
+    def image(self, name):
+        """\
+Return the file name of the image of the diagram 'name' (e.g.,
+'results/results2000'), rendering it if it is not cached, or None if the
+graph has no such diagram.  Raises RuntimeError if Graphviz fails.
+"""
+        from subprocess import call
+
+        from temoa_graphviz import _results_families
+
+        family = _family(name)
+        if family is None:
+            return None
+        if family in _results_families and not self.graph.has_results:
+            return None
+        if family not in self.dot_files:
+            self._write_family(family)
+        dot_fname = name + '.dot'
+        if dot_fname not in self.dot_files[family]:
+            return None
+
+        dot_fname = os.path.join(self.dname, dot_fname)
+        image = os.path.join(self.dname, '%s.%s' % (name, self.image_format))
+        old_size = 0
+        if os.path.exists(image):
+            if os.path.getmtime(image) >= os.path.getmtime(dot_fname):
+                os.utime(image, None)   # recently used
+                return image
+            old_size = os.path.getsize(image)
+
+        if call(('dot', '-T' + self.image_format, '-o' + image, dot_fname)):
+            if os.path.exists(image):
+                os.remove(image)
+            self.image_bytes -= old_size
+            raise RuntimeError('Graphviz failed to render %s' % dot_fname)
+        self.image_bytes += os.path.getsize(image) - old_size
+        if self.image_bytes > self.limit:
+            self.image_bytes = _trim(os.path.dirname(self.dname), self.limit,
+                                     keep=image)
+        return image
+
+
+def _trim(cdir, limit, keep=None):
+    """\
+Remove the least recently used images under cdir (all runs' diagrams) until
+their total size is within limit.  DOT files are small, and are kept, as is
+the image 'keep' (the one about to be served).  Returns the total size of the
+images left.
+"""
+    entries = list()
+    total = 0
+    for dname, subdirs, fnames in os.walk(cdir):
+        for fname in fnames:
+            fname = os.path.join(dname, fname)
+            if fname.endswith('.dot'):
+                continue
+            try:
+                st = os.stat(fname)
+            except OSError:
+                continue   # removed concurrently
+            total += st.st_size
+            if fname != keep:
+                entries.append((st.st_mtime, st.st_size, fname))
+
+    for mtime, size, fname in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(fname)
+        except OSError:
+            pass
+        total -= size
+    return total
+
+
+def _index_page(graph, title, ffmt):
+    """The start page: links to the top level diagrams of each kind."""
+    from cgi import escape
+    from urllib import quote
+
+    def links(heading, items):
+        rows = ''.join('<li><a href="%s.%s">%s</a></li>\n'
+                       % (quote(name), ffmt, escape(str(label)))
+                       for name, label in items)
+        return '<h2>%s</h2>\n<ul>\n%s</ul>\n' % (heading, rows)
+
+    body = links('Model', (('simple_model', 'Energy system'),
+                           ('all_vintages_model', 'All processes')))
+    if graph.has_results:
+        body += links('Results', (('results/results%s' % p, p)
+                                  for p in graph.periods))
+    body += links('Technologies', (('processes/process_%s' % t, t)
+                                   for t in graph.techs
+                                   if t in graph.tech_processes))
+    carriers = sorted(set(graph.processes_by_input) | set(graph.processes_by_output))
+    body += links('Commodities', (('commodities/commodity_%s' % c, c)
+                                  for c in carriers))
+
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+            '<title>%s</title></head>\n<body>\n<h1>%s</h1>\n%s</body></html>\n'
+            % (escape(title), escape(title), body))
+
+
+def _make_handler(cache, index):
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from urllib import unquote
+
+    content_type = _content_types.get(cache.image_format,
+                                      'application/octet-stream')
+
+    class DiagramHandler(BaseHTTPRequestHandler):
+        def _send(self, ctype, data):
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = unquote(self.path.split('?', 1)[0]).lstrip('/')
+            if path in ('', 'index.html'):
+                return self._send('text/html; charset=utf-8', index)
+
+            name, ext = os.path.splitext(path)
+            if ext != '.' + cache.image_format:
+                return self.send_error(404)
+            try:
+                image = cache.image(name)
+            except RuntimeError, e:
+                return self.send_error(500, str(e))
+            if image is None:
+                return self.send_error(404)
+
+            with open(image, 'rb') as f:
+                self._send(content_type, f.read())
+
+    return DiagramHandler
+
+
+def main(argv):
+    from argparse import ArgumentParser
+    from BaseHTTPServer import HTTPServer
+    from hashlib import sha1
+    from sys import stderr as SE
+
+    from temoa_graphviz import add_diagram_arguments, add_results_arguments, \
+        read_graph_results
+
+    parser = ArgumentParser(
+        prog='temoa view',
+        description='Serve the diagrams of a solved run on a local web server, '
+        'rendering each diagram when it is first viewed.')
+    parser.add_argument('graph',
+                        help='A GraphModel saved by the --save_graph option of a solve.')
+    add_results_arguments(parser)
+    parser.add_argument('--port',
+                        help='The port on which to serve.  [Default: 8000]',
+                        type=int,
+                        dest='port',
+                        default=8000)
+    add_diagram_arguments(parser, 'svg')
+
+    options = parser.parse_args(argv)
+    ffmt = options.graph_format.lower()
+
+    from temoa_lib import temoa_cache_dir
+
+    graph = read_graph_results(parser, options)
+
+    # One directory per saved graph and the results shown, so its diagrams
+    # survive between sessions
+    digest = sha1()
+    with open(options.graph, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), ''):
+            digest.update(chunk)
+    if options.solution or options.db:
+        # the results themselves, whichever file they were read from
+        digest.update(graph.slice_flow_in.tostring())
+        digest.update(graph.slice_flow_out.tostring())
+        digest.update(repr(sorted(graph.capacity.iteritems())))
+        digest.update(repr(sorted(graph.capacity_pt.iteritems())))
+    dname = os.path.join(temoa_cache_dir(), 'diagrams', digest.hexdigest())
+
+    cache = DiagramCache(graph, dname, ffmt, options)
+    title = 'Temoa diagrams: %s' % os.path.basename(options.graph)
+    if options.solution:
+        title += ', %s' % os.path.basename(options.solution)
+    elif options.db:
+        title += ', %s run %s' % (os.path.basename(options.db[0]), options.db[1])
+    index = _index_page(graph, title, ffmt)
+
+    server = HTTPServer(('127.0.0.1', options.port), _make_handler(cache, index))
+    SE.write('Serving the diagrams of %s at http://localhost:%d/  (Ctrl-C to '
+             'stop)\n' % (options.graph, server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
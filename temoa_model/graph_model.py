@@ -0,0 +1,275 @@
+"""\
+The energy system as the diagrams see it, computed once per run.
+
+Every diagram of temoa_graphviz walks the same processes, inputs, and outputs,
+and the results diagrams sum the same flows over the time slices.  A
+GraphModel holds that structure (the processes and their flows) and, once
+load_results is called, the flows of a solution in arrays, one entry per flow
+(period, tech, vintage, input, output):
+
+  graph = GraphModel.from_instance(instance)
+  graph.load_results(InstanceValues(instance))
+  for k, (p, t, v, i, o) in enumerate(graph.flows):
+      graph.flow_in[k], graph.flow_out[k]
+
+CreateModelDiagrams builds it before starting its worker processes, so that
+the (forked) workers share it rather than each compute it again.  It is plain
+data, so it may also be saved (save_graph; temoa_solve's --save_graph) for
+later tools, such as the "view" command (see diagram_server).
+"""
+
+__all__ = ('GRAPH_COMPONENTS', 'GraphModel', 'InstanceValues', 'read_graph',
+           'save_graph')
+
+from array import array
+
+# The solution components load_results reads
+GRAPH_COMPONENTS = (
+    'V_Capacity', 'V_CapacityAvailableByPeriodAndTech', 'V_FlowIn', 'V_FlowOut',
+)
+
+
+class InstanceValues(object):
+    """\
+The solution values loaded in a model instance, with the value(component,
+index, default) method of solution.SolutionArrays.
+"""
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    def value(self, component, index, default=0):
+        comp = getattr(self.instance, component)
+        if index not in comp:
+            return default
+        val = comp[index].value
+        if val is None:
+            return default
+        return val
+
+
+class GraphModel(object):
+    """\
+The processes of a model and, after load_results, the flows of a solution.
+
+Structure:
+  periods, horizon    time_optimize and time_horizon, sorted
+  slices              (season, time_of_day) pairs, in the order of the
+                      per-slice arrays
+  techs, carriers, emissions
+                      tech_all, commodity_carrier, and commodity_emissions
+  processes           sorted (period, tech, vintage) of the processes in use
+  inputs, outputs     (p, t, v) -> sorted tuple of input/output carriers
+  vintages            (p, t) -> sorted tuple of vintages
+  tech_processes      tech -> sorted list of its (p, v)
+  processes_by_input, processes_by_output
+                      carrier -> set of (t, v) taking/producing it
+  flows               (p, t, v, i, o) of every flow, sorted;
+                      flow_index is the inverse
+  process_flows       (p, t, v) -> list of the positions of its flows
+  emission_activity   (e, i, t, v, o) -> EmissionActivity
+
+Results (None until load_results):
+  flow_in, flow_out   array('d') of each flow, summed over the slices
+  slice_flow_in, slice_flow_out
+                      array('d') of len(flows) * len(slices); the slices of
+                      flow k are at [k * len(slices) : (k + 1) * len(slices)]
+  capacity            (t, v) -> V_Capacity
+  capacity_pt         (p, t) -> V_CapacityAvailableByPeriodAndTech
+  activity            (p, t, v) -> total output of the process
+  energy_in           (p, i, t) -> total input of carrier i to tech t
+  energy_out          (p, t, o) -> total output of carrier o by tech t
+  emission_out        (e, p, t) -> total emission e by tech t
+"""
+
+    def __init__(self, periods, horizon, seasons, times_of_day, techs, carriers,
+                 emissions, inputs, outputs, emission_activity):
+        self.periods = sorted(periods)
+        self.horizon = sorted(horizon)
+        self.slices = [(s, d) for s in sorted(seasons) for d in sorted(times_of_day)]
+        self.techs = sorted(techs)
+        self.carriers = sorted(carriers)
+        self.emissions = sorted(emissions)
+        self.inputs = dict((ptv, tuple(sorted(c))) for ptv, c in inputs.iteritems())
+        self.outputs = dict((ptv, tuple(sorted(c))) for ptv, c in outputs.iteritems())
+        self.emission_activity = dict(emission_activity)
+
+        self.processes = sorted(self.inputs)
+        self.vintages = dict()
+        self.tech_processes = dict()
+        self.processes_by_input = dict()
+        self.processes_by_output = dict()
+        self.flows = list()
+        self.process_flows = dict()
+        for p, t, v in self.processes:
+            self.vintages.setdefault((p, t), list()).append(v)
+            self.tech_processes.setdefault(t, list()).append((p, v))
+            for i in self.inputs[p, t, v]:
+                self.processes_by_input.setdefault(i, set()).add((t, v))
+            for o in self.outputs[p, t, v]:
+                self.processes_by_output.setdefault(o, set()).add((t, v))
+
+            flows = self.process_flows[p, t, v] = list()
+            for i in self.inputs[p, t, v]:
+                for o in self.outputs[p, t, v]:
+                    flows.append(len(self.flows))
+                    self.flows.append((p, t, v, i, o))
+        for pt in self.vintages:
+            self.vintages[pt] = tuple(self.vintages[pt])
+        self.flow_index = dict((flow, k) for k, flow in enumerate(self.flows))
+
+        self.flow_in = self.flow_out = None
+        self.slice_flow_in = self.slice_flow_out = None
+        self.capacity = self.capacity_pt = self.activity = None
+        self.energy_in = self.energy_out = self.emission_out = None
+
+    @classmethod
+    def from_instance(cls, M):
+        """\
+Build the structure from a model instance, and the process data that
+temoa_lib.InitializeProcessParameters computed for it (in this process).
+"""
+        from coopr.pyomo import value
+
+        from temoa_lib import g_processInputs, g_processOutputs
+
+        return cls(
+            periods=M.time_optimize,
+            horizon=M.time_horizon,
+            seasons=M.time_season,
+            times_of_day=M.time_of_day,
+            techs=M.tech_all,
+            carriers=M.commodity_carrier,
+            emissions=M.commodity_emissions,
+            inputs=g_processInputs,
+            outputs=g_processOutputs,
+            emission_activity=dict(
+                (index, value(rate))
+                for index, rate in M.EmissionActivity.sparse_iteritems()
+            ),
+        )
+
+    @property
+    def has_results(self):
+        return self.flow_in is not None
+
+    def load_results(self, values):
+        """\
+Read the flows and capacities of a solution.  'values' is anything with the
+value(component, index, default) method of solution.SolutionArrays (e.g., a
+SolutionArrays, or InstanceValues), and holds the GRAPH_COMPONENTS.  The other
+results are summed from the flows, as the model's constraints define them.
+Raises ValueError if a SolutionArrays lacks any of the GRAPH_COMPONENTS (e.g.,
+one saved with --solution_components).
+"""
+        if isinstance(values, dict):
+            missing = [c for c in GRAPH_COMPONENTS if c not in values]
+            if missing:
+                msg = 'The solution has no values of %s (results need all of %s)'
+                raise ValueError(msg % (', '.join(missing),
+                                        ', '.join(GRAPH_COMPONENTS)))
+
+        n = len(self.slices)
+        fin, fout = array('d'), array('d')
+        for p, t, v, i, o in self.flows:
+            for s, d in self.slices:
+                index = (p, s, d, i, t, v, o)
+                fin.append(values.value('V_FlowIn', index, 0))
+                fout.append(values.value('V_FlowOut', index, 0))
+        self.slice_flow_in, self.slice_flow_out = fin, fout
+        self.flow_in = array('d', (sum(fin[k:k + n]) for k in xrange(0, len(fin), n)))
+        self.flow_out = array('d', (sum(fout[k:k + n]) for k in xrange(0, len(fout), n)))
+
+        self.capacity = dict(
+            ((t, v), values.value('V_Capacity', (t, v), 0))
+            for p, t, v in self.processes
+        )
+        self.capacity_pt = dict(
+            (pt, values.value('V_CapacityAvailableByPeriodAndTech', pt, 0))
+            for pt in self.vintages
+        )
+
+        self.activity = dict.fromkeys(self.processes, 0)
+        self.energy_in, self.energy_out = dict(), dict()
+        for k, (p, t, v, i, o) in enumerate(self.flows):
+            self.activity[p, t, v] += self.flow_out[k]
+            self.energy_in[p, i, t] = self.energy_in.get((p, i, t), 0) + self.flow_in[k]
+            self.energy_out[p, t, o] = self.energy_out.get((p, t, o), 0) + self.flow_out[k]
+
+        self.emission_out = dict()
+        for (e, i, t, v, o), rate in self.emission_activity.iteritems():
+            for p in self.periods:
+                k = self.flow_index.get((p, t, v, i, o))
+                if k is not None:
+                    self.emission_out[e, p, t] = (
+                        self.emission_out.get((e, p, t), 0) + rate * self.flow_out[k])
+
+    def top_flows(self, period, top=None, min_share=None, epsilon=0):
+        """\
+Select the larger energy flows of period, for a results diagram of a large
+system: the 'top' largest input and output flows (energy_in, energy_out), of
+those at least min_share of the period's total.  Either limit may be None.
+Flows below epsilon are left out altogether.  Returns (inputs, outputs,
+other_in, other_out, others):
+
+  inputs      (i, t) -> energy_in of each input flow kept
+  outputs     (t, o) -> energy_out of each output flow kept
+  other_in    i -> total energy_in of carrier i over the flows not kept
+  other_out   o -> total energy_out of carrier o over the flows not kept
+  others      the techs with a flow not kept
+"""
+        flows = [((i, t), 'in', val) for (p, i, t), val in self.energy_in.iteritems()
+                 if p == period and val >= epsilon]
+        flows.extend(((t, o), 'out', val)
+                     for (p, t, o), val in self.energy_out.iteritems()
+                     if p == period and val >= epsilon)
+        flows.sort(key=lambda flow: (-flow[2], flow[1], flow[0]))
+
+        floor = 0
+        if min_share is not None:
+            floor = min_share * sum(val for edge, kind, val in flows)
+
+        inputs, outputs, other_in, other_out = dict(), dict(), dict(), dict()
+        others = set()
+        for n, (edge, kind, val) in enumerate(flows):
+            kept = (top is None or n < top) and val >= floor
+            if 'in' == kind:
+                i, t = edge
+                if kept:
+                    inputs[edge] = val
+                    continue
+                other_in[i] = other_in.get(i, 0) + val
+            else:
+                t, o = edge
+                if kept:
+                    outputs[edge] = val
+                    continue
+                other_out[o] = other_out.get(o, 0) + val
+            others.add(t)
+
+        return inputs, outputs, other_in, other_out, others
+
+    def slice_flows(self, k):
+        """\
+Return the per-slice (flow in, flow out) of flow k, as two arrays in the order
+of self.slices.
+"""
+        n = len(self.slices)
+        return (self.slice_flow_in[k * n:(k + 1) * n],
+                self.slice_flow_out[k * n:(k + 1) * n])
+
+
+def save_graph(graph, fname):
+    """Write a GraphModel to fname (a binary pickle)."""
+    from cPickle import dump, HIGHEST_PROTOCOL
+
+    with open(fname, 'wb') as f:
+        dump(graph, f, HIGHEST_PROTOCOL)
+
+
+def read_graph(fname):
+    """Read a GraphModel previously written by save_graph."""
+    from cPickle import load
+
+    with open(fname, 'rb') as f:
+        return load(f)
@@ -0,0 +1,194 @@
+"""\
+Columnar binary input data: a directory (named *.columns) holding the model's
+data as .npy arrays, so that the big Params (CapacityFactor,
+DemandSpecificDistribution, Efficiency, EmissionActivity, ...) are read with a
+few bulk copies instead of being parsed from text.
+
+Every indexed Param is stored as one int32 code array per index column,
+<Param>.<column>.npy, plus a float64 <Param>.value.npy.  A code is a position
+in the column's list of distinct values ("levels").  The levels, the Sets, the
+scalar Params, and the Param defaults are small, and are kept in
+temoa_columns.json:
+
+  {"format": 1,
+   "sets": {"time_horizon": [1990, 2000], ...},
+   "scalars": {"GlobalDiscountRate": 0.05},
+   "defaults": {...},
+   "params": {"Efficiency": {"columns": ["input", "tech", "vintage", "output"],
+                             "levels": [["coal", ...], ...],
+                             "integer": false, "rows": 1234}, ...}}
+
+Params whose values are all integers are flagged as such, and read back as
+integers.  The .npy files may also be memory-mapped by NumPy users.  Convert
+with the "convert" command (see input_db):
+
+  $ python temoa_model/ convert  temoa_island.dat  temoa_island.columns
+  $ python temoa_model/ convert  --benchmark  temoa_island.dat  temoa_island.columns
+"""
+
+__all__ = ('COLUMNAR_SUFFIX', 'benchmark', 'is_columnar', 'read_columnar',
+           'write_columnar')
+
+import os
+
+COLUMNAR_SUFFIX = '.columns'
+
+_format = 1
+_meta_file = 'temoa_columns.json'
+
+
+def is_columnar(fname):
+    """Return True if fname is a columnar input directory."""
+    return os.path.isfile(os.path.join(fname, _meta_file))
+
+
+def _tuple(key):
+    if isinstance(key, tuple):
+        return key
+    return (key,)
+
+
+def _native(val):
+    # json returns unicode strings; the model's data are str
+    if isinstance(val, unicode):
+        return str(val)
+    if isinstance(val, list):
+        return tuple(_native(i) for i in val)
+    return val
+
+
+def write_columnar(dname, data, default=None):
+    """\
+Write 'data' and 'default' (in the form input_db.write_input_db takes) to the
+columnar input directory dname, which is created if necessary.
+"""
+    import json
+    from array import array
+
+    from input_db import component_columns
+    from utils import write_npy_array
+
+    if not os.path.isdir(dname):
+        os.makedirs(dname)
+
+    meta = dict(format=_format, sets=dict(), scalars=dict(), params=dict(),
+                defaults=dict(default or ()))
+    for name in sorted(data):
+        values = data[name]
+        if values.keys() == [None]:
+            if isinstance(values[None], list):
+                meta['sets'][name] = values[None]
+            else:
+                meta['scalars'][name] = values[None]
+            continue
+
+        keys = values.keys()
+        # A Param with no values is kept (as zero-length arrays), as in input_db
+        dim = keys and len(_tuple(keys[0])) or 1
+        columns = component_columns(name, dim)
+        items = [_tuple(key) for key in keys]
+        levels = list()
+        for n, column in enumerate(columns):
+            column_levels = sorted(set(item[n] for item in items))
+            code_of = dict((val, code) for code, val in enumerate(column_levels))
+            codes = array('i', (code_of[item[n]] for item in items))
+            write_npy_array(os.path.join(dname, '%s.%s.npy' % (name, column)),
+                            codes, (len(codes),))
+            levels.append(column_levels)
+
+        vals = [values[key] for key in keys]
+        write_npy_array(os.path.join(dname, name + '.value.npy'),
+                        array('d', vals), (len(vals),))
+        meta['params'][name] = dict(
+            columns=columns, levels=levels, rows=len(keys),
+            integer=all(isinstance(v, (int, long)) for v in vals))
+
+    with open(os.path.join(dname, _meta_file), 'w') as f:
+        json.dump(meta, f)
+
+
+def read_columnar(dname, filters=None):
+    """\
+Read a columnar input directory.  Returns (data, default) in the form of
+ModelData's _data and _default dictionaries.  'filters' is as for
+input_db.read_input_db; it is applied to the codes, as the rows are read.
+"""
+    import json
+    from itertools import compress, imap, izip
+
+    from input_db import component_columns
+    from utils import read_npy
+
+    filters = filters or dict()
+    with open(os.path.join(dname, _meta_file)) as f:
+        meta = json.load(f)
+    if meta.get('format') != _format:
+        msg = "Unsupported columnar input format in '%s'"
+        raise ValueError(msg % dname)
+
+    data = dict()
+    for name, items in meta['sets'].iteritems():
+        name = str(name)
+        items = [_native(i) for i in items]
+        column, = component_columns(name, 1)
+        if column in filters:
+            allowed = set(filters[column])
+            items = [i for i in items if i in allowed]
+        data[name] = {None: items}
+    for name, val in meta['scalars'].iteritems():
+        data[str(name)] = {None: _native(val)}
+
+    for name, info in meta['params'].iteritems():
+        name = str(name)
+        columns = [str(c) for c in info['columns']]
+        values, shape = read_npy(os.path.join(dname, name + '.value.npy'))
+        if info['integer']:
+            values = imap(int, values)
+
+        # Each index column is mapped from its codes to its levels as the
+        # dictionary is filled, so no per-row list is built along the way
+        index_columns, masks = list(), list()
+        for column, levels in zip(columns, info['levels']):
+            codes, shape = read_npy(os.path.join(dname, '%s.%s.npy' % (name, column)))
+            levels = [_native(level) for level in levels]
+            if column in filters:
+                allowed = set(filters[column])
+                ok = [level in allowed for level in levels]
+                masks.append(imap(ok.__getitem__, codes))
+            index_columns.append(imap(levels.__getitem__, codes))
+
+        if 1 == len(index_columns):
+            items = izip(index_columns[0], values)
+        else:
+            items = izip(izip(*index_columns), values)
+        if 1 == len(masks):
+            items = compress(items, masks[0])
+        elif masks:
+            items = compress(items, imap(all, izip(*masks)))
+        data[name] = dict(items)
+
+    default = dict((str(name), _native(val))
+                   for name, val in meta['defaults'].iteritems())
+    return {None: data}, default
+
+
+def benchmark(model, dot_dats, dname, repeat=3):
+    """\
+Time reading the same data from the dot dat files (parsed, without the parse
+cache) and from the columnar directory.  Returns (text seconds, columnar
+seconds), each the best of 'repeat' runs.
+"""
+    from time import time
+
+    from dat_cache import read_dat_files
+
+    def best(func):
+        times = list()
+        for n in range(repeat):
+            begin = time()
+            func()
+            times.append(time() - begin)
+        return min(times)
+
+    return (best(lambda: read_dat_files(model, dot_dats, use_cache=False)),
+            best(lambda: read_columnar(dname)))
@@ -0,0 +1,359 @@
+"""\
+SQLite input databases: an alternative to AMPL dot dat files.
+
+Each Set and Param of the model is a table of the same name, with one column
+per index dimension (named, where known, with the same words results_schema
+uses: period, tech, vintage, input, output, ...) and, for Params, a 'value'
+column.  The table temoa_components lists the tables, their kind ('set' or
+'param'), index columns, and Param default.  Because the dimensions are
+columns, a run may load a slice of a large database, with the filtering done
+by SQLite:
+
+  $ python temoa_model/ utopia.sqlite  --input_filter period=1990,2000
+
+A filter applies to every table with that column, Sets included (above, also
+time_horizon and time_future), so it is up to the modeler to choose a slice
+that is itself a consistent model.
+
+Convert between the two forms with
+
+  $ python temoa_model/ convert  utopia-15.dat  utopia.sqlite
+  $ python temoa_model/ convert  utopia.sqlite  utopia.dat
+"""
+
+__all__ = ('INPUT_COLUMNS', 'INPUT_DB_SUFFIXES', 'component_columns',
+           'parse_filters', 'read_input_db', 'write_dat', 'write_input_db', 'main')
+
+import re
+import sqlite3
+
+INPUT_DB_SUFFIXES = ('.db', '.sqlite')
+
+# Index columns of the input Sets and Params.  Components not listed here (or
+# with a different number of dimensions) get generic columns k1, k2, ...
+INPUT_COLUMNS = {
+    'time_exist':                 ('period',),
+    'time_horizon':               ('period',),
+    'time_future':                ('period',),
+    'time_season':                ('season',),
+    'time_of_day':                ('time_of_day',),
+    'tech_resource':              ('tech',),
+    'tech_production':            ('tech',),
+    'tech_baseload':              ('tech',),
+    'tech_storage':               ('tech',),
+    'commodity_demand':           ('commodity',),
+    'commodity_emissions':        ('commodity',),
+    'commodity_physical':         ('commodity',),
+
+    'GlobalDiscountRate':         (),
+    'SegFrac':                    ('season', 'time_of_day'),
+    'CapacityToActivity':         ('tech',),
+    'ExistingCapacity':           ('tech', 'vintage'),
+    'Efficiency':                 ('input', 'tech', 'vintage', 'output'),
+    'CapacityFactor':             ('season', 'time_of_day', 'tech', 'vintage'),
+    'LifetimeTech':               ('tech', 'vintage'),
+    'LifetimeLoan':               ('tech', 'vintage'),
+    'DemandDefaultDistribution':  ('season', 'time_of_day'),
+    'DemandSpecificDistribution': ('season', 'time_of_day', 'commodity'),
+    'Demand':                     ('period', 'commodity'),
+    'ResourceBound':              ('period', 'commodity'),
+    'CostFixed':                  ('period', 'tech', 'vintage'),
+    'CostMarginal':               ('period', 'tech', 'vintage'),
+    'CostInvest':                 ('tech', 'vintage'),
+    'DiscountRate':               ('tech', 'vintage'),
+    'TechOutputSplit':            ('input', 'tech', 'output'),
+    'MinCapacity':                ('period', 'tech'),
+    'MaxCapacity':                ('period', 'tech'),
+    'EmissionLimit':              ('period', 'emission'),
+    'EmissionActivity':           ('emission', 'input', 'tech', 'vintage', 'output'),
+}
+
+_components_table = """\
+CREATE TABLE temoa_components (
+    component     TEXT PRIMARY KEY,
+    kind          TEXT,
+    columns       TEXT,
+    default_value
+) ;
+"""
+
+
+def component_columns(name, dim):
+    """\
+Return the index column names of the 'dim'-dimensional Set or Param 'name'.
+"""
+    columns = INPUT_COLUMNS.get(name)
+    if columns is None or len(columns) != dim:
+        columns = tuple('k%d' % (n + 1) for n in range(dim))
+    return columns
+
+
+def _tuple(key):
+    if isinstance(key, tuple):
+        return key
+    return (key,)
+
+
+def _is_set(values):
+    return values.keys() == [None] and isinstance(values[None], list)
+
+
+def write_input_db(dbfile, data, default=None):
+    """\
+Write 'data', a dictionary of component name -> values in the form of
+ModelData's (a Set's values are {None: [items]}, a Param's {index: value}), and
+the Param defaults 'default', as the tables of the SQLite database 'dbfile'.
+Tables of the same name are replaced.
+"""
+    default = default or dict()
+    con = sqlite3.connect(dbfile)
+    try:
+        with con:
+            con.execute('DROP TABLE IF EXISTS temoa_components')
+            con.execute(_components_table)
+
+            for name in sorted(data):
+                values = data[name]
+                if _is_set(values):
+                    kind, rows = 'set', [_tuple(item) for item in values[None]]
+                    dim = rows and len(rows[0]) or 1
+                    extra = ()
+                elif None in values:
+                    kind, rows, dim = 'param', [(values[None],)], 0
+                    extra = ('value',)
+                else:
+                    kind = 'param'
+                    rows = [_tuple(key) + (val,) for key, val in values.iteritems()]
+                    dim = rows and len(rows[0]) - 1 or 1
+                    extra = ('value',)
+
+                columns = component_columns(name, dim)
+                con.execute('DROP TABLE IF EXISTS "%s"' % name)
+                con.execute('CREATE TABLE "%s" (%s)' % (
+                    name, ', '.join('"%s"' % c for c in columns + extra)))
+                con.executemany('INSERT INTO "%s" VALUES (%s)' % (
+                    name, ', '.join('?' * (len(columns) + len(extra)))), rows)
+                con.execute('INSERT INTO temoa_components VALUES (?, ?, ?, ?)',
+                            (name, kind, ','.join(columns), default.get(name)))
+
+            # Params with a default but no values
+            for name in sorted(set(default) - set(data)):
+                con.execute('INSERT INTO temoa_components VALUES (?, ?, ?, ?)',
+                            (name, 'param', None, default[name]))
+    finally:
+        con.close()
+
+
+def read_input_db(dbfile, filters=None):
+    """\
+Read an input database written by write_input_db.  Returns (data, default) in
+the form of ModelData's _data and _default dictionaries.
+
+filters: optional dictionary of column name -> allowed values.  Every table
+         with that column is read with "WHERE column IN (values)".
+"""
+    filters = filters or dict()
+    con = sqlite3.connect(dbfile)
+    con.text_factory = str
+    data, default = dict(), dict()
+    try:
+        components = con.execute(
+            'SELECT component, kind, columns, default_value FROM temoa_components'
+        ).fetchall()
+        for name, kind, columns, dflt in components:
+            if dflt is not None:
+                default[name] = dflt
+            if columns is None:
+                continue    # only a default
+            columns = columns and columns.split(',') or []
+
+            select = ['"%s"' % c for c in columns]
+            if 'param' == kind:
+                select.append('value')
+            where, args = list(), list()
+            for col in columns:
+                if col in filters:
+                    allowed = list(filters[col])
+                    where.append('"%s" IN (%s)' % (col, ', '.join('?' * len(allowed))))
+                    args.extend(allowed)
+            sql = 'SELECT %s FROM "%s"' % (', '.join(select), name)
+            if where:
+                sql += ' WHERE ' + ' AND '.join(where)
+            rows = con.execute(sql, args)
+
+            if 'set' == kind:
+                if 1 == len(columns):
+                    values = {None: [row[0] for row in rows]}
+                else:
+                    values = {None: [row for row in rows]}
+            elif not columns:
+                values = dict((None, row[0]) for row in rows)
+            elif 1 == len(columns):
+                values = dict(rows)
+            else:
+                values = dict((row[:-1], row[-1]) for row in rows)
+            data[name] = values
+    finally:
+        con.close()
+
+    return {None: data}, default
+
+
+def _ampl(val):
+    if isinstance(val, float):
+        return repr(val)
+    if isinstance(val, tuple):
+        return '(%s)' % ','.join(_ampl(i) for i in val)
+    return str(val)
+
+
+def write_dat(fname, data, default=None):
+    """\
+Write 'data' and 'default' (in the form write_input_db takes) to fname as an
+AMPL dot dat file: first the Sets, then the Params, each in name order.
+"""
+    default = default or dict()
+    names = sorted(data)
+    sets = [name for name in names if _is_set(data[name])]
+    params = [name for name in names if not _is_set(data[name])]
+
+    with open(fname, 'w') as fp:
+        fp.write('data ;\n\n')
+        for name in sets:
+            fp.write('set %s := %s ;\n' % (
+                name, ' '.join(_ampl(item) for item in data[name][None])))
+        fp.write('\n')
+
+        for name in params:
+            values = data[name]
+            dflt = ''
+            if name in default:
+                dflt = ' default %s' % _ampl(default[name])
+            if None in values:
+                fp.write('param %s%s := %s ;\n\n' % (name, dflt, _ampl(values[None])))
+                continue
+            fp.write('param %s%s :=\n' % (name, dflt))
+            fp.writelines(
+                '  %s  %s\n' % (' '.join(_ampl(i) for i in _tuple(key)), _ampl(values[key]))
+                for key in sorted(values))
+            fp.write(';\n\n')
+
+        for name in sorted(set(default) - set(data)):
+            fp.write('param %s default %s ;\n\n' % (name, _ampl(default[name])))
+
+
+def parse_filters(specs):
+    """\
+Turn command line filters like 'period=1990,2000' into the dictionary
+read_input_db takes.  The values of the numeric columns (period, vintage) are
+converted to numbers, and those of the other named columns kept as strings;
+the values of the generic columns (k1, k2, ...) are converted if they look
+like numbers.
+"""
+    from results_schema import NUMERIC_COLUMNS
+    from solution import parse_index
+
+    filters = dict()
+    for spec in specs:
+        column, _, values = spec.partition('=')
+        if not (column and values):
+            raise ValueError("Expecting COLUMN=VALUE[,VALUE...], found '%s'" % spec)
+        numeric = None
+        if not re.match(r'k\d+$', column):
+            numeric = (column in NUMERIC_COLUMNS,) * (values.count(',') + 1)
+        values = parse_index(values, numeric)
+        filters.setdefault(column, set()).update(_tuple(values))
+    return filters
+
+
+def main(argv):
+    from argparse import ArgumentParser
+    from sys import stdout
+
+    from input_columns import COLUMNAR_SUFFIX, benchmark, is_columnar, \
+        read_columnar, write_columnar
+
+    parser = ArgumentParser(
+        prog='temoa convert',
+        description='Convert Temoa input data between AMPL dot dat files, SQLite '
+        'input databases, and columnar input directories.')
+    parser.add_argument('inputs',
+                        help='Dot dat files (merged in order), or one input database or '
+                        'columnar input directory.',
+                        nargs='+',
+                        metavar='INPUT')
+    parser.add_argument('output',
+                        help='The input database (%s), columnar input directory (%s), or '
+                        'dot dat file to write.'
+                        % (', '.join(INPUT_DB_SUFFIXES), COLUMNAR_SUFFIX),
+                        metavar='OUTPUT')
+    parser.add_argument('--elastic',
+                        help='Parse the dot dat files with the elastic demand model.  '
+                        '[Default: the standard model]',
+                        action='store_true',
+                        dest='elastic',
+                        default=False)
+    parser.add_argument('--input_filter',
+                        help='When reading an input database or columnar directory, only '
+                        'read rows whose COLUMN is one of the listed values.  May be '
+                        'specified multiple times.  [Default: read everything]',
+                        action='append',
+                        dest='input_filters',
+                        metavar='COLUMN=VALUE[,VALUE...]',
+                        default=[])
+    parser.add_argument('--benchmark',
+                        help='After converting dot dat files to a columnar directory, time '
+                        'reading the data both ways.  [Default: False]',
+                        action='store_true',
+                        dest='benchmark',
+                        default=False)
+
+    options = parser.parse_args(argv)
+    is_db = lambda f: f.lower().endswith(INPUT_DB_SUFFIXES)
+
+    try:
+        filters = parse_filters(options.input_filters)
+    except ValueError, e:
+        parser.error(str(e))
+
+    first = options.inputs[0]
+    dat_inputs = not (is_db(first) or is_columnar(first))
+    if not dat_inputs and len(options.inputs) > 1:
+        parser.error('only one input database or directory may be converted at '
+                     'a time')
+    if dat_inputs and filters:
+        parser.error('--input_filter applies only to an input database or columnar '
+                     'directory')
+    if options.benchmark:
+        if not dat_inputs:
+            parser.error('--benchmark requires dot dat file inputs')
+        if not options.output.endswith(COLUMNAR_SUFFIX):
+            parser.error('--benchmark requires a columnar (%s) output' % COLUMNAR_SUFFIX)
+
+    if not dat_inputs:
+        if is_db(first):
+            data, default = read_input_db(first, filters)
+        else:
+            data, default = read_columnar(first, filters)
+    else:
+        from dat_cache import read_dat_files
+
+        if options.elastic:
+            from temoa_elastic_model import model
+        else:
+            from temoa_model import model
+        mdata = read_dat_files(model, options.inputs, use_cache=False)
+        data, default = mdata._data, mdata._default
+
+    if is_db(options.output):
+        write_input_db(options.output, data.get(None, {}), default)
+    elif options.output.endswith(COLUMNAR_SUFFIX):
+        write_columnar(options.output, data.get(None, {}), default)
+    else:
+        write_dat(options.output, data.get(None, {}), default)
+
+    if options.benchmark:
+        text, columnar = benchmark(model, options.inputs, options.output)
+        stdout.write('dot dat files: %8.3f s\n' % text)
+        stdout.write('columnar:      %8.3f s  (%.1fx)\n'
+                     % (columnar, text / max(columnar, 1e-9)))
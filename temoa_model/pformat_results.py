@@ -1,7 +1,16 @@
 from sys import stderr as SE
-from cStringIO import StringIO
 
-def pformat_results ( pyomo_instance, pyomo_result ):
+def iter_pformat_results ( pyomo_instance, pyomo_result ):
+	"""\
+Generate the lines (each ending in a newline) of the human-readable summary of
+a solve: the objective value, then all non-zero variable values and binding
+constraint values, lined up on the decimal point.
+
+Lines are yielded in a stable order (by component name, then by element), and
+one component at a time, so that peak memory beyond the solver result itself is
+roughly the size of the largest single component.  The padding widths are
+computed by a cheap first pass over the result values.
+"""
 	from coopr.pyomo import Objective, Var, Constraint
 
 	instance = pyomo_instance
@@ -15,7 +24,8 @@ def pformat_results ( pyomo_instance, pyomo_result ):
 	  'feasible', 'globallyOptimal', 'locallyOptimal', 'optimal'
 	)
 	if str(soln.Status) not in optimal_solutions:
-		return "No solution found."
+		yield "No solution found."
+		return
 
 	objs = instance.active_components( Objective )
 	if len( objs ) > 1:
@@ -42,88 +52,85 @@ def pformat_results ( pyomo_instance, pyomo_result ):
 	Vars = soln.Variable
 	Cons = soln.Constraint
 
-	var_sm = dict()   # variable "symbol mapping"
-	con_sm = dict()
-
-	def create_symbol_map ( smap, stype ):
-		for name, group in instance.active_components( stype ).iteritems():
-			for item in group.itervalues():
-				if item.index.__class__ is tuple:
-					parts = [name, '[', ','.join(str(i) for i in item.index), ']']
-					smap[ item.name ] = (name, ''.join(parts) )
-				else:
-					smap[ item.name ] = (name, item.name )
-
-	create_symbol_map( var_sm, Var )
-	create_symbol_map( con_sm, Constraint )
+	get_var_value = lambda name: Vars[ name ]['Value']
+	get_con_value = lambda name: Cons[ name ].value
 
-	var_info = sorted(
-	  ( var_sm[ var_name ], Vars[ var_name ]['Value'] )
-
-	  for var_name in Vars
-	  if abs(Vars[ var_name ]['Value']) > 1e-15
-	)
-
-	con_info = sorted(
-	  ( con_sm[ con_name ], Cons[ con_name ]['Value'] )
+	def get_int_padding ( val ):
+		return len(str(int(val)))
+	def get_dec_padding ( val ):
+		val = abs( val )
+		return len(str(val - int(val)))
 
-	  for con_name in Cons
-	  if abs(Cons[ con_name ].value) > 1e-15    # i.e. "if it's non-zero"
-	)
+	def get_format ( results, get_value ):
+		# First pass: only the widths are kept, not the values.  This padding
+		# code is what makes the display of the output values line up on the
+		# decimal point.
+		int_padding = dec_padding = 0
+		for name in results:
+			val = get_value( name )
+			if abs(val) > 1e-15:    # i.e. "if it's non-zero"
+				int_padding = max( int_padding, get_int_padding(val) )
+				dec_padding = max( dec_padding, get_dec_padding(val) )
+
+		if not int_padding:
+			return None
+		return "  %%%ds%%-%ds  %%s\n" % (int_padding, dec_padding)
+			# Works out to something like "%8s%-11s  %s"
 
-	# remove the no-longer-necessary sorting key.
-	con_info = [ (con, val) for (sortkey, con), val in con_info ]
-	var_info = [ (var, val) for (sortkey, var), val in var_info ]
+	def format_lines ( stype, results, get_value, format ):
+		for name in sorted( instance.active_components( stype ) ):
+			group = getattr( instance, name )
+			info = list()
+			for item in group.itervalues():
+				if item.name not in results:
+					continue
+				val = get_value( item.name )
+				if not abs(val) > 1e-15:
+					continue
 
-	def get_int_padding ( obj ):
-		val = obj[ 1 ]         # obj is 2-tuple, defined within var_info
-		return len(str(int(val)))
-	def get_dec_padding ( obj ):
-		val = abs(obj[ 1 ])    # obj is 2-tuple defined within con_info
-		return len(str(val - int(val)))
+				if item.index.__class__ is tuple:
+					key = '%s[%s]' % (name, ','.join(str(i) for i in item.index))
+				else:
+					key = item.name
+				info.append( (key, val) )
 
-	run_output = StringIO()
+			info.sort()
+			for key, val in info:
+				int_part = int(abs(val))
+				dec_part = str(abs(val) - int_part)[1:]  # remove (negative and) 0
+				if val < 0: int_part = "-%d" % int_part
+				yield format % (int_part, dec_part, key)
 
 	msg = ( 'Model name: %s\n'
 	   'Objective function value (%s): %s\n'
 	   'Non-zero variable values:\n'
 	)
-	run_output.write( msg % (instance.name, obj_name, obj_value) )
-
-	if len( var_info ) > 0:
-		# This padding code is what makes the display of the output values
-		# line up on the decimal point.
-		int_padding = max(map( get_int_padding, var_info ))
-		dec_padding = max(map( get_dec_padding, var_info ))
-		format = "  %%%ds%%-%ds  %%s\n" % (int_padding, dec_padding)
-			# Works out to something like "%8d%-11s  %s"
-
-		for key, val in var_info:
-			int_part = int(abs(val))
-			dec_part = str(abs(val) - int_part)[1:]  # remove (negative and) 0
-			if val < 0: int_part = "-%d" % int_part
-			run_output.write( format % (int_part, dec_part, key) )
+	yield msg % (instance.name, obj_name, obj_value)
 
+	format = get_format( Vars, get_var_value )
+	if format:
+		for line in format_lines( Var, Vars, get_var_value, format ):
+			yield line
 	else:
-		run_output.write( '\nAll variables have a zero (0) value.\n' )
+		yield '\nAll variables have a zero (0) value.\n'
 
-	if 0 == len( con_info ):
+	format = get_format( Cons, get_con_value )
+	if not format:
 		# Since not all Coopr solvers give constraint results, must check
-		msg = '\nSelected Coopr solver plugin does not give constraint data.\n'
-		run_output.write( msg )
+		yield '\nSelected Coopr solver plugin does not give constraint data.\n'
 	else:
-		msg = '\nBinding constraint values:\n'
-		run_output.write( msg )
+		yield '\nBinding constraint values:\n'
+		for line in format_lines( Constraint, Cons, get_con_value, format ):
+			yield line
 
-		int_padding = max(map( get_int_padding, con_info ))
-		dec_padding = max(map( get_dec_padding, con_info ))
-		format = "  %%%ds%%-%ds  %%s\n" % (int_padding, dec_padding)
-			# Works out to something like "%8s%-11s  %s"
 
-		for key, val in con_info:
-			int_part = int(abs(val))
-			dec_part = str(abs(val) - int_part)[1:]
-			if val < 0: int_part = "-%d" % int_part
-			run_output.write( format % (int_part, dec_part, key) )
+def write_pformat_results ( pyomo_instance, pyomo_result, fp ):
+	"""\
+Write the output of iter_pformat_results directly to the open file 'fp',
+without ever holding the whole text in memory.
+"""
+	fp.writelines( iter_pformat_results(pyomo_instance, pyomo_result) )
 
-	return run_output.getvalue()
+
+def pformat_results ( pyomo_instance, pyomo_result ):
+	return ''.join( iter_pformat_results(pyomo_instance, pyomo_result) )
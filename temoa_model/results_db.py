@@ -0,0 +1,249 @@
+"""\
+SQLite results store.  Each solve is recorded as a row in the 'run' table, and
+its variable values (with reduced costs) and constraint values (with duals) in
+the 'variables' and 'constraints' tables, with the index of every element
+broken out into normalized dimension columns (see results_schema).  Comparing
+many scenarios is then a query instead of a re-parse of many results files:
+
+  SELECT r.name, v.period, sum(v.value)
+    FROM variables v JOIN run r USING (run_id)
+   WHERE v.component = 'V_Capacity' AND v.tech = 'E01'
+   GROUP BY r.name, v.period ;
+"""
+
+__all__ = ('connect', 'dat_hash', 'find_run', 'read_results_db', 'write_results_db')
+
+import sqlite3
+
+from results_schema import DIMENSION_COLUMNS, index_columns, numeric_positions
+
+_dim_columns = tuple(col for letter, col in DIMENSION_COLUMNS)
+_dim_types = dict(period='INTEGER', vintage='INTEGER')
+
+_schema = """\
+CREATE TABLE IF NOT EXISTS run (
+    run_id        INTEGER PRIMARY KEY,
+    name          TEXT,
+    created       TEXT,
+    model         TEXT,
+    dat_files     TEXT,
+    dat_hash      TEXT,
+    solver        TEXT,
+    solver_status TEXT,
+    termination   TEXT,
+    objective     REAL
+) ;
+
+CREATE TABLE IF NOT EXISTS variables (
+    run_id     INTEGER REFERENCES run (run_id),
+    component  TEXT,
+    %(dims)s,
+    idx        TEXT,
+    lower      REAL,
+    value      REAL,
+    upper      REAL,
+    rc         REAL
+) ;
+
+CREATE TABLE IF NOT EXISTS constraints (
+    run_id     INTEGER REFERENCES run (run_id),
+    component  TEXT,
+    %(dims)s,
+    idx        TEXT,
+    lower      REAL,
+    value      REAL,
+    upper      REAL,
+    dual       REAL
+) ;
+
+CREATE INDEX IF NOT EXISTS run_dat_hash ON run (dat_hash) ;
+""" % dict(dims=',\n    '.join(
+    '%-10s %s' % (col, _dim_types.get(col, 'TEXT')) for col in _dim_columns))
+
+for _table in ('variables', 'constraints'):
+    _schema += """
+CREATE INDEX IF NOT EXISTS %(t)s_run_component ON %(t)s (run_id, component) ;
+CREATE INDEX IF NOT EXISTS %(t)s_component_period_tech ON %(t)s (component, period, tech) ;
+CREATE INDEX IF NOT EXISTS %(t)s_tech_vintage ON %(t)s (tech, vintage) ;
+""" % dict(t=_table)
+
+
+def connect(dbfile):
+    """\
+Open (creating if necessary) the results database 'dbfile', and ensure that
+the schema exists.  Returns the sqlite3 connection.
+"""
+    con = sqlite3.connect(dbfile)
+    con.executescript(_schema)
+    return con
+
+
+def _input_files(fname):
+    """\
+The files holding the input 'fname': fname itself, or, for a directory (such
+as a columnar input directory), its member files in sorted order, each paired
+with its name relative to the directory.
+"""
+    import os
+
+    if not os.path.isdir(fname):
+        return ((None, fname),)
+
+    members = list()
+    for dname, subdirs, fnames in os.walk(fname):
+        subdirs.sort()
+        for member in sorted(fnames):
+            member = os.path.join(dname, member)
+            members.append((os.path.relpath(member, fname), member))
+    return members
+
+
+def dat_hash(dot_dats):
+    """\
+Return a hex digest identifying the contents of the listed "dot dat" files
+(or other inputs), in order.  A directory counts as the names and contents of
+its files.  Two runs with the same hash were created from the same input data.
+"""
+    from hashlib import sha1
+
+    digest = sha1()
+    for fname in dot_dats:
+        for name, member in _input_files(fname):
+            if name is not None:
+                digest.update(name.replace('\\', '/') + '\0')
+            with open(member, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), ''):
+                    digest.update(chunk)
+            digest.update('\0')   # keep ('ab', 'c') distinct from ('a', 'bc')
+
+    return digest.hexdigest()
+
+
+def _rows(run_id, cname, indices, lower, val, upper, extra):
+    for index, lb, v, ub, x in zip(indices, lower, val, upper, extra):
+        dims = index_columns(cname, index)
+        if index is None:
+            idx = None
+        elif isinstance(index, tuple):
+            idx = ','.join(str(i) for i in index)
+        else:
+            idx = str(index)
+
+        # NaN is not a value SQL understands; store it as NULL
+        yield ((run_id, cname) + tuple(dims.get(col) for col in _dim_columns)
+               + (idx, lb, v if v == v else None, ub, x if x == x else None))
+
+
+def write_results_db(dbfile, results, instance, dot_dats=(), solver=None,
+                     name=None, skip_zero=False, skip_components=()):
+    """\
+Append the solution held in 'instance' to the SQLite database 'dbfile' as a new
+run, and return the new run_id.  The solution must already be loaded into the
+instance (as results_writer does).  'results' is the solver results object,
+from which the solver status is recorded; 'dot_dats' are the input files
+(hashed into the run record), and 'name' an optional label for the run.
+"""
+    from datetime import datetime
+
+    from coopr.pyomo import Constraint, Objective, Var
+
+    from utils import component_arrays, has_reduced_costs
+
+    skip_components = set(skip_components)
+    has_rc = has_reduced_costs(instance)
+
+    solver_info = results['Solver'][0]
+    objs = instance.active_components(Objective)
+    objective = objs[objs.keys()[0]][None].expr() if objs else None
+
+    con = connect(dbfile)
+    try:
+        with con:   # a single transaction for the whole run
+            cur = con.execute(
+                'INSERT INTO run (name, created, model, dat_files, dat_hash, '
+                'solver, solver_status, termination, objective) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (name, datetime.now().isoformat(), instance.name,
+                 ' '.join(dot_dats), dot_dats and dat_hash(dot_dats) or None,
+                 solver, str(solver_info.Status),
+                 str(solver_info.Termination_condition), objective))
+            run_id = cur.lastrowid
+
+            nfields = 2 + len(_dim_columns) + 5
+            for table, ctype in (('variables', Var), ('constraints', Constraint)):
+                sql = 'INSERT INTO %s VALUES (%s)' % (table, ', '.join('?' * nfields))
+                for c in instance.active_components(ctype):
+                    if c in skip_components:
+                        continue
+                    names, indices, lower, val, upper, extra = component_arrays(
+                        getattr(instance, c), ctype, has_rc, skip_zero)
+                    con.executemany(sql, _rows(run_id, c, indices, lower, val,
+                                               upper, extra))
+    finally:
+        con.close()
+
+    return run_id
+
+
+def find_run(con, run):
+    """\
+Return the run_id of 'run', either a run_id or a run name.  If several runs
+share a name, the most recent is used.  Raises ValueError if there is no such
+run.
+"""
+    try:
+        row = con.execute('SELECT run_id FROM run WHERE run_id = ?',
+                          (int(run),)).fetchone()
+    except ValueError:
+        row = None
+    if row is None:
+        row = con.execute('SELECT max(run_id) FROM run WHERE name = ?',
+                          (run,)).fetchone()
+    if row is None or row[0] is None:
+        raise ValueError("No run '%s' in the results database." % run)
+    return row[0]
+
+
+def read_results_db(dbfile, run, components=None, constraints=True):
+    """\
+Read one run (a run_id or name; see find_run) from the results database into a
+solution.SolutionArrays, the same structure that solution.load_solution
+returns.  'components' optionally limits the Vars and Constraints read, and
+constraints=False skips the constraints table altogether.
+"""
+    from solution import ComponentValues, SolutionArrays, parse_index
+
+    nan = float('nan')
+    con = sqlite3.connect(dbfile)
+    try:
+        run_id = find_run(con, run)
+        objective, = con.execute('SELECT objective FROM run WHERE run_id = ?',
+                                 (run_id,)).fetchone()
+        sol = SolutionArrays(objective)
+
+        tables = [('var', 'variables', 'rc')]
+        if constraints:
+            tables.append(('con', 'constraints', 'dual'))
+        numeric = dict()   # component name -> numeric_positions
+        for kind, table, extra in tables:
+            sql = 'SELECT component, idx, value, %s FROM %s WHERE run_id = ?' % (
+                extra, table)
+            args = [run_id]
+            if components is not None:
+                components = list(components)
+                sql += ' AND component IN (%s)' % ', '.join('?' * len(components))
+                args.extend(components)
+
+            for cname, idx, v, x in con.execute(sql, args):
+                if cname not in sol:
+                    sol[cname] = ComponentValues(cname, kind)
+                    numeric[cname] = numeric_positions(cname)
+                cv = sol[cname]
+                cv.keys.append(None if idx is None
+                               else parse_index(idx, numeric[cname]))
+                cv.values.append(nan if v is None else v)
+                cv.extra.append(nan if x is None else x)
+    finally:
+        con.close()
+
+    return sol
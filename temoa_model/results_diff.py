@@ -0,0 +1,241 @@
+"""\
+Compare two solutions: which capacities, flows, and emissions moved, and by
+how much.
+
+  $ python temoa_model/ diff  before.sol  after.sol
+  $ python temoa_model/ diff  --db runs.sqlite  base  carbon_cap
+
+Each run is either a file written with --save_solution, or (with --db) a run
+name or id in a results database written with --results_db.  Elements are
+aligned on their index, and an element missing from one run counts as zero
+there, so solutions saved with --skip_zero_results compare correctly.
+"""
+
+__all__ = ('ComponentDiff', 'diff_solutions', 'aggregate_diffs', 'main')
+
+from array import array
+from heapq import nlargest
+
+from results_schema import COMPONENT_INDICES
+
+
+class ComponentDiff(object):
+    """\
+The changed elements of one component between two solutions, as parallel
+columns: keys, before (a), after (b), and delta (b - a).  'compared' is the
+number of distinct elements in either run.
+"""
+    __slots__ = ('name', 'compared', 'keys', 'a', 'b', 'delta')
+
+    def __init__(self, name):
+        self.name = name
+        self.compared = 0
+        self.keys = list()
+        self.a, self.b, self.delta = array('d'), array('d'), array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def relative(self, i):
+        """Return the change of element i relative to its original value."""
+        if self.a[i]:
+            return self.delta[i] / abs(self.a[i])
+        return float('inf')
+
+    def top(self, k):
+        """Return the positions of the k largest (absolute) changes."""
+        delta = self.delta
+        return nlargest(k, xrange(len(delta)), key=lambda i: abs(delta[i]))
+
+
+def _diff_component(name, cva, cvb, atol, rtol):
+    d = ComponentDiff(name)
+
+    a_vals = dict()
+    if cva is not None:
+        a_vals = dict(zip(cva.keys, cva.values))
+    b_keys, b_values = (), ()
+    if cvb is not None:
+        b_keys, b_values = cvb.keys, cvb.values
+
+    keys, a_col, b_col, delta = d.keys, d.a, d.b, d.delta
+    pop = a_vals.pop
+    compared = 0
+    for key, b in zip(b_keys, b_values):
+        a = pop(key, 0.0)
+        compared += 1
+        if abs(b - a) > atol + rtol * abs(a):
+            keys.append(key)
+            a_col.append(a)
+            b_col.append(b)
+            delta.append(b - a)
+
+    # whatever is left was only in the first run
+    for key, a in a_vals.iteritems():
+        compared += 1
+        if abs(a) > atol:
+            keys.append(key)
+            a_col.append(a)
+            b_col.append(0.0)
+            delta.append(-a)
+
+    d.compared = compared
+    return d
+
+
+def diff_solutions(sol_a, sol_b, atol=1e-6, rtol=1e-6, components=None):
+    """\
+Compare two solution.SolutionArrays, and return a list of ComponentDiff, one
+per component (sorted by name), holding the elements that changed by more
+than atol + rtol * abs(before).  'components' optionally limits the comparison
+to the named Vars and Constraints.
+"""
+    names = set(sol_a) | set(sol_b)
+    if components is not None:
+        names &= set(components)
+
+    return [_diff_component(name, sol_a.get(name), sol_b.get(name), atol, rtol)
+            for name in sorted(names)]
+
+
+def aggregate_diffs(diffs):
+    """\
+Sum the changes of each component by (tech, period), for the components that
+are indexed by tech.  Components without a period dimension are summed over
+the tech alone (period None).  Returns a dictionary of (component, tech,
+period) -> total delta.
+"""
+    totals = dict()
+    for d in diffs:
+        letters = COMPONENT_INDICES.get(d.name, '')
+        if 't' not in letters or not d.keys:
+            continue
+        t_pos = letters.index('t')
+        p_pos = letters.index('p') if 'p' in letters else None
+        if 1 == len(letters):
+            group = lambda key: (d.name, key, None)
+        elif p_pos is None:
+            group = lambda key: (d.name, key[t_pos], None)
+        else:
+            group = lambda key: (d.name, key[t_pos], key[p_pos])
+
+        for key, delta in zip(d.keys, d.delta):
+            g = group(key)
+            totals[g] = totals.get(g, 0.0) + delta
+
+    return totals
+
+
+def _fmt_key(key):
+    if isinstance(key, tuple):
+        return ','.join(str(i) for i in key)
+    return str(key)
+
+
+def write_diff(diffs, fp, top=10):
+    """Write a human-readable report of the diffs to the open file 'fp'."""
+    changed = [d for d in diffs if len(d)]
+    fp.write('%d of %d components changed.\n' % (len(changed), len(diffs)))
+
+    for d in changed:
+        fp.write('\n%s: %d of %d elements changed\n' % (d.name, len(d), d.compared))
+        fp.write('  %-40s %15s %15s %15s %9s\n' % (
+            'index', 'before', 'after', 'delta', 'rel'))
+        for i in d.top(top):
+            rel = d.relative(i)
+            rel = '%8.1f%%' % (100 * rel) if rel != float('inf') else '      new'
+            fp.write('  %-40s %15.6g %15.6g %+15.6g %9s\n' % (
+                _fmt_key(d.keys[i]), d.a[i], d.b[i], d.delta[i], rel))
+
+    totals = aggregate_diffs(changed)
+    if totals:
+        fp.write('\nLargest changes by component, tech, and period:\n')
+        for g in nlargest(top, totals, key=lambda g: abs(totals[g])):
+            name, tech, period = g
+            fp.write('  %-40s %-20s %8s %+15.6g\n' % (
+                name, tech, '' if period is None else period, totals[g]))
+
+
+def main(argv):
+    from argparse import ArgumentParser
+    from sys import stdout
+
+    from solution import read_solution
+
+    parser = ArgumentParser(
+        prog='temoa diff',
+        description='Compare the solutions of two Temoa runs.')
+    parser.add_argument('runs',
+                        help='The two runs to compare: --save_solution files, or run '
+                        'names or ids in the --db results database.',
+                        nargs=2,
+                        metavar='RUN')
+    parser.add_argument('--db',
+                        help='Read the runs from this results database (see '
+                        '--results_db).  [Default: the runs are solution files]',
+                        action='store',
+                        dest='db',
+                        metavar='DBFILE',
+                        default=None)
+    parser.add_argument('--component',
+                        help='Compare only this Var or Constraint.  May be specified '
+                        'multiple times.  [Default: all variables]',
+                        action='append',
+                        dest='components',
+                        metavar='COMPONENT',
+                        default=[])
+    parser.add_argument('--constraints',
+                        help='Also compare constraint values.  [Default: False]',
+                        action='store_true',
+                        dest='constraints',
+                        default=False)
+    parser.add_argument('--atol',
+                        help='Absolute tolerance below which a change is ignored.  '
+                        '[Default: 1e-6]',
+                        action='store',
+                        type=float,
+                        dest='atol',
+                        default=1e-6)
+    parser.add_argument('--rtol',
+                        help='Tolerance relative to the original value below which a '
+                        'change is ignored.  [Default: 1e-6]',
+                        action='store',
+                        type=float,
+                        dest='rtol',
+                        default=1e-6)
+    parser.add_argument('--top',
+                        help='Number of largest changes to list per component and in '
+                        'the tech/period summary.  [Default: 10]',
+                        action='store',
+                        type=int,
+                        dest='top',
+                        default=10)
+
+    options = parser.parse_args(argv)
+    components = options.components or None
+
+    if options.db:
+        from results_db import read_results_db
+
+        # With --component, the named components are compared whatever their
+        # kind, as they are in solution files
+        constraints = options.constraints or components is not None
+        try:
+            sol_a, sol_b = (read_results_db(options.db, run, components,
+                                            constraints)
+                            for run in options.runs)
+        except ValueError, e:
+            raise SystemExit(str(e))
+    else:
+        sol_a, sol_b = (read_solution(f) for f in options.runs)
+
+    if not (options.constraints or components):
+        components = set(c for sol in (sol_a, sol_b)
+                         for c, cv in sol.iteritems() if 'var' == cv.kind)
+
+    if None not in (sol_a.objective, sol_b.objective):
+        stdout.write('Objective: %.6g -> %.6g (%+.6g)\n' % (
+            sol_a.objective, sol_b.objective, sol_b.objective - sol_a.objective))
+
+    diffs = diff_solutions(sol_a, sol_b, options.atol, options.rtol, components)
+    write_diff(diffs, stdout, options.top)
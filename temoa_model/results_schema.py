@@ -0,0 +1,142 @@
+"""\
+Names for the index dimensions of Temoa's Vars and Constraints, shared by the
+tools that store, load, and compare solutions outside of Pyomo.
+
+The dimensions are spelled with the same one-letter convention that the model
+uses for its sparse index sets (e.g., FlowVar_psditvo).
+"""
+
+__all__ = ('COMPONENT_INDICES', 'DIMENSION_COLUMNS', 'NUMERIC_COLUMNS',
+           'index_columns', 'numeric_positions')
+
+# letter -> column name.  'c' (a commodity balanced or demanded) is stored as
+# the output, and 'r' (an extracted resource) as the input.
+DIMENSION_COLUMNS = (
+    ('p', 'period'),
+    ('s', 'season'),
+    ('d', 'time_of_day'),
+    ('t', 'tech'),
+    ('v', 'vintage'),
+    ('i', 'input'),
+    ('o', 'output'),
+    ('e', 'emission'),
+)
+_letter_column = dict(DIMENSION_COLUMNS)
+_letter_column.update(c='output', r='input')
+
+# The dimensions that hold numbers (years); the others hold the names of Set
+# members, which stay strings even if they look like numbers
+_numeric_letters = 'pv'
+NUMERIC_COLUMNS = tuple(_letter_column[letter] for letter in _numeric_letters)
+
+COMPONENT_INDICES = {
+    # Variables
+    'V_FlowIn':                                  'psditvo',
+    'V_FlowOut':                                 'psditvo',
+    'V_Activity':                                'psdtv',
+    'V_Capacity':                                'tv',
+    'V_CapacityInvest':                          'tv',
+    'V_CapacityFixed':                           'tv',
+    'V_ActivityByPeriodTechAndVintage':          'ptv',
+    'V_CapacityAvailableByPeriodAndTech':        'pt',
+
+    'V_ActivityByPeriodAndTech':                 'pt',
+    'V_ActivityByPeriodTechAndOutput':           'pto',
+    'V_ActivityByPeriodTechVintageAndOutput':    'ptvo',
+    'V_ActivityByTechAndOutput':                 'to',
+    'V_ActivityByInputAndTech':                  'it',
+    'V_ActivityByPeriodInputAndTech':            'pit',
+    'V_ActivityByPeriodInputTechAndVintage':     'pitv',
+    'V_InvestmentByTech':                        't',
+    'V_InvestmentByTechAndVintage':              'tv',
+    'V_EmissionActivityTotal':                   'e',
+    'V_EmissionActivityByPeriod':                'ep',
+    'V_EmissionActivityByTech':                  'et',
+    'V_EmissionActivityByPeriodAndTech':         'ept',
+    'V_EmissionActivityByTechAndVintage':        'etv',
+    'V_EnergyConsumptionByTech':                 't',
+    'V_EnergyConsumptionByTechAndOutput':        'to',
+    'V_EnergyConsumptionByPeriodAndTech':        'pt',
+    'V_EnergyConsumptionByPeriodInputAndTech':   'pit',
+    'V_EnergyConsumptionByPeriodTechAndOutput':  'pto',
+    'V_EnergyConsumptionByPeriodTechAndVintage': 'ptv',
+
+    'V_Demand':                                  'psdc',   # elastic model
+    'StochasticPointCost':                       'p',      # stochastic model
+
+    # Constraints
+    'ActivityConstraint':                         'psdtv',
+    'ActivityByPeriodTechAndVintageConstraint':   'ptv',
+    'CapacityConstraint':                         'psdtv',
+    'ExistingCapacityConstraint':                 'tv',
+    'CapacityInvestConstraint':                   'tv',
+    'CapacityFixedConstraint':                    'tv',
+    'DemandConstraint':                           'psdc',
+    'DemandElasticityConstraint':                 'psdc',
+    'ProcessBalanceConstraint':                   'psditvo',
+    'CommodityBalanceConstraint':                 'psdc',
+    'ResourceExtractionConstraint':               'pr',
+    'BaseloadDiurnalConstraint':                  'psdtv',
+    'StorageConstraint':                          'psitvo',
+    'TechOutputSplitConstraint':                  'psditvo',
+    'CapacityAvailableByPeriodAndTechConstraint': 'pt',
+    'FractionalLifeActivityLimitConstraint':      'psdtvo',
+    'MinCapacityConstraint':                      'pt',
+    'MaxCapacityConstraint':                      'pt',
+    'EmissionLimitConstraint':                    'pe',
+    'StochasticPointCostConstraint':              'p',
+
+    'ActivityByPeriodTechConstraint':                  'pt',
+    'ActivityByPeriodTechAndOutputConstraint':         'pto',
+    'ActivityByPeriodTechVintageAndOutputConstraint':  'ptvo',
+    'ActivityByTechAndOutputConstraint':               'to',
+    'ActivityByInputAndTechConstraint':                'it',
+    'ActivityByPeriodInputAndTechConstraint':          'pit',
+    'ActivityByPeriodInputTechAndVintageConstraint':   'pitv',
+    'InvestmentByTechConstraint':                      't',
+    'InvestmentByTechAndVintageConstraint':            'tv',
+    'EmissionActivityTotalConstraint':                 'e',
+    'EmissionActivityByPeriodConstraint':              'ep',
+    'EmissionActivityByTechConstraint':                'et',
+    'EmissionActivityByPeriodAndTechConstraint':       'ept',
+    'EmissionActivityByTechAndVintageConstraint':      'etv',
+    'EnergyConsumptionByTechConstraint':               't',
+    'EnergyConsumptionByTechAndOutputConstraint':      'to',
+    'EnergyConsumptionByPeriodAndTechConstraint':      'pt',
+    'EnergyConsumptionByPeriodInputAndTechConstraint': 'pit',
+    'EnergyConsumptionByPeriodTechAndOutputConstraint': 'pto',
+    'EnergyConsumptionByPeriodTechAndVintageConstraint': 'ptv',
+}
+
+
+def index_columns(component, index):
+    """\
+Return a dictionary of column name -> value for one element 'index' (a tuple,
+or a scalar for singly-indexed components) of the named component.  Components
+(or indices) that are not described in COMPONENT_INDICES return an empty
+dictionary.
+"""
+    letters = COMPONENT_INDICES.get(component)
+    if letters is None:
+        return dict()
+    if not isinstance(index, tuple):
+        index = (index,)
+    if len(index) != len(letters):
+        return dict()
+
+    return dict(
+        (_letter_column[letter], item)
+        for letter, item in zip(letters, index)
+    )
+
+
+def numeric_positions(component):
+    """\
+Return, per index position of the named component, whether it holds a number:
+a tuple of booleans (see solution.parse_index), or None for components not
+described in COMPONENT_INDICES.
+"""
+    letters = COMPONENT_INDICES.get(component)
+    if letters is None:
+        return None
+    return tuple(letter in _numeric_letters for letter in letters)
@@ -0,0 +1,233 @@
+"""\
+Selective, array-based access to a solve's solution.
+
+instance.load(results) pushes every variable value, dual, and reduced cost back
+into the Pyomo component objects, one element at a time.  Post-processing often
+needs only a few components (say, V_Capacity, V_ActivityByPeriodTechAndVintage,
+and the DemandConstraint duals), so load_solution reads just those straight out
+of the solver result into columns, without touching the model's components:
+
+  sol = load_solution(instance, results,
+                      components=('V_Capacity', 'DemandConstraint'))
+  cap = sol['V_Capacity']
+  for (t, v), val in zip(cap.keys, cap.values): ...
+
+A SolutionArrays may also be saved to and reloaded from disk (save_solution,
+read_solution), so that later tools need neither the dat files nor the model.
+"""
+
+__all__ = ('ComponentValues', 'SolutionArrays', 'load_solution',
+           'model_results', 'parse_index', 'read_solution', 'save_solution')
+
+from array import array
+
+_nan = float('nan')
+
+
+class ComponentValues(object):
+    """\
+The solution values of one Var or Constraint.  keys is a list of index tuples
+(or scalars, for singly-indexed components; None for a singleton component),
+and values and extra are array('d') columns in the same order.  extra holds the
+reduced costs (kind 'var') or duals (kind 'con'), NaN where the solver did not
+supply them.
+"""
+    __slots__ = ('name', 'kind', 'keys', 'values', 'extra')
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.keys = list()
+        self.values = array('d')
+        self.extra = array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getstate__(self):
+        return tuple(getattr(self, a) for a in self.__slots__)
+
+    def __setstate__(self, state):
+        for attr, val in zip(self.__slots__, state):
+            setattr(self, attr, val)
+
+    def as_dict(self):
+        """Return a dictionary of index -> value."""
+        return dict(zip(self.keys, self.values))
+
+    def __repr__(self):
+        return 'ComponentValues(%s, %s, %d elements)' % (
+            self.name, self.kind, len(self.keys))
+
+
+class SolutionArrays(dict):
+    """\
+A dictionary of component name -> ComponentValues, plus the objective value.
+"""
+
+    def __init__(self, objective=None):
+        dict.__init__(self)
+        self.objective = objective
+
+    def __reduce__(self):
+        return (SolutionArrays, (self.objective,), None, None,
+                self.iteritems())
+
+    def value(self, component, index, default=0):
+        """\
+Return the value of a single element.  Builds (and keeps) a lookup dictionary
+for the component on first use, so this is only for occasional access.
+"""
+        lookups = self.__dict__.setdefault('_lookups', dict())
+        if component not in lookups:
+            lookups[component] = self[component].as_dict()
+        return lookups[component].get(index, default)
+
+
+def _strip(token):
+    return token.strip().strip('"\'')
+
+
+def _parse_token(token):
+    token = _strip(token)
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+
+def parse_index(text, numeric=None):
+    """\
+Parse the comma separated index 'text' (e.g., 'E01,1960') into a tuple, or a
+scalar for a single-item index.  'numeric' says, per item, whether it is a
+number (e.g., (False, True)); the others are kept as strings, even those that
+look like numbers (a tech named '01').  Without it (or if it is of another
+length), every item that looks like a number is returned as one.
+"""
+    tokens = text.split(',')
+    if numeric is None or len(numeric) != len(tokens):
+        items = tuple(_parse_token(t) for t in tokens)
+    else:
+        items = tuple(_parse_token(t) if number else _strip(t)
+                      for t, number in zip(tokens, numeric))
+    if 1 == len(items):
+        return items[0]
+    return items
+
+
+def _split_name(name):
+    """\
+Split an element name like 'V_Capacity(E01,1960)' or 'V_Capacity[E01,1960]'
+into ('V_Capacity', 'E01,1960'), for parse_index.  Names with no index return
+(name, None).
+"""
+    for i, char in enumerate(name):
+        if char in '([':
+            break
+    else:
+        return name, None
+
+    return name[:i], name[i + 1:-1]
+
+
+def _numeric_positions(instance, cname):
+    """\
+Whether each position of the index of the instance's component 'cname' holds a
+number, judged by one of its indices (the positions are members of the same
+Sets throughout), or None if the instance has no such indexed component.
+"""
+    component = getattr(instance, cname, None)
+    try:
+        index = next(iter(component))
+    except (TypeError, StopIteration):
+        return None
+    if index is None:
+        return None
+    if not isinstance(index, tuple):
+        index = (index,)
+    return tuple(isinstance(item, (int, long, float)) for item in index)
+
+
+def model_results(instance, results):
+    """\
+Return 'results' with the solver's labels translated back into model names
+(instance.update_results), or 'results' itself if it already uses them (e.g.,
+if read from the solve cache).  The translation copies the whole result, so
+when loading several selections of one solve, translate it once and pass the
+translated result to each load_solution call.
+"""
+    if getattr(results, '_symbol_map', None) is not None:
+        # still in the solver's labels
+        return instance.update_results(results)
+    return results
+
+
+def load_solution(instance, results, components=None, predicate=None):
+    """\
+Return a SolutionArrays holding values from the solver result 'results'.
+
+components: optional collection of Var and Constraint names to load.  Others
+            are skipped before their indices are even parsed.
+predicate:  optional function of (component name, index) returning True for
+            the elements to keep.
+
+The instance is used to translate the solver's labels back into model names
+(see model_results), if the results still use them, and to tell which index
+items are numbers; its components are not modified.
+"""
+    soln = model_results(instance, results)['Solution']
+    if components is not None:
+        components = set(components)
+
+    objective = None
+    try:
+        objective = soln.Objective.values()[0].Value
+    except Exception:
+        pass    # not all solvers report it
+
+    sol = SolutionArrays(objective)
+
+    numeric = dict()   # component name -> _numeric_positions
+    for kind, items, extra_key in (('var', soln.Variable, 'Rc'),
+                                   ('con', soln.Constraint, 'Dual')):
+        for name in items:
+            cname, index = _split_name(name)
+            if components is not None and cname not in components:
+                continue
+            if index is not None:
+                if cname not in numeric:
+                    numeric[cname] = _numeric_positions(instance, cname)
+                index = parse_index(index, numeric[cname])
+            if predicate is not None and not predicate(cname, index):
+                continue
+
+            data = items[name]
+            if cname not in sol:
+                sol[cname] = ComponentValues(cname, kind)
+            cv = sol[cname]
+            cv.keys.append(index)
+            cv.values.append(data.get('Value', _nan))
+            extra = data.get(extra_key)
+            cv.extra.append(_nan if extra is None else extra)
+
+    return sol
+
+
+def save_solution(sol, fname):
+    """Write a SolutionArrays to fname (a binary pickle)."""
+    from cPickle import dump, HIGHEST_PROTOCOL
+
+    with open(fname, 'wb') as f:
+        dump(sol, f, HIGHEST_PROTOCOL)
+
+
+def read_solution(fname):
+    """Read a SolutionArrays previously written by save_solution."""
+    from cPickle import load
+
+    with open(fname, 'rb') as f:
+        return load(f)
@@ -0,0 +1,165 @@
+"""\
+Content-addressed cache of solver results.
+
+A solve is identified by a fingerprint of everything that determines its
+outcome: the normalized contents of the dot dat files (comments and whitespace
+do not count) and the contents of any other inputs (e.g., input databases),
+the model variant (its declared components), the solver and input filters, and
+the source of the model code.  The results of an optimal solve are stored under
+that fingerprint in the solutions directory of temoa_cache_dir(); a later run
+with the same fingerprint loads them instead of solving.
+
+The cache is bounded by size (TEMOA_SOLUTION_CACHE_MB, default 1024 MB): when a
+new result is stored, the least recently used results are removed until the
+total fits.
+"""
+
+__all__ = ('cached_results', 'solve_fingerprint', 'store_results')
+
+import os
+
+# The files whose contents define the model equations
+_model_sources = (
+    'temoa_lib.py', 'temoa_model.py', 'temoa_rules.py',
+    'temoa_elastic_model.py', 'temoa_elastic_rules.py', 'temoa_stochastic.py',
+)
+
+# The command line options that affect the solution
+_solve_options = ('solver', 'input_filters')
+
+_optimal_solutions = ('feasible', 'globallyOptimal', 'locallyOptimal', 'optimal')
+
+
+def _cache_dir():
+    from temoa_lib import temoa_cache_dir
+
+    cdir = os.path.join(temoa_cache_dir(), 'solutions')
+    if not os.path.isdir(cdir):
+        try:
+            os.makedirs(cdir)
+        except OSError:
+            pass    # created concurrently; anything else surfaces on write
+    return cdir
+
+
+def _cache_limit():
+    return int(os.environ.get('TEMOA_SOLUTION_CACHE_MB', 1024)) << 20
+
+
+def _normalized_lines(fname):
+    with open(fname, 'rU') as f:
+        for line in f:
+            line = ' '.join(line.split('#', 1)[0].split())
+            if line:
+                yield line
+
+
+def solve_fingerprint(dot_dats, model, options):
+    """\
+Return a hex digest identifying a solve of 'model' with the data files
+'dot_dats' and the parsed command line 'options'.
+"""
+    from hashlib import sha1
+
+    from coopr.pyomo import Constraint, Param, Set, Var
+
+    from results_db import dat_hash
+
+    digest = sha1()
+    for fname in dot_dats:
+        if fname.endswith('.dat') and not os.path.isdir(fname):
+            for line in _normalized_lines(fname):
+                digest.update(line)
+                digest.update('\n')
+        else:
+            # binary input (an input database, or a columnar input
+            # directory): its exact contents
+            digest.update(dat_hash((fname,)))
+        digest.update('\0')   # file boundary
+
+    for ctype in (Set, Param, Var, Constraint):
+        digest.update(' '.join(sorted(model.active_components(ctype))))
+        digest.update('\0')
+
+    for opt in _solve_options:
+        digest.update('%s=%s\0' % (opt, getattr(options, opt)))
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for fname in _model_sources:
+        fname = os.path.join(here, fname)
+        if os.path.exists(fname):
+            with open(fname, 'rb') as f:
+                digest.update(f.read())
+        digest.update('\0')
+
+    return digest.hexdigest()
+
+
+def cached_results(fingerprint):
+    """\
+Return the cached solver results for 'fingerprint', or None if there are
+none.  A hit marks the entry as recently used.
+"""
+    from coopr.opt import SolverResults
+
+    fname = os.path.join(_cache_dir(), fingerprint + '.json')
+    if not os.path.exists(fname):
+        return None
+
+    try:
+        results = SolverResults()
+        results.read(filename=fname)
+    except Exception:
+        # unreadable, or from an incompatible version: solve again
+        return None
+
+    os.utime(fname, None)
+    return results
+
+
+def store_results(fingerprint, results, instance):
+    """\
+Store the results of an optimal solve of 'instance' under 'fingerprint', with
+the solver's labels translated to model names, and then trim the cache to its
+size limit.  Results without an optimal solution are not cached.
+"""
+    soln = results['Solution']
+    if not len(soln) or str(soln.Status) not in _optimal_solutions:
+        return
+
+    cdir = _cache_dir()
+    fname = os.path.join(cdir, fingerprint + '.json')
+    tmpname = '%s.%d.json' % (fname[:-5], os.getpid())
+    try:
+        instance.update_results(results).write(filename=tmpname)
+        os.rename(tmpname, fname)   # atomic, so readers never see a partial file
+    except (IOError, OSError):
+        # a cache that can not be written is only a missed opportunity
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        return
+
+    _trim(cdir, _cache_limit())
+
+
+def _trim(cdir, limit):
+    entries = list()
+    for name in os.listdir(cdir):
+        if not name.endswith('.json'):
+            continue
+        fname = os.path.join(cdir, name)
+        try:
+            st = os.stat(fname)
+        except OSError:
+            continue   # removed concurrently
+        entries.append((st.st_mtime, st.st_size, fname))
+
+    total = sum(size for mtime, size, fname in entries)
+    for mtime, size, fname in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(fname)
+        except OSError:
+            pass
+        total -= size
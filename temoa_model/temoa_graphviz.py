@@ -1,14 +1,16 @@
-__all__ = ('CreateModelDiagrams',)
+__all__ = ('PAGED_FORMATS', 'CreateGraphDiagrams', 'CreateModelDiagrams',
+           'add_diagram_arguments', 'add_results_arguments',
+           'check_diagram_arguments', 'diagram_kwargs',
+           'gvizFunctions', 'main', 'read_graph_results')
 
-import multiprocessing as MP
 import os
+import re
 import sys
 
-from shutil import rmtree
+from itertools import imap, izip
 from subprocess import call
 from sys import stderr as SE
-
-from coopr.pyomo import value
+from time import time
 
 
 def _getLen(key):
@@ -88,6 +90,36 @@ indent: integer, number of tabs with which to indent all Dot edge lines
     return indent.join(sorted(gviz))
 
 
+# When a list, _write_dot collects (DOT file name, text) here rather than write
+# the file (see _generate_pages)
+_dot_texts = None
+
+
+def _write_dot(fname, text):
+    """\
+Write the DOT language 'text' to fname.  Returns (fname, hash of the text), for
+the render queue, which skips files whose image is of the same text.  A file
+that already holds the text is left as it is, so that its modification time
+tells when the diagram last changed.  (While _generate_pages runs, the text is
+collected instead.)
+"""
+    from hashlib import sha1
+
+    if _dot_texts is not None:
+        _dot_texts.append((fname, text))
+        return fname, sha1(text).hexdigest()
+
+    if os.path.exists(fname) and os.path.getsize(fname) == len(text):
+        with open(fname) as f:
+            unchanged = f.read() == text
+    else:
+        unchanged = False
+    if not unchanged:
+        with open(fname, 'w') as f:
+            f.write(text)
+    return fname, sha1(text).hexdigest()
+
+
 def CreateCompleteEnergySystemDiagram(**kwargs):
     """\
 These first couple versions of CreateModelDiagram do not fully work, and should
@@ -121,9 +153,7 @@ right place.  Creating graphs needs to be a post processing action, and less
 tightly coupled (not coupled at all!) to the internal Pyomo data structure.
 """
 
-    from temoa_lib import g_activeActivity_ptv, ProcessInputs, ProcessOutputs
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     ffmt = kwargs.get('image_format')
     commodity_color = kwargs.get('commodity_color')
     input_color = kwargs.get('arrowheadin_color')
@@ -179,12 +209,12 @@ strict digraph TemoaModel {
 
     p_fmt = '%s, %s, %s'   # "Process format"
 
-    for l_per, l_tech, l_vin in g_activeActivity_ptv:
+    for l_per, l_tech, l_vin in G.processes:
         techs.add((p_fmt % (l_per, l_tech, l_vin), None))
-        for l_inp in ProcessInputs(l_per, l_tech, l_vin):
+        for l_inp in G.inputs[l_per, l_tech, l_vin]:
             carriers.add((l_inp, None))
             inputs.add((l_inp, p_fmt % (l_per, l_tech, l_vin), None))
-        for l_out in ProcessOutputs(l_per, l_tech, l_vin):
+        for l_out in G.outputs[l_per, l_tech, l_vin]:
             carriers.add((l_out, None))
             outputs.add((p_fmt % (l_per, l_tech, l_vin), l_out, None))
 
@@ -193,29 +223,22 @@ strict digraph TemoaModel {
     inputs = create_text_edges(inputs, indent=2)
     outputs = create_text_edges(outputs, indent=2)
 
-    fname = 'all_vintages_model.'
-    with open(fname + 'dot', 'w') as f:
-        f.write(data % dict(
-                input_color='forestgreen',
-                output_color='firebrick',
-                carrier_color='lightsteelblue',
-                tech_color='darkseagreen',
-                techs=techs,
-                carriers=carriers,
-                inputs=inputs,
-                outputs=outputs,
-                ))
-
     # Outsource to Graphviz via the old Unix standby: temporary files
-    cmd = ('dot', '-T' + ffmt, '-o' + fname + ffmt, fname + 'dot')
-    call(cmd)
+    fname = 'all_vintages_model.'
+    return [_write_dot(fname + 'dot', data % dict(
+            input_color='forestgreen',
+            output_color='firebrick',
+            carrier_color='lightsteelblue',
+            tech_color='darkseagreen',
+            techs=techs,
+            carriers=carriers,
+            inputs=inputs,
+            outputs=outputs,
+            ))]
 
 
 def CreateCommodityPartialGraphs(**kwargs):
-    from temoa_lib import g_processInputs, g_processOutputs, ProcessesByInput, \
-        ProcessesByOutput
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     images_dir = kwargs.get('images_dir')
     ffmt = kwargs.get('image_format')
     commodity_color = kwargs.get('commodity_color')
@@ -225,8 +248,6 @@ def CreateCommodityPartialGraphs(**kwargs):
     usedfont_color = kwargs.get('usedfont_color')
     tech_color = kwargs.get('tech_color')
 
-    os.chdir('commodities')
-
     commodity_file_format = """\
 // This file is generated by the --graph_format option of the Temoa model.  It
 // is a Graphviz DOT language text description of a Temoa model instance.  For
@@ -297,6 +318,8 @@ strict digraph Temoa_energy_carrier {
     model_url = 'href="../simple_model.%s"' % ffmt
     node_attr_fmt = 'href="../processes/process_%%s.%s"' % ffmt
 
+    dot_files = list()
+
     # Step 1: Define what to do for each energy carrier
     def createImages(carriers):
         # Step 1a: Create dot file for each item
@@ -309,10 +332,10 @@ strict digraph Temoa_energy_carrier {
             # Step 1b: populate nodes and edges sets with data
             enodes.add((l_carrier, model_url))
 
-            for l_tech, l_vin in ProcessesByInput(l_carrier):
+            for l_tech, l_vin in G.processes_by_input.get(l_carrier, ()):
                 tnodes.add((l_tech, node_attr_fmt % l_tech))
                 iedges.add((l_carrier, l_tech, None))
-            for l_tech, l_vin in ProcessesByOutput(l_carrier):
+            for l_tech, l_vin in G.processes_by_output.get(l_carrier, ()):
                 tnodes.add((l_tech, node_attr_fmt % l_tech))
                 oedges.add((l_tech, l_carrier, None))
 
@@ -323,36 +346,25 @@ strict digraph Temoa_energy_carrier {
             oedges = create_text_edges(oedges, indent=2)
 
             # Step 1d: write out the Dot file for later Graphviz work
-            with open('commodity_%s.dot' % l_carrier, 'w') as f:
-                f.write(commodity_file_format % dict(
-                        graph_label=l_carrier,
-                        images_dir=images_dir,
-                        commodity_color=commodity_color,
-                        home_color=home_color,
-                        input_color=input_color,
-                        output_color=output_color,
-                        tech_color=tech_color,
-                        usedfont_color=usedfont_color,
-                        tnodes=tnodes,
-                        enodes=enodes,
-                        iedges=iedges,
-                        oedges=oedges
-                        ))
-
-            # Step 1e: finally, have Graphviz actually create an image
-            cmd = (
-                'dot',
-                '-T' + ffmt,
-                '-ocommodity_%s.%s' % (l_carrier, ffmt),
-                'commodity_%s.dot' % l_carrier
-            )
-            call(cmd)
+            dot_fname = os.path.join('commodities', 'commodity_%s.dot' % l_carrier)
+            dot_files.append(_write_dot(dot_fname, commodity_file_format % dict(
+                    graph_label=l_carrier,
+                    images_dir=images_dir,
+                    commodity_color=commodity_color,
+                    home_color=home_color,
+                    input_color=input_color,
+                    output_color=output_color,
+                    tech_color=tech_color,
+                    usedfont_color=usedfont_color,
+                    tnodes=tnodes,
+                    enodes=enodes,
+                    iedges=iedges,
+                    oedges=oedges
+                    )))
 
     # Step 2: find the parts of the energy system this set of graphs address
-    l_carriers = set()
-    for index in g_processInputs:
-        l_carriers.update(l_carrier for l_carrier in g_processInputs[index])
-        l_carriers.update(l_carrier for l_carrier in g_processOutputs[index])
+    l_carriers = set(G.processes_by_input)
+    l_carriers.update(G.processes_by_output)
 
     # sorting is not strictly necessary, but if there is some error, it lets
     # the user know on exactly which carrier it failed in terms of what has
@@ -361,7 +373,7 @@ strict digraph Temoa_energy_carrier {
     # Step 3: actually do the work
     createImages(sorted(l_carriers))
 
-    os.chdir('..')
+    return dot_files
 
 
 def CreateProcessPartialGraphs(**kwargs):
@@ -369,9 +381,7 @@ def CreateProcessPartialGraphs(**kwargs):
 A new subgraph is created for every technology in the tech_all set.  Subgraphs
 are named model_<tech>.<format>
 """
-    from temoa_lib import g_processInputs, ProcessInputs, ProcessOutputsByInput
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     ffmt = kwargs.get('image_format')
     arrowheadin_color = kwargs.get('arrowheadin_color')
     arrowheadout_color = kwargs.get('arrowheadout_color')
@@ -387,17 +397,15 @@ are named model_<tech>.<format>
     tech_color = kwargs.get('tech_color')
     options = kwargs.get('options')
 
-    os.chdir('processes')
-
     show_capacity = options.show_capacity
     splinevar = options.splinevar
 
-    VintageCap = M.V_Capacity
-    PeriodCap = M.V_CapacityAvailableByPeriodAndTech
+    VintageCap = G.capacity
+    PeriodCap = G.capacity_pt
 
     url_fmt = '../commodities/commodity_%%s.%s' % ffmt
     dummystr = '   '
-    fname = 'process_%s.%s'
+    fname = os.path.join('processes', 'process_%s.%s')
 
     def _create_separate(l_tech):
         # begin/end/period/vintage nodes
@@ -406,9 +414,7 @@ are named model_<tech>.<format>
 
         periods = set()  # used to obtain the first vintage/period, so that
         vintages = set()  # all connections can point to a common point
-        for l_per, tmp, l_vin in g_processInputs:
-            if tmp != l_tech:
-                continue
+        for l_per, l_vin in G.tech_processes.get(l_tech, ()):
             periods.add(l_per)
             vintages.add(l_vin)
 
@@ -437,18 +443,15 @@ are named model_<tech>.<format>
             vattr_fmt = 'label="v%s\\nCapacity: %.2f"'
 
         j = 0
-        for l_per, tmp, l_vin in g_processInputs:
-            if tmp != l_tech:
-                continue
-
+        for l_per, l_vin in G.tech_processes.get(l_tech, ()):
             if show_capacity:
-                pattr = pattr_fmt % (l_per, value(PeriodCap[l_per, l_tech]))
-                vattr = vattr_fmt % (l_vin, value(VintageCap[l_tech, l_vin]))
+                pattr = pattr_fmt % (l_per, PeriodCap[l_per, l_tech])
+                vattr = vattr_fmt % (l_vin, VintageCap[l_tech, l_vin])
             pnodes.add((p_fmt % l_per, pattr))
             vnodes.add((v_fmt % l_vin, vattr))
 
-            for l_inp in ProcessInputs(l_per, l_tech, l_vin):
-                for l_out in ProcessOutputsByInput(l_per, l_tech, l_vin, l_inp):
+            for l_inp in G.inputs[l_per, l_tech, l_vin]:
+                for l_out in G.outputs[l_per, l_tech, l_vin]:
                     # use color_list for the option 1 subgraph arrows 1, so as to
                     # more easily delineate the connections in the graph.
                     rainbow = color_list[j]
@@ -467,27 +470,24 @@ are named model_<tech>.<format>
         eedges = create_text_edges(eedges, indent=2)  # external edges
         vedges = create_text_edges(vedges, indent=2)  # vintage edges
 
-        dot_fname = fname % (l_tech, 'dot')
-        with open(dot_fname, 'w') as f:
-            f.write(model_dot_fmt % dict(
-                    cluster_url='../simple_model.%s' % ffmt,
-                    graph_label=l_tech,
-                    dummy=dummystr,
-                    images_dir=images_dir,
-                    splinevar=splinevar,
-                    clusternode_color=sb_vp_color,
-                    period_color=sb_vpbackg_color,
-                    vintage_color=sb_vpbackg_color,
-                    usedfont_color=usedfont_color,
-                    home_color=home_color,
-                    bnodes=bnodes,
-                    enodes=enodes,
-                    pnodes=pnodes,
-                    vnodes=vnodes,
-                    eedges=eedges,
-                    vedges=vedges,
-                    ))
-        return dot_fname
+        return _write_dot(fname % (l_tech, 'dot'), model_dot_fmt % dict(
+                cluster_url='../simple_model.%s' % ffmt,
+                graph_label=l_tech,
+                dummy=dummystr,
+                images_dir=images_dir,
+                splinevar=splinevar,
+                clusternode_color=sb_vp_color,
+                period_color=sb_vpbackg_color,
+                vintage_color=sb_vpbackg_color,
+                usedfont_color=usedfont_color,
+                home_color=home_color,
+                bnodes=bnodes,
+                enodes=enodes,
+                pnodes=pnodes,
+                vnodes=vnodes,
+                eedges=eedges,
+                vedges=vedges,
+                ))
 
     def _create_explicit(l_tech):
         v_fmt = 'p%s_v%s'
@@ -504,18 +504,15 @@ are named model_<tech>.<format>
         # begin/end/vintage nodes
         bnodes, enodes, vnodes, edges = set(), set(), set(), set()
 
-        for l_per, tmp, l_vin in g_processInputs:
-            if tmp != l_tech:
-                continue
-
-            for l_inp in ProcessInputs(l_per, l_tech, l_vin):
-                for l_out in ProcessOutputsByInput(l_per, l_tech, l_vin, l_inp):
+        for l_per, l_vin in G.tech_processes.get(l_tech, ()):
+            for l_inp in G.inputs[l_per, l_tech, l_vin]:
+                for l_out in G.outputs[l_per, l_tech, l_vin]:
                     bnodes.add((l_inp, nattr % l_inp))
                     enodes.add((l_out, nattr % l_out))
 
                     attr_args = dict()
                     if show_capacity:
-                        val = value(VintageCap[l_tech, l_vin])
+                        val = VintageCap[l_tech, l_vin]
                         attr_args.update(p=l_per, v=l_vin, val=val)
                     vnodes.add((v_fmt % (l_per, l_vin),
                                 vattr % attr_args))
@@ -534,20 +531,17 @@ are named model_<tech>.<format>
         vnodes = create_text_nodes(vnodes)
         edges = create_text_edges(edges)
 
-        dot_fname = fname % (l_tech, 'dot')
-        with open(fname, 'w') as f:
-            f.write(model_dot_fmt % dict(
-                    tech=l_tech,
-                    images_dir=images_dir,
-                    home_color=home_color,
-                    usedfont_color=usedfont_color,
-                    dummy=dummystr,
-                    bnodes=bnodes,
-                    enodes=enodes,
-                    vnodes=vnodes,
-                    edges=edges,
-                    ))
-        return dot_fname
+        return _write_dot(fname % (l_tech, 'dot'), model_dot_fmt % dict(
+                tech=l_tech,
+                images_dir=images_dir,
+                home_color=home_color,
+                usedfont_color=usedfont_color,
+                dummy=dummystr,
+                bnodes=bnodes,
+                enodes=enodes,
+                vnodes=vnodes,
+                edges=edges,
+                ))
 
     if options.graph_type == 'separate_vintages':
         create_dot_file = _create_separate
@@ -662,24 +656,12 @@ strict digraph model {
     #  Sorting is not necessary, but gives a clue to user about where to look
     #  if some sort of processing error occurs.
 
-    for t in sorted(M.tech_all):
-        dot_fname = create_dot_file(t)
-        if dot_fname:
-            cmd = (
-                'dot',
-                '-T' + ffmt,
-                '-o' + fname % (t, ffmt),
-                fname % (t, 'dot')
-            )
-            call(cmd)
-
-    os.chdir('..')
+    dot_files = (create_dot_file(t) for t in G.techs)
+    return [dot_fname for dot_fname in dot_files if dot_fname]
 
 
 def CreateMainModelDiagram(**kwargs):
-    from temoa_lib import g_processInputs, ProcessInputs, ProcessOutputsByInput
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     ffmt = kwargs.get('image_format')
     images_dir = kwargs.get('images_dir')
     arrowheadin_color = kwargs.get('arrowheadin_color')
@@ -733,11 +715,11 @@ strict digraph model {
     # edge/tech nodes, in/out edges
     enodes, tnodes, iedges, oedges = set(), set(), set(), set()
 
-    for l_per, l_tech, l_vin in g_processInputs:
+    for l_per, l_tech, l_vin in G.processes:
         tnodes.add((l_tech, tech_attr_fmt % l_tech))
-        for l_inp in ProcessInputs(l_per, l_tech, l_vin):
+        for l_inp in G.inputs[l_per, l_tech, l_vin]:
             enodes.add((l_inp, carrier_attr_fmt % l_inp))
-            for l_out in ProcessOutputsByInput(l_per, l_tech, l_vin, l_inp):
+            for l_out in G.outputs[l_per, l_tech, l_vin]:
                 enodes.add((l_out, carrier_attr_fmt % l_out))
                 iedges.add((l_inp, l_tech, None))
                 oedges.add((l_tech, l_out, None))
@@ -747,36 +729,29 @@ strict digraph model {
     iedges = create_text_edges(iedges, indent=2)
     oedges = create_text_edges(oedges, indent=2)
 
-    with open(fname + 'dot', 'w') as f:
-        f.write(model_dot_fmt % dict(
-                images_dir=images_dir,
-                arrowheadin_color=arrowheadin_color,
-                arrowheadout_color=arrowheadout_color,
-                commodity_color=commodity_color,
-                home_color=home_color,
-                tech_color=tech_color,
-                usedfont_color=usedfont_color,
-                enodes=enodes,
-                tnodes=tnodes,
-                iedges=iedges,
-                oedges=oedges,
-                ))
-    del enodes, tnodes, iedges, oedges
-
-    cmd = ('dot', '-T' + ffmt, '-o' + fname + ffmt, fname + 'dot')
-    call(cmd)
+    return [_write_dot(fname + 'dot', model_dot_fmt % dict(
+            images_dir=images_dir,
+            arrowheadin_color=arrowheadin_color,
+            arrowheadout_color=arrowheadout_color,
+            commodity_color=commodity_color,
+            home_color=home_color,
+            tech_color=tech_color,
+            usedfont_color=usedfont_color,
+            enodes=enodes,
+            tnodes=tnodes,
+            iedges=iedges,
+            oedges=oedges,
+            ))]
 
 
 def CreateDetailedModelDiagram(**kwargs):
     SE.write("CreateDetailedModelDiagram - not yet implemented\n")
     # Need to spec out what it details a bit more.
+    return []
 
 
 def CreateTechResultsDiagrams(**kwargs):
-    from temoa_lib import g_activeCapacityAvailable_pt, g_processInputs,   \
-        ProcessVintages, ProcessInputs, ProcessOutputsByInput
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     ffmt = kwargs.get('image_format')
     images_dir = kwargs.get('images_dir')
     arrowheadin_color = kwargs.get('arrowheadin_color')
@@ -791,8 +766,6 @@ def CreateTechResultsDiagrams(**kwargs):
 
     splinevar = options.splinevar
 
-    os.chdir('results')
-
     model_dot_fmt = """\
 strict digraph model {
     label = "Results for %(tech)s in %(period)s" ;
@@ -844,30 +817,24 @@ strict digraph model {
     vnode_attr_fmt = 'href="results_%%s_p%%sv%%s_segments.%s", ' % ffmt
     vnode_attr_fmt += 'label="%s\\nCap: %.2f"'
 
-    for per, tech in g_activeCapacityAvailable_pt:
-        total_cap = value(M.V_CapacityAvailableByPeriodAndTech[per, tech])
+    dot_files = list()
+    for per, tech in sorted(G.capacity_pt):
+        total_cap = G.capacity_pt[per, tech]
 
         # energy/vintage nodes, in/out edges
         enodes, vnodes, iedges, oedges = set(), set(), set(), set()
 
-        for l_vin in ProcessVintages(per, tech):
-            if not M.V_ActivityByPeriodTechAndVintage[per, tech, l_vin]:
+        for l_vin in G.vintages[per, tech]:
+            if not G.activity[per, tech, l_vin]:
                 continue
 
-            cap = M.V_Capacity[tech, l_vin]
+            cap = G.capacity[tech, l_vin]
             vnode = str(l_vin)
-            for l_inp in ProcessInputs(per, tech, l_vin):
-                for l_out in ProcessOutputsByInput(per, tech, l_vin, l_inp):
-                    flowin = sum(
-                        value(M.V_FlowIn[per, ssn, tod, l_inp, tech, l_vin, l_out])
-                        for ssn in M.time_season
-                        for tod in M.time_of_day
-                    )
-                    flowout = sum(
-                        value(M.V_FlowOut[per, ssn, tod, l_inp, tech, l_vin, l_out])
-                        for ssn in M.time_season
-                        for tod in M.time_of_day
-                    )
+            for l_inp in G.inputs[per, tech, l_vin]:
+                for l_out in G.outputs[per, tech, l_vin]:
+                    k = G.flow_index[per, tech, l_vin, l_inp, l_out]
+                    flowin = G.flow_in[k]
+                    flowout = G.flow_out[k]
                     index = (per, l_inp, tech, l_vin)
 
                     vnodes.add((vnode, vnode_attr_fmt %
@@ -885,38 +852,32 @@ strict digraph model {
         iedges = create_text_edges(iedges, indent=2)
         oedges = create_text_edges(oedges, indent=2)
 
-        fname = 'results_%s_%s.' % (tech, per)
-        with open(fname + 'dot', 'w') as f:
-            f.write(model_dot_fmt % dict(
-                    images_dir=images_dir,
-                    tech=tech,
-                    period=per,
-                    ffmt=ffmt,
-                    commodity_color=commodity_color,
-                    usedfont_color=usedfont_color,
-                    home_color=home_color,
-                    input_color=arrowheadin_color,
-                    output_color=arrowheadout_color,
-                    vintage_cluster_color=sb_vpbackg_color,
-                    vintage_color=sb_vp_color,
-                    splinevar=splinevar,
-                    total_cap=total_cap,
-                    vnodes=vnodes,
-                    enodes=enodes,
-                    iedges=iedges,
-                    oedges=oedges,
-                    ))
-        cmd = ('dot', '-T' + ffmt, '-o' + fname + ffmt, fname + 'dot')
-        call(cmd)
+        fname = os.path.join('results', 'results_%s_%s.' % (tech, per))
+        dot_files.append(_write_dot(fname + 'dot', model_dot_fmt % dict(
+                images_dir=images_dir,
+                tech=tech,
+                period=per,
+                ffmt=ffmt,
+                commodity_color=commodity_color,
+                usedfont_color=usedfont_color,
+                home_color=home_color,
+                input_color=arrowheadin_color,
+                output_color=arrowheadout_color,
+                vintage_cluster_color=sb_vpbackg_color,
+                vintage_color=sb_vp_color,
+                splinevar=splinevar,
+                total_cap=total_cap,
+                vnodes=vnodes,
+                enodes=enodes,
+                iedges=iedges,
+                oedges=oedges,
+                )))
 
-    os.chdir('..')
+    return dot_files
 
 
 def CreatePartialSegmentsDiagram(**kwargs):
-    from temoa_lib import g_activeCapacityAvailable_pt, g_processInputs,   \
-        ProcessVintages, ProcessInputs, ProcessOutputsByInput
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     ffmt = kwargs.get('image_format')
     arrowheadin_color = kwargs.get('arrowheadin_color')
     arrowheadout_color = kwargs.get('arrowheadout_color')
@@ -930,8 +891,6 @@ def CreatePartialSegmentsDiagram(**kwargs):
 
     splinevar = options.splinevar
 
-    os.chdir('results')
-
     slice_dot_fmt = """\
 strict digraph model {
     label = "Activity split of process %(tech)s, %(vintage)s in year %(period)s" ;
@@ -981,31 +940,30 @@ strict digraph model {
 """
     enode_attr_fmt = 'href="../commodities/rc_%%s_%%s.%s"' % ffmt
 
-    for p, t in g_activeCapacityAvailable_pt:
-        total_cap = value(M.V_CapacityAvailableByPeriodAndTech[p, t])
+    dot_files = list()
+    for p, t in sorted(G.capacity_pt):
+        total_cap = G.capacity_pt[p, t]
 
-        for v in ProcessVintages(p, t):
-            if not M.V_ActivityByPeriodTechAndVintage[p, t, v]:
+        for v in G.vintages[p, t]:
+            if not G.activity[p, t, v]:
                 continue
 
-            cap = M.V_Capacity[t, v]
+            cap = G.capacity[t, v]
             vnode = str(v)
-            for i in ProcessInputs(p, t, v):
-                for o in ProcessOutputsByInput(p, t, v, i):
+            for i in G.inputs[p, t, v]:
+                for o in G.outputs[p, t, v]:
                     # energy/vintage nodes, in/out edges
                     snodes, enodes, iedges, oedges = set(), set(), set(), set()
-                    for s in M.time_season:
-                        for d in M.time_of_day:
-                            flowin = value(M.V_FlowIn[p, s, d, i, t, v, o])
-                            if not flowin:
-                                continue
-                            flowout = value(M.V_FlowOut[p, s, d, i, t, v, o])
-                            snode = "%s, %s" % (s, d)
-                            snodes.add((snode, None))
-                            enodes.add((i, enode_attr_fmt % (i, p)))
-                            enodes.add((o, enode_attr_fmt % (o, p)))
-                            iedges.add((i, snode, 'label="%.2f"' % flowin))
-                            oedges.add((snode, o, 'label="%.2f"' % flowout))
+                    flowsin, flowsout = G.slice_flows(G.flow_index[p, t, v, i, o])
+                    for (s, d), flowin, flowout in izip(G.slices, flowsin, flowsout):
+                        if not flowin:
+                            continue
+                        snode = "%s, %s" % (s, d)
+                        snodes.add((snode, None))
+                        enodes.add((i, enode_attr_fmt % (i, p)))
+                        enodes.add((o, enode_attr_fmt % (o, p)))
+                        iedges.add((i, snode, 'label="%.2f"' % flowin))
+                        oedges.add((snode, o, 'label="%.2f"' % flowout))
 
                     if not snodes:
                         continue
@@ -1015,38 +973,33 @@ strict digraph model {
                     iedges = create_text_edges(iedges, indent=2)
                     oedges = create_text_edges(oedges, indent=2)
 
-                    fname = 'results_%s_p%sv%s_segments.' % (t, p, v)
-                    with open(fname + 'dot', 'w') as f:
-                        f.write(slice_dot_fmt % dict(
-                                period=p,
-                                tech=t,
-                                vintage=v,
-                                ffmt=ffmt,
-                                commodity_color=commodity_color,
-                                usedfont_color=usedfont_color,
-                                home_color=home_color,
-                                input_color=arrowheadin_color,
-                                output_color=arrowheadout_color,
-                                vintage_cluster_color=sb_vpbackg_color,
-                                vintage_color=sb_vp_color,
-                                splinevar=splinevar,
-                                total_cap=total_cap,
-                                snodes=snodes,
-                                enodes=enodes,
-                                iedges=iedges,
-                                oedges=oedges,
-                                ))
-                    cmd = ('dot', '-T' + ffmt, '-o' + fname + ffmt, fname + 'dot')
-                    call(cmd)
-
-    os.chdir('..')
+                    fname = os.path.join(
+                        'results', 'results_%s_p%sv%s_segments.' % (t, p, v))
+                    dot_files.append(_write_dot(fname + 'dot', slice_dot_fmt % dict(
+                            period=p,
+                            tech=t,
+                            vintage=v,
+                            ffmt=ffmt,
+                            commodity_color=commodity_color,
+                            usedfont_color=usedfont_color,
+                            home_color=home_color,
+                            input_color=arrowheadin_color,
+                            output_color=arrowheadout_color,
+                            vintage_cluster_color=sb_vpbackg_color,
+                            vintage_color=sb_vp_color,
+                            splinevar=splinevar,
+                            total_cap=total_cap,
+                            snodes=snodes,
+                            enodes=enodes,
+                            iedges=iedges,
+                            oedges=oedges,
+                            )))
+
+    return dot_files
 
 
 def CreateCommodityPartialResults(**kwargs):
-    from temoa_lib import g_processInputs, g_processOutputs, \
-        ProcessInputs, ProcessOutputsByInput, ProcessesByInput, ProcessesByOutput
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     ffmt = kwargs.get('image_format')
     images_dir = kwargs.get('images_dir')
     sb_arrow_color = kwargs.get('sb_arrow_color')
@@ -1059,8 +1012,6 @@ def CreateCommodityPartialResults(**kwargs):
 
     splinevar = options.splinevar
 
-    os.chdir('commodities')
-
     commodity_dot_fmt = """\
 strict digraph result_commodity_%(commodity)s {
     label       = "%(commodity)s - %(period)s" ;
@@ -1109,33 +1060,20 @@ strict digraph result_commodity_%(commodity)s {
 }
 """
 
-    FI = M.V_FlowIn
-    FO = M.V_FlowOut
     used_carriers, used_techs = set(), set()
 
-    for p, t, v in g_processInputs:
-        for i in ProcessInputs(p, t, v):
-            for o in ProcessOutputsByInput(p, t, v, i):
-                flowin = sum(
-                    value(FI[p, s, d, i, t, v, o])
-                    for s in M.time_season
-                    for d in M.time_of_day
-                )
-                if flowin:
-                    flowout = sum(
-                        value(FO[p, s, d, i, t, v, o])
-                        for s in M.time_season
-                        for d in M.time_of_day
-                    )
-                    used_carriers.update(g_processInputs[p, t, v])
-                    used_carriers.update(g_processOutputs[p, t, v])
-                    used_techs.add(t)
+    for (p, t, v, i, o), flowin in izip(G.flows, G.flow_in):
+        if flowin:
+            used_carriers.update(G.inputs[p, t, v])
+            used_carriers.update(G.outputs[p, t, v])
+            used_techs.add(t)
 
     period_results_url_fmt = '../results/results%%s.%s' % ffmt
     node_attr_fmt = 'href="../results/results_%%s_%%s.%s"' % ffmt
     rc_node_fmt = 'color="%s", href="%s", shape="circle"'
 
-    for l_per in M.time_horizon:
+    dot_files = list()
+    for l_per in G.horizon:
         url = period_results_url_fmt % l_per
         for l_carrier in used_carriers:
             # enabled/disabled nodes/edges
@@ -1143,14 +1081,14 @@ strict digraph result_commodity_%(commodity)s {
 
             rcnode = ((l_carrier, rc_node_fmt % (commodity_color, url)),)
 
-            for l_tech, l_vin in ProcessesByInput(l_carrier):
+            for l_tech, l_vin in G.processes_by_input.get(l_carrier, ()):
                 if l_tech in used_techs:
                     enodes.add((l_tech, node_attr_fmt % (l_tech, l_per)))
                     eedges.add((l_carrier, l_tech, None))
                 else:
                     dnodes.add((l_tech, None))
                     dedges.add((l_carrier, l_tech, None))
-            for l_tech, l_vin in ProcessesByOutput(l_carrier):
+            for l_tech, l_vin in G.processes_by_output.get(l_carrier, ()):
                 if l_tech in used_techs:
                     enodes.add((l_tech, node_attr_fmt % (l_tech, l_per)))
                     eedges.add((l_tech, l_carrier, None))
@@ -1164,35 +1102,28 @@ strict digraph result_commodity_%(commodity)s {
             eedges = create_text_edges(eedges, indent=2)
             dedges = create_text_edges(dedges, indent=2)
 
-            fname = 'rc_%s_%s.' % (l_carrier, l_per)
-            with open(fname + 'dot', 'w') as f:
-                f.write(commodity_dot_fmt % dict(
-                        images_dir=images_dir,
-                        home_color=home_color,
-                        usedfont_color=usedfont_color,
-                        sb_arrow_color=sb_arrow_color,
-                        tech_color=tech_color,
-                        commodity=l_carrier,
-                        period=l_per,
-                        unused_color=unused_color,
-                        resource_node=rcnode,
-                        used_nodes=enodes,
-                        unused_nodes=dnodes,
-                        used_edges=eedges,
-                        unused_edges=dedges,
-                        ))
-
-            cmd = ('dot', '-T' + ffmt, '-o' + fname + ffmt, fname + 'dot')
-            call(cmd)
-
-    os.chdir('..')
+            fname = os.path.join('commodities', 'rc_%s_%s.' % (l_carrier, l_per))
+            dot_files.append(_write_dot(fname + 'dot', commodity_dot_fmt % dict(
+                    images_dir=images_dir,
+                    home_color=home_color,
+                    usedfont_color=usedfont_color,
+                    sb_arrow_color=sb_arrow_color,
+                    tech_color=tech_color,
+                    commodity=l_carrier,
+                    period=l_per,
+                    unused_color=unused_color,
+                    resource_node=rcnode,
+                    used_nodes=enodes,
+                    unused_nodes=dnodes,
+                    used_edges=eedges,
+                    unused_edges=dedges,
+                    )))
+
+    return dot_files
 
 
 def CreateMainResultsDiagram(**kwargs):
-    from temoa_lib import ProcessVintages, ProcessInputs, ProcessOutputs,     \
-        ValidActivity
-
-    M = kwargs.get('model')
+    G = kwargs.get('graph')
     images_dir = kwargs.get('images_dir')
     ffmt = kwargs.get('image_format')
     options = kwargs.get('options')
@@ -1206,8 +1137,6 @@ def CreateMainResultsDiagram(**kwargs):
 
     splinevar = options.splinevar
 
-    os.chdir('results')
-
     results_dot_fmt = """\
 strict digraph model {
     label = "Results for %(period)s"
@@ -1306,68 +1235,117 @@ strict digraph model {
     commodity_fmt = 'href="../commodities/rc_%%s_%%s.%s"' % ffmt
     flow_fmt = 'label="%.2f"'
 
-    V_Cap = M.V_CapacityAvailableByPeriodAndTech
-    FI = M.V_FlowIn
-    FO = M.V_FlowOut
-    EI = M.V_EnergyConsumptionByPeriodInputAndTech    # Energy In
-    EO = M.V_ActivityByPeriodTechAndOutput            # Energy Out
-    EmiO = M.V_EmissionActivityByPeriodAndTech
+    V_Cap = G.capacity_pt
+    EI = G.energy_in     # Energy In
+    EO = G.energy_out    # Energy Out
+    EmiO = G.emission_out
 
     epsilon = 0.005  # we only care about last two decimals
       # but perhaps this should be configurable?  Not until we can do this
       # both after the fact (i.e. not synchronous with a solve), and via a
       # configuration file.
 
-    for pp in M.time_optimize:
+    # For large systems, draw only the larger flows (see GraphModel.top_flows)
+    top = getattr(options, 'graph_top', None)
+    min_share = getattr(options, 'graph_min_share', None)
+    other = 'other flows'
+    other_attr_fmt = 'label="other flows\\n(of %d technologies)", style="filled,dashed"'
+
+    dot_files = list()
+    for pp in G.periods:
         # enabled/disabled   techs/carriers/emissions/flows   in/out
         etechs, dtechs, ecarriers = set(), set(), set()
         eemissions = set()
         eflowsi, eflowso, dflows = set(), set(), set()   # edges
         usedc, usede = set(), set()    # used carriers, used emissions
 
-        for tt in M.tech_all:
-            if (pp, tt) not in V_Cap:
-                continue
+        if top is not None or min_share is not None:
+            # The flows left out are summed into one node, as if of one tech.
+            # The unused techs, carriers, and emissions are not drawn, so that
+            # the size of the diagram follows the limits, not the system.
+            inputs, outputs, other_in, other_out, others = G.top_flows(
+                pp, top, min_share, epsilon)
+            shown = set(tt for ii, tt in inputs)
+            shown.update(tt for tt, oo in outputs)
+
+            if others:
+                etechs.add((other, other_attr_fmt % len(others)))
+            for tt in shown:
+                etechs.add((tt, tech_attr_fmt % (tt, V_Cap[pp, tt], tt, pp)))
+            for (ii, tt), inp in inputs.iteritems():
+                eflowsi.add((ii, tt, flow_fmt % inp))
+                usedc.add(ii)
+            for (tt, oo), out in outputs.iteritems():
+                eflowso.add((tt, oo, flow_fmt % out))
+                usedc.add(oo)
+            for ii, inp in other_in.iteritems():
+                eflowsi.add((ii, other, flow_fmt % inp))
+                usedc.add(ii)
+            for oo, out in other_out.iteritems():
+                eflowso.add((other, oo, flow_fmt % out))
+                usedc.add(oo)
+            ecarriers = set((cc, commodity_fmt % (cc, pp)) for cc in usedc)
+
+            other_emissions = dict()
+            for (ee, p, tt), amt in EmiO.iteritems():
+                if p != pp or amt < epsilon:
+                    continue
+                if tt in shown:
+                    eflowso.add((tt, ee, flow_fmt % amt))
+                elif tt in others:
+                    other_emissions[ee] = other_emissions.get(ee, 0) + amt
+                else:
+                    continue
+                eemissions.add((ee, None))
+            for ee, amt in other_emissions.iteritems():
+                eflowso.add((other, ee, flow_fmt % amt))
 
-            cap = V_Cap[pp, tt]
-
-            if cap:
-                etechs.add((tt, tech_attr_fmt % (tt, cap, tt, pp)))
-            else:
-                dtechs.add((tt, None))
-
-            for vv in ProcessVintages(pp, tt):
-                for ii in ProcessInputs(pp, tt, vv):
-                    inp = value(EI[pp, ii, tt])
-                    if inp >= epsilon:
-                        eflowsi.add((ii, tt, flow_fmt % inp))
-                        ecarriers.add((ii, commodity_fmt % (ii, pp)))
-                        usedc.add(ii)
-                    else:
-                        dflows.add((ii, tt, None))
-                for oo in ProcessOutputs(pp, tt, vv):
-                    out = value(EO[pp, tt, oo])
-                    if out >= epsilon:
-                        eflowso.add((tt, oo, flow_fmt % out))
-                        ecarriers.add((oo, commodity_fmt % (oo, pp)))
-                        usedc.add(oo)
-                    else:
-                        dflows.add((tt, oo, None))
-
-        for ee, ii, tt, vv, oo in M.EmissionActivity.sparse_keys():
-            if ValidActivity(pp, tt, vv):
-                amt = value(EmiO[ee, pp, tt])
-                if amt < epsilon:
+            dcarriers, demissions = set(), set()
+
+        else:
+            for tt in G.techs:
+                if (pp, tt) not in V_Cap:
                     continue
 
-                eflowso.add((tt, ee, flow_fmt % amt))
-                eemissions.add((ee, None))
-                usede.add(ee)
+                cap = V_Cap[pp, tt]
+
+                if cap:
+                    etechs.add((tt, tech_attr_fmt % (tt, cap, tt, pp)))
+                else:
+                    dtechs.add((tt, None))
+
+                for vv in G.vintages[pp, tt]:
+                    for ii in G.inputs[pp, tt, vv]:
+                        inp = EI[pp, ii, tt]
+                        if inp >= epsilon:
+                            eflowsi.add((ii, tt, flow_fmt % inp))
+                            ecarriers.add((ii, commodity_fmt % (ii, pp)))
+                            usedc.add(ii)
+                        else:
+                            dflows.add((ii, tt, None))
+                    for oo in G.outputs[pp, tt, vv]:
+                        out = EO[pp, tt, oo]
+                        if out >= epsilon:
+                            eflowso.add((tt, oo, flow_fmt % out))
+                            ecarriers.add((oo, commodity_fmt % (oo, pp)))
+                            usedc.add(oo)
+                        else:
+                            dflows.add((tt, oo, None))
+
+            for ee, ii, tt, vv, oo in G.emission_activity:
+                if (pp, tt, vv) in G.inputs:
+                    amt = EmiO.get((ee, pp, tt), 0)
+                    if amt < epsilon:
+                        continue
+
+                    eflowso.add((tt, ee, flow_fmt % amt))
+                    eemissions.add((ee, None))
+                    usede.add(ee)
 
-        dcarriers = set((cc, None)
-                        for cc in M.commodity_carrier if cc not in usedc)
-        demissions = set((ee, None)
-                         for ee in M.commodity_emissions if ee not in usede)
+            dcarriers = set((cc, None)
+                            for cc in G.carriers if cc not in usedc)
+            demissions = set((ee, None)
+                             for ee in G.emissions if ee not in usede)
 
         dtechs = create_text_nodes(dtechs, indent=2)
         etechs = create_text_nodes(etechs, indent=2)
@@ -1388,61 +1366,60 @@ strict digraph model {
         # l_file.write ("}\n");
         # l_file.close()
 
-        fname = 'results%s.' % pp
-        with open(fname + 'dot', 'w') as f:
-            f.write(results_dot_fmt % dict(
-                    period=pp,
-                    splinevar=splinevar,
-                    arrowheadin_color=arrowheadin_color,
-                    arrowheadout_color=arrowheadout_color,
-                    commodity_color=commodity_color,
-                    tech_color=tech_color,
-                    unused_color=unused_color,
-                    unusedfont_color=unusedfont_color,
-                    usedfont_color=usedfont_color,
-                    dtechs=dtechs,
-                    etechs=etechs,
-                    dcarriers=dcarriers,
-                    ecarriers=ecarriers,
-                    demissions=demissions,
-                    eemissions=eemissions,
-                    dflows=dflows,
-                    eflowsi=eflowsi,
-                    eflowso=eflowso,
-                    ))
-
-        cmd = ('dot', '-T' + ffmt, '-o' + fname + ffmt, fname + 'dot')
-        call(cmd)
-
-    os.chdir('..')
-
-
-def CreateModelDiagrams(M, options):
-    # This function is a "master", calling many other functions based on command
-    # line input.  Other than code cleanliness, there is no reason that the
-    # logic couldn't be in main()
-
-    # if the user has listed more than one dot_dat, arbitrarily choose the first
-    # as the name of this run.
-    datname = os.path.basename(options.dot_dat[0])[:-4]
-    images_dir = "images_" + datname
-
-    if os.path.exists(images_dir):
-        rmtree(images_dir)
-
-    os.mkdir(images_dir)
-    os.chdir(images_dir)
-
-    os.makedirs('commodities')
-    os.makedirs('processes')
-    os.makedirs('results')
-
+        fname = os.path.join('results', 'results%s.' % pp)
+        dot_files.append(_write_dot(fname + 'dot', results_dot_fmt % dict(
+                period=pp,
+                splinevar=splinevar,
+                arrowheadin_color=arrowheadin_color,
+                arrowheadout_color=arrowheadout_color,
+                commodity_color=commodity_color,
+                tech_color=tech_color,
+                unused_color=unused_color,
+                unusedfont_color=unusedfont_color,
+                usedfont_color=usedfont_color,
+                dtechs=dtechs,
+                etechs=etechs,
+                dcarriers=dcarriers,
+                ecarriers=ecarriers,
+                demissions=demissions,
+                eemissions=eemissions,
+                dflows=dflows,
+                eflowsi=eflowsi,
+                eflowso=eflowso,
+                )))
+
+    return dot_files
+
+
+# The diagram families.  Each function writes its family of DOT files, and
+# returns their names (and hashes; see _write_dot).  To add a family, add its
+# function here, and ensure that it has all it needs to work passed in via
+# diagram_kwargs.
+gvizFunctions = (
+    CreateCompleteEnergySystemDiagram,
+    CreateCommodityPartialGraphs,
+    CreateProcessPartialGraphs,
+    CreateMainModelDiagram,
+    CreateDetailedModelDiagram,
+    CreateTechResultsDiagrams,
+    CreateCommodityPartialResults,
+    CreateMainResultsDiagram,
+    CreatePartialSegmentsDiagram,
+)
+
+
+def diagram_kwargs(graph, images_dir, image_format, options):
+    """\
+Return the keyword arguments of the diagram functions: the GraphModel, the
+image format, the parsed Graphviz command line options (graph_type,
+show_capacity, splinevar), and the colors.
+"""
     ##############################################
     #MAIN MODEL AND RESULTS AND EVERYTHING ELSE
-    kwargs = dict(
-        model=M,
-        images_dir='images_%s' % datname,
-        image_format=options.graph_format.lower(),
+    return dict(
+        graph=graph,
+        images_dir=images_dir,
+        image_format=image_format,
         options=options,
 
         tech_color='darkseagreen',
@@ -1471,49 +1448,731 @@ def CreateModelDiagrams(M, options):
                     'hotpink', 'cyan', 'burlywood', 'coral', 'limegreen',
                     'black', 'brown'),
     )
-    ####################################
-
-    # Do all necessary work in parallel, taking advantage of whatever cores
-    # are available to the computer on which this code is run.  To add a
-    # function to the pool, ensure that the function is in the 'gvizFunctions'
-    # tuple below, and that the function has all it needs to work passed in
-    # via the 'kwargs' dict above.
-
-    gvizFunctions = (
-        CreateCompleteEnergySystemDiagram,
-        CreateCommodityPartialGraphs,
-        CreateProcessPartialGraphs,
-        CreateMainModelDiagram,
-        CreateDetailedModelDiagram,
-        CreateTechResultsDiagrams,
-        CreateCommodityPartialResults,
-        CreateMainResultsDiagram,
-        CreatePartialSegmentsDiagram,
-    )
 
+
+# The families that draw a solution's flows
+_results_families = frozenset((
+    'CreateCommodityPartialResults', 'CreateMainResultsDiagram',
+    'CreatePartialSegmentsDiagram', 'CreateTechResultsDiagrams',
+))
+
+# The CreateGraphDiagrams kwargs, for the worker processes
+_kwargs = None
+
+# The most DOT files rendered by one dot process
+_max_batch = 64
+
+# Within the images directory: the image format, the hash of the DOT text of
+# each image, and the other files written, as of the last run
+_manifest_file = 'manifest.json'
+
+# The images directory's subdirectories, as the diagram hrefs expect them
+_image_subdirs = ('commodities', 'processes', 'results')
+
+# The formats in which Graphviz writes the graphs of one DOT file as the pages
+# of one image, for --graph_pages
+PAGED_FORMATS = ('pdf', 'ps', 'ps2')
+
+# In --graph_pages mode, the list of every diagram and the page it is on
+_pages_index = 'index.html'
+
+# In --graph_pages mode, each graph of a family's DOT file follows a line naming
+# its diagram
+_page_marker = '// diagram: '
+
+# The families that draw one topology once per period, with only the colors and
+# labels changing: DOT file name -> the name of the layout its periods share.
+# Their images are drawn at the positions of one layout (see _render).
+_layout_families = {
+    'CreateMainResultsDiagram':  lambda dot_fname: 'results',
+    'CreateTechResultsDiagrams': lambda dot_fname: dot_fname.rsplit('_', 1)[0],
+}
+
+
+def _image_name(dot_fname, ffmt):
+    return os.path.splitext(dot_fname)[0] + '.' + ffmt
+
+
+def _read_manifest():
+    """\
+Return the (image format, DOT file name -> hash, other files) of the last run,
+or (None, {}, []) if there is no (readable) manifest.
+"""
+    import json
+
+    try:
+        with open(_manifest_file) as f:
+            manifest = json.load(f)
+        return manifest['format'], manifest['files'], manifest.get('extra', [])
+    except (IOError, ValueError, KeyError):
+        return None, dict(), list()
+
+
+def _write_manifest(ffmt, files, extra=()):
+    import json
+
+    tmpname = '%s.%d' % (_manifest_file, os.getpid())
+    with open(tmpname, 'w') as f:
+        json.dump(dict(format=ffmt, files=files, extra=list(extra)), f,
+                  indent=0, sort_keys=True)
+    os.rename(tmpname, _manifest_file)
+
+
+def _remove_stale(dot_fnames, ffmt, extra, last_format, last_files, last_extra):
+    """\
+Remove the files of the last run (see _read_manifest) that this run did not
+generate: DOT files (and their images) of processes, commodities, or periods
+that are gone, and images in the last run's format, if it changed.  The files
+named in extra are kept too.  Only files the manifest names are removed, so
+anything else in the images directory is left alone (all of it, if there is
+no manifest).
+"""
+    keep = set(dot_fnames)
+    keep.update(_image_name(dot_fname, ffmt) for dot_fname in dot_fnames)
+    keep.update(extra)
+
+    stale = set(last_files)
+    if last_format:
+        stale.update(_image_name(dot_fname, last_format) for dot_fname in last_files)
+    stale.update(last_extra)
+
+    for fname in stale - keep:
+        fname = os.path.normpath(fname)
+        if os.path.isabs(fname) or fname.startswith(os.pardir):
+            continue   # not one of ours, whatever the manifest says
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+
+def _generate(family):
+    """\
+Write the DOT files of the diagram family (the name of one of the Create*
+functions).  Returns (family, list of (DOT file name, hash) pairs).
+"""
+    return family, globals()[family](**_kwargs)
+
+
+def _generate_pages(family):
+    """\
+Write the diagrams of the family as the graphs of one DOT file, <family>.dot,
+each after a line naming it (_page_marker), for --graph_pages.  Returns (family,
+the names of its diagrams (their DOT file names, without .dot) in page order).
+"""
+    global _dot_texts
+
+    _dot_texts = list()
+    try:
+        globals()[family](**_kwargs)
+        texts = _dot_texts
+    finally:
+        _dot_texts = None
+
+    if texts:
+        with open(family + '.dot', 'w') as f:
+            for fname, text in texts:
+                f.write('%s%s\n%s\n' % (_page_marker, os.path.splitext(fname)[0], text))
+    return family, [os.path.splitext(fname)[0] for fname, text in texts]
+
+
+def _write_pages(pages, ffmt):
+    """\
+Point the links of the --graph_pages DOT files (see _generate_pages) at the
+pages of the diagrams they name, e.g. href="results.pdf#page=3", and write
+the index of every diagram's page.  pages is family -> list of diagram names.
+Returns family -> [(DOT file name, hash)], as the diagram functions return.
+"""
+    from cgi import escape
+    from hashlib import sha1
+
+    located = dict()   # diagram name -> (family, page)
+    for family, names in pages.iteritems():
+        for page, name in enumerate(names, 1):
+            located[name] = (family, page)
+
+    href = re.compile(r'href="([^"#:]+)\.%s"' % re.escape(ffmt))
+
+    dot_files = dict()
+    for family, names in pages.iteritems():
+        if not names:
+            dot_files[family] = []
+            continue
+        dot_fname = family + '.dot'
+        with open(dot_fname) as f:
+            lines = f.readlines()
+
+        # The links are relative to the directory of each diagram's own image
+        def page_link(match):
+            target = os.path.normpath(os.path.join(here, match.group(1)))
+            if target not in located:
+                return match.group(0)
+            return 'href="%s.%s#page=%d"' % (located[target][0], ffmt,
+                                             located[target][1])
+
+        here = ''
+        for n, line in enumerate(lines):
+            if line.startswith(_page_marker):
+                here = os.path.dirname(line[len(_page_marker):].strip())
+            elif 'href' in line:
+                lines[n] = href.sub(page_link, line)
+        text = ''.join(lines)
+        dot_files[family] = [_write_dot(dot_fname, text)]
+
+    rows = list()
+    for family in sorted(pages):
+        if not pages[family]:
+            continue
+        rows.append('<h2><a href="%s.%s">%s</a></h2>\n<ol>\n' % (
+            family, ffmt, escape(family)))
+        rows.extend('<li><a href="%s.%s#page=%d">%s</a></li>\n'
+                    % (family, ffmt, page, escape(name))
+                    for page, name in enumerate(pages[family], 1))
+        rows.append('</ol>\n')
+    with open(_pages_index, 'w') as f:
+        f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                '<title>Temoa diagrams</title></head>\n<body>\n%s</body></html>\n'
+                % ''.join(rows))
+
+    return dot_files
+
+
+def _render_pages(job):
+    """\
+Render each family DOT file of the job (see _generate_pages) as one image, with
+one page per graph.  Takes and returns the same as _render.  If any graph of a
+family fails, so does its whole file.
+"""
+    family, dot_fnames, ffmt, groups = job
+    begin = time()
+
+    failed = list()
+    for dot_fname in dot_fnames:
+        image = _image_name(dot_fname, ffmt)
+        if call(('dot', '-T' + ffmt, '-o' + image, dot_fname)):
+            failed.append(dot_fname)
+            if os.path.exists(image):
+                os.remove(image)
+
+    return family, dot_fnames, failed, time() - begin
+
+
+def _render_files(command, dot_fnames, ffmt, images):
+    """\
+Render the DOT files with one Graphviz process (command -O names each image
+<DOT file>.<format>, which is then renamed to its name in images).  If Graphviz
+fails, each file is rendered alone, so that only the files that fail are lost.
+Returns the DOT files that failed.
+"""
+    if 0 == call(command + ('-T' + ffmt, '-O') + tuple(dot_fnames)):
+        for dot_fname, image in izip(dot_fnames, images):
+            os.rename('%s.%s' % (dot_fname, ffmt), image)
+        return []
+
+    failed = list()
+    for dot_fname, image in izip(dot_fnames, images):
+        if os.path.exists('%s.%s' % (dot_fname, ffmt)):
+            os.remove('%s.%s' % (dot_fname, ffmt))
+        if call(command + ('-T' + ffmt, '-o' + image, dot_fname)):
+            failed.append(dot_fname)
+            if os.path.exists(image):
+                os.remove(image)
+    return failed
+
+
+# In our DOT files, every node and edge statement starts with a quoted node ID
+_dot_statement = re.compile(r'^\s*"([^"]*)"(?:\s*->\s*"([^"]*)")?', re.M)
+
+# In dot -Tdot output: node statements, and the attributes of clusters
+_laid_out_node = re.compile(r'^\s*("(?:[^"\\]|\\.)*"|[\w.]+)\s*\[([^\]]*)\]', re.M)
+_laid_out_cluster = re.compile(
+    r'subgraph\s+"?(cluster\w*)"?\s*\{\s*graph\s*\[([^\]]*)\]')
+_pos_attr = re.compile(r'\bpos="([^"]*)"')
+_bb_attr = re.compile(r'\bbb="([^"]*)"')
+
+
+def _dot_body(text):
+    """The statements of a DOT graph: the text within its outermost braces."""
+    return text[text.index('{') + 1:text.rindex('}')]
+
+
+def _layout(groups):
+    """\
+Lay out each group of DOT files (the periods of one diagram) as one graph: the
+union of their nodes and edges, so that every period finds its nodes in it.
+All groups are laid out by one dot process.  Returns a list with, per group,
+(node positions, cluster bounding boxes), or None where dot failed.
+"""
+    union_fnames = list()
+    for group in groups:
+        union_fname = '%s.layout.%d.dot' % (os.path.splitext(group[0])[0],
+                                            os.getpid())
+        bodies = list()
+        for dot_fname in group:
+            with open(dot_fname) as f:
+                bodies.append(_dot_body(f.read()))
+        with open(union_fname, 'w') as f:
+            f.write('strict digraph layout {%s}\n' % ''.join(bodies))
+        union_fnames.append(union_fname)
+
+    laid_out = [f + '.dot' for f in union_fnames]
+    failed = set(_render_files(('dot',), union_fnames, 'dot', laid_out))
+
+    layouts = list()
+    for union_fname, laid_out_fname in izip(union_fnames, laid_out):
+        os.remove(union_fname)
+        if union_fname in failed:
+            layouts.append(None)
+            continue
+        with open(laid_out_fname) as f:
+            text = f.read().replace('\\\n', '')   # dot's line continuations
+        os.remove(laid_out_fname)
+
+        positions, clusters = dict(), dict()
+        for node, attrs in _laid_out_node.findall(text):
+            pos = _pos_attr.search(attrs)
+            if pos and node not in ('graph', 'node', 'edge'):
+                positions[node.strip('"').replace('\\"', '"')] = pos.group(1)
+        for cluster, attrs in _laid_out_cluster.findall(text):
+            bb = _bb_attr.search(attrs)
+            if bb:
+                clusters[cluster] = bb.group(1)
+        layouts.append((positions, clusters))
+
+    return layouts
+
+
+def _pin(dot_fname, layout):
+    """\
+Write a copy of the DOT file with its nodes (and clusters) at the positions of
+layout, for neato -n.  Returns the name of the copy, or None if the layout is
+missing one of its nodes.
+"""
+    positions, clusters = layout
+    with open(dot_fname) as f:
+        text = f.read()
+
+    nodes = set()
+    for tail, head in _dot_statement.findall(text):
+        nodes.add(tail)
+        if head:
+            nodes.add(head)
+    if not nodes.issubset(positions):
+        return None
+
+    pins = ['\t"%s" [ pos="%s" ] ;' % (node, positions[node])
+            for node in sorted(nodes)]
+    pins.extend('\tsubgraph %s { graph [ bb="%s" ] ; }' % (cluster, clusters[cluster])
+                for cluster in sorted(clusters)
+                if re.search(r'subgraph\s+%s\b' % cluster, text))
+
+    # Appended at the end, so that the nodes already have their attributes
+    pinned = '%s.pinned.%d.dot' % (os.path.splitext(dot_fname)[0], os.getpid())
+    with open(pinned, 'w') as f:
+        f.write('%s\n%s\n}\n' % (text[:text.rindex('}')].rstrip(), '\n'.join(pins)))
+    return pinned
+
+
+def _render(job):
+    """\
+Have Graphviz create the images of a batch of DOT files.  job is (family, list
+of DOT file names, image format, layout groups); returns (family, DOT file
+names, DOT files that failed, seconds).
+
+The batch is one dot process, as starting dot costs more than laying out most
+of our diagrams.  If the family draws the same topology once per period (see
+_layout_families), the job also names the groups of DOT files that share a
+layout: each group is laid out once, and its images are drawn at those
+positions by neato -n, which does no layout.  This is most of the cost saved,
+and the periods' images stay in register with each other.  Files that cannot
+be drawn that way are rendered by dot as usual.
+"""
+    family, dot_fnames, ffmt, groups = job
+    begin = time()
+
+    rest = list(dot_fnames)
+    if groups:
+        pinned = dict()   # pinned copy -> DOT file
+        for group, layout in izip(groups, _layout(groups)):
+            if layout is None:
+                continue
+            for dot_fname in set(group).intersection(dot_fnames):
+                pinned_fname = _pin(dot_fname, layout)
+                if pinned_fname:
+                    pinned[pinned_fname] = dot_fname
+
+        pinned_fnames = sorted(pinned)
+        pinned_failed = _render_files(
+            ('neato', '-n'), pinned_fnames, ffmt,
+            [_image_name(pinned[p], ffmt) for p in pinned_fnames])
+        for pinned_fname in pinned_fnames:
+            os.remove(pinned_fname)
+        drawn = set(pinned.itervalues()).difference(
+            pinned[p] for p in pinned_failed)
+        rest = [dot_fname for dot_fname in dot_fnames if dot_fname not in drawn]
+
+    failed = list()
+    if rest:
+        failed = _render_files(('dot',), rest, ffmt,
+                               [_image_name(dot_fname, ffmt) for dot_fname in rest])
+
+    return family, dot_fnames, failed, time() - begin
+
+
+def _batches(dot_fnames, workers):
+    """\
+Split one family's DOT files (or layout groups) into render batches: large
+enough to spread the cost of starting dot, but at least a few per worker, so the
+workers finish together.
+"""
+    size = max(1, min(_max_batch, len(dot_fnames) // (workers * 4)))
+    return [dot_fnames[i:i + size] for i in xrange(0, len(dot_fnames), size)]
+
+
+def _render_jobs(family, dot_fnames, changed, ffmt, workers):
+    """\
+Return the render jobs (see _render) of one family: batches of its changed DOT
+files, and for the families of _layout_families, batches of whole layout
+groups (all of a group's files are laid out, though only the changed ones are
+rendered).
+"""
+    if family not in _layout_families:
+        return [(family, batch, ffmt, None) for batch in _batches(changed, workers)]
+
+    layout_name = _layout_families[family]
+    groups, names = dict(), list()
+    for dot_fname in dot_fnames:
+        name = layout_name(dot_fname)
+        if name not in groups:
+            groups[name] = list()
+            names.append(name)
+        groups[name].append(dot_fname)
+
+    changed = set(changed)
+    groups = [groups[name] for name in names if changed.intersection(groups[name])]
+    return [
+        (family, [f for group in batch for f in group if f in changed], ffmt, batch)
+        for batch in _batches(groups, workers)
+    ]
+
+
+def CreateModelDiagrams(M, options):
+    """\
+Write and render the Graphviz diagrams of the model instance M (and its loaded
+results) into the directory images_<first dot dat name>.  See
+CreateGraphDiagrams, which this calls, for the return value.
+"""
+    # This function is a "master", calling many other functions based on command
+    # line input.  Other than code cleanliness, there is no reason that the
+    # logic couldn't be in main()
+    from graph_model import GraphModel, InstanceValues
+    from temoa_lib import input_name
+
+    # if the user has listed more than one dot_dat, arbitrarily choose the first
+    # as the name of this run.
+    datname = input_name(options.dot_dat[0])
+
+    # The processes and flows every diagram needs, computed once: the workers
+    # share it through fork's copy-on-write (see graph_model).
+    graph = GraphModel.from_instance(M)
+    graph.load_results(InstanceValues(M))
+
+    return CreateGraphDiagrams(graph, "images_" + datname, options)
+
+
+def CreateGraphDiagrams(graph, images_dir, options):
+    """\
+Write and render the Graphviz diagrams of a GraphModel (the results diagrams
+only if it has results) into images_dir.  'options' holds graph_format and the
+other Graphviz options (see add_diagram_arguments).  Needs no model instance,
+so that a saved graph may be drawn later, elsewhere (see main).  Returns a list
+with one (family, images rendered, images unchanged, render seconds, DOT files
+that failed) tuple per diagram family.
+
+With options.graph_pages, each family is instead one DOT file and one image
+(in one of the PAGED_FORMATS) of one page per diagram, plus an index.html of
+the pages, so that the number of files does not grow with the model.
+
+The directory is kept from run to run: an image is rendered again only if its
+DOT text changed (or its format did), and the files of diagrams that are no
+longer generated are removed.
+"""
+    if not os.path.isdir(images_dir):
+        os.makedirs(images_dir)
+    cwd = os.getcwd()
+    os.chdir(images_dir)
+
+    for dname in _image_subdirs:
+        if not os.path.isdir(dname):
+            os.makedirs(dname)
+
+    kwargs = diagram_kwargs(graph, os.path.basename(os.path.normpath(images_dir)),
+                            options.graph_format.lower(), options)
+
+    families = [func.__name__ for func in gvizFunctions
+                if graph.has_results or func.__name__ not in _results_families]
+    ffmt = kwargs['image_format']
+    pages = getattr(options, 'graph_pages', False)
+    if pages and ffmt not in PAGED_FORMATS:
+        raise ValueError('--graph_pages needs a paged format (%s), not %s'
+                         % (', '.join(PAGED_FORMATS), ffmt))
+
+    # The workers are forked after this is set, so they share the graph
+    # rather than have it pickled to them.
+    global _kwargs
+    _kwargs = kwargs
+
+    pool = None
     if 'win' in sys.platform:
         msg = ('\n\nRunning in Windows ... Temoa is currently unable to use '
                'multiple processes.  Generating graphs will take a bit longer.'
                '\n')
         SE.write(msg)
-        for func in gvizFunctions:
-            func(**kwargs)
-
+        workers = 1
     else:
-        sem = MP.Semaphore(MP.cpu_count())
-
-        def do_work(func):
-            sem.acquire()
-            func(**kwargs)
-            sem.release()
+        import multiprocessing as MP
+
+        workers = MP.cpu_count()
+        pool = MP.Pool(workers)
+
+    try:
+        generate = pages and _generate_pages or _generate
+        if pool:
+            dot_files = dict(pool.imap_unordered(generate, families))
+        else:
+            dot_files = dict(imap(generate, families))
+        if pages:
+            dot_files = _write_pages(dot_files, ffmt)
+
+        generated = dict()   # DOT file name -> hash of its text
+        for family in families:
+            generated.update(dot_files[family])
+        extra = pages and (_pages_index,) or ()
+        last_format, last_hashes, last_extra = _read_manifest()
+        _remove_stale(generated, ffmt, extra, last_format, last_hashes, last_extra)
+
+        # Only render what changed since the last run
+        if last_format != ffmt:
+            last_hashes = dict()
+        changed = dict()
+        for family in families:
+            changed[family] = [
+                dot_fname for dot_fname, digest in dot_files[family]
+                if last_hashes.get(dot_fname) != digest
+                or not os.path.exists(_image_name(dot_fname, ffmt))
+            ]
+
+        jobs = list()
+        for family in families:
+            if pages:
+                if changed[family]:
+                    jobs.append((family, changed[family], ffmt, None))
+                continue
+            jobs.extend(_render_jobs(
+                family, [dot_fname for dot_fname, digest in dot_files[family]],
+                changed[family], ffmt, workers))
+        images = sum(len(changed[family]) for family in families)
+
+        render = pages and _render_pages or _render
+        if pool:
+            rendered = pool.imap_unordered(render, jobs)
+        else:
+            rendered = imap(render, jobs)
+
+        totals = dict(
+            (family, [0, len(dot_files[family]) - len(changed[family]), 0.0, []])
+            for family in families
+        )
+        done = 0
+        for family, dot_fnames, failed, seconds in rendered:
+            total = totals[family]
+            total[0] += len(dot_fnames) - len(failed)
+            total[2] += seconds
+            total[3].extend(failed)
+            for dot_fname in failed:
+                generated[dot_fname] = None   # so the next run tries it again
+            done += len(dot_fnames)
+            SE.write('\r[        ] Creating Temoa model diagrams: %d of %d '
+                     'images.' % (done, images))
+            SE.flush()
+
+        _write_manifest(ffmt, generated, extra)
+
+        if pool:
+            pool.close()
+            pool.join()
+    except:
+        if pool:
+            pool.terminate()
+        raise
+    finally:
+        _kwargs = None
+        os.chdir(cwd)
+
+    return [(family,) + tuple(totals[family]) for family in families]
+
+
+def add_diagram_arguments(parser, graph_format, pages=False):
+    """\
+Add the Graphviz options of the commands that draw diagrams to the argparse
+parser (or argument group): --graph_format (with the default graph_format;
+None draws no diagrams unless a format is given), --show_capacity,
+--graph_type, --use_splines, --graph_top, --graph_min_share, and, with pages,
+--graph_pages.  See check_diagram_arguments.
+"""
+    if graph_format is None:
+        default = 'do not draw diagrams'
+    else:
+        default = graph_format
+    parser.add_argument('--graph_format',
+                        help='The image format: any of the output formats of Graphviz '
+                        '(see dot -T?).  [Default: %s]' % default,
+                        dest='graph_format',
+                        default=graph_format)
+    parser.add_argument('--show_capacity',
+                        help='Choose whether or not the capacity shows up in the '
+                        'subgraphs.  [Default: not shown]',
+                        action='store_true',
+                        dest='show_capacity',
+                        default=False)
+    parser.add_argument('--graph_type',
+                        help='Choose the type of subgraph depiction desired.  '
+                        '[Default: separate_vintages]',
+                        dest='graph_type',
+                        choices=('explicit_vintages', 'separate_vintages'),
+                        default='separate_vintages')
+    parser.add_argument('--use_splines',
+                        help='Choose whether the subgraph edges needs to be straight or '
+                        'curved.  [Default: use straight lines, not splines]',
+                        action='store_true',
+                        dest='splinevar',
+                        default=False)
+    parser.add_argument('--graph_top',
+                        help='In the results diagram of each period, draw only the K '
+                        'largest flows, and sum the rest into one node for the other '
+                        'technologies.  [Default: draw every flow]',
+                        action='store',
+                        type=int,
+                        dest='graph_top',
+                        metavar='K',
+                        default=None)
+    parser.add_argument('--graph_min_share',
+                        help='In the results diagram of each period, draw only the flows '
+                        'of at least this fraction of the period\'s total flow, and sum '
+                        'the rest into one node for the other technologies.  [Default: '
+                        'draw every flow]',
+                        action='store',
+                        type=float,
+                        dest='graph_min_share',
+                        metavar='FRACTION',
+                        default=None)
+    if pages:
+        parser.add_argument('--graph_pages',
+                            help='Write each diagram family as one image with a page per '
+                            'diagram, and an index.html of the pages, instead of an image '
+                            'per diagram.  Needs a paged --graph_format (%s).  [Default: '
+                            'an image per diagram]' % ', '.join(PAGED_FORMATS),
+                            action='store_true',
+                            dest='graph_pages',
+                            default=False)
+
+
+def check_diagram_arguments(parser, options):
+    """\
+Check the parsed options of add_diagram_arguments, exiting through
+parser.error if --graph_pages is given without a paged --graph_format.
+"""
+    if getattr(options, 'graph_pages', False) and \
+       (options.graph_format or '').lower() not in PAGED_FORMATS:
+        parser.error('--graph_pages needs a paged --graph_format (%s)'
+                     % ', '.join(PAGED_FORMATS))
 
-        processes = [
-            MP.Process(target=do_work, args=(func,))
-            for func in gvizFunctions
-        ]
-        for p in processes:
-            p.start()
-        for p in processes:
-            p.join()
 
-    os.chdir('..')
+def add_results_arguments(parser):
+    """\
+Add the options of the commands that draw a saved graph which select the
+results to draw to the argparse parser: --solution and --db.
+"""
+    parser.add_argument('--solution',
+                        help='Draw the results of this --save_solution file.  [Default: '
+                        'the results saved with the graph]',
+                        action='store',
+                        dest='solution',
+                        metavar='FILE',
+                        default=None)
+    parser.add_argument('--db',
+                        help='Draw the results of RUN (a run name or id) in the results '
+                        'database DBFILE (see --results_db).  [Default: the results '
+                        'saved with the graph]',
+                        action='store',
+                        nargs=2,
+                        dest='db',
+                        metavar=('DBFILE', 'RUN'),
+                        default=None)
+
+
+def read_graph_results(parser, options):
+    """\
+Return the GraphModel of options.graph, with the results selected by the
+options of add_results_arguments: those of options.solution or options.db, or
+else those saved with the graph.  Errors in the options or the results exit
+through the argparse parser.
+"""
+    from graph_model import GRAPH_COMPONENTS, read_graph
+
+    if options.solution and options.db:
+        parser.error('--solution and --db are mutually exclusive')
+
+    graph = read_graph(options.graph)
+    try:
+        if options.solution:
+            from solution import read_solution
+
+            graph.load_results(read_solution(options.solution))
+        elif options.db:
+            from results_db import read_results_db
+
+            graph.load_results(read_results_db(options.db[0], options.db[1],
+                                               GRAPH_COMPONENTS, constraints=False))
+    except ValueError, e:
+        parser.exit(1, '%s\n' % e)
+    return graph
+
+
+def main(argv):
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        prog='temoa diagrams',
+        description='Draw the diagrams of a graph saved by --save_graph, without '
+        'the dot dat files or the model.  The results diagrams show the saved '
+        'results, or those of another solution of the same processes.')
+    parser.add_argument('graph',
+                        help='A GraphModel saved by the --save_graph option of a solve.')
+    add_results_arguments(parser)
+    parser.add_argument('--images_dir',
+                        help='The directory in which to write the diagrams.  [Default: '
+                        'images_<graph file name, without its extension>]',
+                        action='store',
+                        dest='images_dir',
+                        default=None)
+    add_diagram_arguments(parser, 'svg', pages=True)
+
+    options = parser.parse_args(argv)
+    check_diagram_arguments(parser, options)
+
+    graph = read_graph_results(parser, options)
+
+    images_dir = options.images_dir
+    if images_dir is None:
+        images_dir = 'images_' + os.path.splitext(os.path.basename(options.graph))[0]
+
+    begin = time()
+    SE.write('[        ] Creating Temoa model diagrams.')
+    SE.flush()
+    summary = CreateGraphDiagrams(graph, images_dir, options)
+    SE.write('\r[%8.2f\n' % (time() - begin))
+    for family, images, unchanged, seconds, failed in summary:
+        if images or unchanged:
+            SE.write('           %-34s %6d images  %8.2f s rendering  '
+                     '(%d unchanged)\n' % (family, images, seconds, unchanged))
+        for dot_fname in failed:
+            SE.write('           Graphviz failed to render %s\n' % dot_fname)
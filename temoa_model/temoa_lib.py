@@ -1,10 +1,8 @@
 from cStringIO import StringIO
 from itertools import product as cross_product
-from operator import itemgetter as iget
 from os import path
 from sys import argv, stderr as SE, stdout as SO
-
-from temoa_graphviz import CreateModelDiagrams
+from types import ModuleType
 
 try:
     from coopr.pyomo import *
@@ -163,6 +161,30 @@ def validate_SegFrac(M):
     # return tuple()
 
 
+def _fill_param(param, values):
+    """\
+Set the (index -> value) items of 'values' in the already constructed Param
+'param', in one update.  The indices and values are ones we know are valid, so
+for an immutable Param they go straight into its data; a mutable Param (or a
+Coopr without the _mutable flag) is filled through __setitem__.
+"""
+    if not values:
+        return
+
+    # Some hackery because Pyomo thinks that this Param is constructed.
+    # However, in our view, it is not yet, because we're specifically
+    # targeting values that have not yet been constructed, that we know are
+    # valid, and that we will need.
+    if getattr(param, '_mutable', True) is False:
+        param._data.update(values)
+        return
+
+    param._constructed = False
+    for index, val in values.iteritems():
+        param[index] = val
+    param._constructed = True
+
+
 def CreateDemands(M):
     # Steps to create the demand distributions
     # 1. Use Demand keys to ensure that all demands in commodity_demand are used
@@ -179,12 +201,10 @@ def CreateDemands(M):
     #    specify the distribution, or not.  No in-between.
     #
     # 5. Validate that the per-demand distributions sum to 1.
-
-    # Step 0: some setup for a couple of reusable items
-
-    # iget(2): 2 = magic number to specify the third column.  Currently the
-    # demand in the tuple (s, d, dem)
-    DSD_dem_getter = iget(2)
+    #
+    # Both distributions are worked on as plain dictionaries (the DSD grouped
+    # by demand), built with one pass over each Param, so that no step scans
+    # a Param once per demand or per slice.
 
     # Step 1
     used_dems = set(dem for p, dem in M.Demand.sparse_iterkeys())
@@ -196,32 +216,27 @@ def CreateDemands(M):
 
     # Step 2
     DDD = M.DemandDefaultDistribution   # Shorter, for us lazy programmer types
-    unset_defaults = set(M.SegFrac.sparse_iterkeys())
-    unset_defaults.difference_update(
-        DDD.sparse_iterkeys())
-    if unset_defaults:
-        # Some hackery because Pyomo thinks that this Param is constructed.
-        # However, in our view, it is not yet, because we're specifically
-        # targeting values that have not yet been constructed, that we know are
-        # valid, and that we will need.
-        DDD._constructed = False
-        for tslice in unset_defaults:
-            DDD[tslice] = M.SegFrac[tslice]
-        DDD._constructed = True
+    ddd = dict((tslice, value(val)) for tslice, val in DDD.sparse_iteritems())
+    unset_defaults = dict(
+        (tslice, value(val)) for tslice, val in M.SegFrac.sparse_iteritems()
+        if tslice not in ddd
+    )
+    _fill_param(DDD, unset_defaults)
+    ddd.update(unset_defaults)
 
     # Step 3
-    total = sum(i for i in DDD.itervalues())
+    total = sum(ddd.itervalues())
     if abs(float(total) - 1.0) > 1e-15:
         # We can't explicitly test for "!= 1.0" because of incremental roundoff
         # errors inherent in float manipulations and representations, so instead
         # compare against an epsilon value of "close enough".
 
-        key_padding = max(map(get_str_padding, DDD.sparse_iterkeys()))
+        key_padding = max(map(get_str_padding, ddd))
 
         format = "%%-%ds = %%s" % key_padding
             # Works out to something like "%-25s = %s"
 
-        items = sorted(DDD.items())
+        items = sorted(ddd.items())
         items = '\n   '.join(format % (str(k), v) for k, v in items)
 
         msg = ('The values of the DemandDefaultDistribution parameter do not '
@@ -235,39 +250,39 @@ def CreateDemands(M):
     # Step 4
     DSD = M.DemandSpecificDistribution
 
-    demands_specified = set(map(DSD_dem_getter,
-                           (i for i in DSD.sparse_iterkeys())))
-    unset_demand_distributions = used_dems.difference(demands_specified)
-    unset_distributions = set(
-        cross_product(M.time_season, M.time_of_day, unset_demand_distributions))
-
-    if unset_distributions:
-        # Some hackery because Pyomo thinks that this Param is constructed.
-        # However, in our view, it is not yet, because we're specifically
-        # targeting values that have not yet been constructed, that we know are
-        # valid, and that we will need.
-        DSD._constructed = False
-        for s, d, dem in unset_distributions:
-            DSD[s, d, dem] = DDD[s, d]
-        DSD._constructed = True
+    # demand -> {(s, d, dem): value}
+    dsd_by_dem = dict()
+    for (s, d, dem), val in DSD.sparse_iteritems():
+        dsd_by_dem.setdefault(dem, dict())[s, d, dem] = value(val)
+
+    unset_distributions = dict()
+    slices = tuple(cross_product(M.time_season, M.time_of_day))
+    for dem in used_dems.difference(dsd_by_dem):
+        # A slice without a default (nor a SegFrac) fails in DDD, as before
+        dist = dict(
+            ((s, d, dem), ddd[s, d] if (s, d) in ddd else value(DDD[s, d]))
+            for s, d in slices
+        )
+        unset_distributions.update(dist)
+        dsd_by_dem[dem] = dist
+    _fill_param(DSD, unset_distributions)
 
     # Step 5
     for dem in used_dems:
-        keys = (k for k in DSD.sparse_iterkeys() if DSD_dem_getter(k) == dem)
-        total = sum(DSD[i] for i in keys)
+        dist = dsd_by_dem[dem]
+        total = sum(dist.itervalues())
 
         if abs(float(total) - 1.0) > 1e-15:
             # We can't explicitly test for "!= 1.0" because of incremental roundoff
             # errors inherent in float manipulations and representations, so
             # instead compare against an epsilon value of "close enough".
 
-            keys = [k for k in DSD.sparse_iterkeys() if DSD_dem_getter(k) == dem]
-            key_padding = max(map(get_str_padding, keys))
+            key_padding = max(map(get_str_padding, dist))
 
             format = "%%-%ds = %%s" % key_padding
                     # Works out to something like "%-25s = %s"
 
-            items = sorted((k, DSD[k]) for k in keys)
+            items = sorted(dist.items())
             items = '\n   '.join(format % (str(k), v) for k, v in items)
 
             msg = ('The values of the DemandSpecificDistribution parameter do not '
@@ -1141,88 +1156,213 @@ This is the implementation of imat in the rest of the documentation.
 ###############################################################################
 # Miscellaneous routines
 
+def temoa_cache_dir():
+    """\
+Return the directory in which Temoa keeps its on-disk caches, creating it if
+necessary.  The location may be overridden with the TEMOA_CACHE_DIR environment
+variable; the default is ~/.temoa.
+"""
+    from os import environ, makedirs
+
+    cdir = environ.get('TEMOA_CACHE_DIR')
+    if not cdir:
+        cdir = path.join(path.expanduser('~'), '.temoa')
+    if not path.isdir(cdir):
+        try:
+            makedirs(cdir)
+        except OSError:
+            # another process may have just created it; anything else will
+            # surface when the cache is actually written.
+            pass
+
+    return cdir
+
+
+# Preferred solvers, in the order in which Temoa will choose a default
+g_preferredSolvers = ('cplex', 'gurobi', 'cbc', 'glpk')
+
+
+def input_name(fname):
+    """\
+The name of the input file or directory fname without its directory or
+suffix, e.g. 'utopia' for 'data/utopia.dat', 'utopia.sqlite', or
+'utopia.columns/'.
+"""
+    return path.splitext(path.basename(path.normpath(fname)))[0]
+
+
+def _solver_cache_file():
+    return path.join(temoa_cache_dir(), 'solvers.pickle')
+
+
+def _path_fingerprint():
+    """\
+Identify the solver executables findable on PATH: each PATH directory, with
+its modification time.  Installing (or removing) an executable in a directory
+changes the directory's modification time, so a changed fingerprint means the
+set of findable solvers may have changed.
+"""
+    from os import environ, pathsep, stat
+
+    fingerprint = list()
+    for dname in environ.get('PATH', '').split(pathsep):
+        try:
+            mtime = stat(dname).st_mtime
+        except OSError:
+            mtime = None    # missing now; it counts if it appears later
+        fingerprint.append((dname, mtime))
+    return tuple(fingerprint)
+
+
+def _load_solver_cache():
+    """\
+Return the dictionary of previously probed solvers (name -> boolean).  The
+cache is keyed on _path_fingerprint(): if PATH, or the contents of one of its
+directories, has changed since the cache was written, the set of findable
+solver executables may have changed as well, so the cache is considered stale
+and an empty dictionary is returned.
+"""
+    from cPickle import load
+
+    try:
+        with open(_solver_cache_file(), 'rb') as f:
+            cache = load(f)
+    except Exception:
+        # missing, unreadable, or from an incompatible version: just re-probe
+        return dict()
+
+    if cache.get('PATH') != _path_fingerprint():
+        return dict()
+
+    return cache.get('solvers', dict())
+
+
+def _save_solver_cache(solvers):
+    from cPickle import dump, HIGHEST_PROTOCOL
+    from os import getpid, rename
+
+    fname = _solver_cache_file()
+    tmpname = '%s.%d' % (fname, getpid())
+    cache = {'PATH': _path_fingerprint(), 'solvers': solvers}
+    try:
+        with open(tmpname, 'wb') as f:
+            dump(cache, f, HIGHEST_PROTOCOL)
+        rename(tmpname, fname)   # atomic, so concurrent runs never see a partial file
+    except (IOError, OSError):
+        pass    # a missing cache only costs a probe; not worth dying over
+
+
+def solver_available(solver, cache=None):
+    """\
+Return a boolean (True or False) whether Coopr can find and use 'solver'.
+
+Probing a solver starts a subprocess, so the answer, either way, is cached on
+disk (see _load_solver_cache) and only probed again once the executables on
+PATH may have changed.  Pass a dictionary as 'cache' to check several solvers
+while reading and writing the cache only once.
+"""
+    from coopr.opt import SolverFactory as SF
+    from pyutilib.component.core import PluginGlobals
+
+    save = cache is None
+    if save:
+        cache = _load_solver_cache()
+
+    if solver not in cache:
+        logger = PluginGlobals.env().log
+        logger.disabled = True  # no need for warnings: it's what we're testing!
+        try:
+            opt = SF(solver)
+            cache[solver] = bool(opt and opt.available(False))
+        except Exception:
+            cache[solver] = False
+        finally:
+            logger.disabled = False
+
+        if save:
+            _save_solver_cache(cache)
+
+    return cache[solver]
+
+
+def find_default_solver():
+    """\
+Return the name of the first available solver, preferring those listed in
+g_preferredSolvers.  Solvers are probed one at a time, and only until one is
+found, so a typical invocation probes exactly one solver (and a cached
+invocation none at all).  Returns 'NONE' if Coopr finds no suitable solver.
+"""
+    from coopr.opt import SolverFactory as SF
+
+    registered = sorted(s for s in SF.services() if '_' != s[0])
+    candidates = [s for s in g_preferredSolvers if s in registered]
+    candidates.extend(s for s in registered if s not in g_preferredSolvers)
+
+    cache = _load_solver_cache()
+    known = len(cache)
+    default_solver = 'NONE'
+    for solver in candidates:
+        if solver_available(solver, cache):
+            default_solver = solver
+            break
+
+    if len(cache) != known:
+        _save_solver_cache(cache)
+
+    return default_solver
+
+
 def parse_args():
     import argparse
 
     from coopr.opt import SolverFactory as SF
-    from pyutilib.component.core import PluginGlobals
 
-    logger = PluginGlobals.env().log
-    logger.disabled = True  # no need for warnings: it's what we're testing!
-    available_solvers = set(solver   # name of solver; a string
-                            for solver in filter(lambda x: '_' != x[0], SF.services())
-                            if SF(solver).available(False)
-                            )
-    logger.disabled = False
-
-    if available_solvers:
-        if 'cplex' in available_solvers:
-            default_solver = 'cplex'
-        elif 'gurobi' in available_solvers:
-            default_solver = 'gurobi'
-        elif 'cbc' in available_solvers:
-            default_solver = 'cbc'
-        elif 'glpk' in available_solvers:
-            default_solver = 'glpk'
-        else:
-            default_solver = available_solvers[0]
-    else:
-        default_solver = 'NONE'
-        SE.write('\nNOTICE: Coopr did not find any suitable solvers.  Temoa will '
-                 'not be able to solve any models.  If you need help, ask on the '
-                 'Temoa Project forum: http://temoaproject.org/\n\n')
+    from temoa_graphviz import add_diagram_arguments, check_diagram_arguments
+    from utils import RESULTS_FORMATS
 
     parser = argparse.ArgumentParser()
     graphviz = parser.add_argument_group('Graphviz Options')
     solver = parser.add_argument_group('Solver Options')
+    output = parser.add_argument_group('Output Options')
 
     parser.add_argument('dot_dat',
                         type=str,
                         nargs='+',
                         help='AMPL-format data file(s) with which to create a model instance. '
-                        'e.g. "data.dat"'
+                        'e.g. "data.dat".  SQLite input databases (e.g. "data.sqlite") and '
+                        'columnar input directories (e.g. "data.columns") may be given as '
+                        'well; see the "convert" command.'
                         )
 
-    graphviz.add_argument('--graph_format',
-                          help='Create a system-wide visual depiction of the model.  The '
-                          'available options are the formats available to Graphviz.  To get '
-                          'a list of available formats, use the "dot" command: dot -Txxx. '
-                          '[Default: None]',
+    parser.add_argument('--input_filter',
+                        help='Read from input databases and columnar input directories only '
+                        'the rows whose COLUMN (e.g., '
+                        'period or tech) is one of the listed values.  May be specified '
+                        'multiple times.  [Default: read everything]',
+                        action='append',
+                        dest='input_filters',
+                        metavar='COLUMN=VALUE[,VALUE...]',
+                        default=[])
+
+    add_diagram_arguments(graphviz, None, pages=True)
+
+    graphviz.add_argument('--save_graph',
+                          help='Save the processes and flows of the run to FILE, for the '
+                          '"view" command, which renders its diagrams on demand.  '
+                          '[Default: do not save]',
                           action='store',
-                          dest='graph_format',
+                          dest='save_graph',
+                          metavar='FILE',
                           default=None)
 
-    graphviz.add_argument('--show_capacity',
-                          help='Choose whether or not the capacity shows up in the subgraphs.  '
-                          '[Default: not shown]',
-                          action='store_true',
-                          dest='show_capacity',
-                          default=False)
-
-    graphviz.add_argument('--graph_type',
-                          help='Choose the type of subgraph depiction desired.  [Default: '
-                          'separate_vintages]',
-                          action='store',
-                          dest='graph_type',
-                          choices=('explicit_vintages', 'separate_vintages'),
-                          default='separate_vintages')
-
-    graphviz.add_argument('--use_splines',
-                          help='Choose whether the subgraph edges needs to be straight or curved.'
-                          '  [Default: use straight lines, not splines]',
-                          action='store_true',
-                          dest='splinevar',
-                          default=False)
-
     solver.add_argument('--solver',
                         help="Which backend solver to use.  See 'pyomo --help-solvers' for a list "
-                        'of solvers with which Coopr can interface.  The list shown here is '
-                        'what Coopr can currently find on this system.  [Default: {}]'
-                        .format(default_solver),
+                        'of solvers with which Coopr can interface.  Only the requested solver '
+                        'is probed for availability.  [Default: the first available of {}]'
+                        .format(', '.join(g_preferredSolvers)),
                         action='store',
-                        choices=sorted(available_solvers),
                         dest='solver',
-                        default=default_solver)
+                        default=None)
 
     solver.add_argument('--symbolic_solver_labels',
                         help='When interfacing with the solver, use model-derived symbol names.  '
@@ -1251,9 +1391,168 @@ def parse_args():
                         dest='keepPyomoLP',
                         default=False)
 
+    solver.add_argument('--no_cache',
+                        help='Always parse the dot_dat files and solve, rather than reusing '
+                        'the cached parse of unchanged files and the cached results of an '
+                        'earlier solve of the same data, model, and solver.  The caches '
+                        'live in TEMOA_CACHE_DIR (default ~/.temoa); solver results are '
+                        'bounded to TEMOA_SOLUTION_CACHE_MB megabytes.  [Default: use the '
+                        'caches]',
+                        action='store_true',
+                        dest='no_cache',
+                        default=False)
+
+    output.add_argument('--results_format',
+                        help='Format in which to write the solution.  "txt" is the space '
+                        'delimited results.txt; "csv" and "npy" are columnar, written per '
+                        'component in bulk.  [Default: txt]',
+                        action='store',
+                        dest='results_format',
+                        choices=RESULTS_FORMATS,
+                        default='txt')
+
+    output.add_argument('--results_file',
+                        help='File (or, for "npy", directory) to which to write the '
+                        'solution.  [Default: results.txt, results.csv, or results_npy]',
+                        action='store',
+                        dest='results_file',
+                        default=None)
+
+    output.add_argument('--skip_zero_results',
+                        help='Do not write variables and constraints with a value of zero.  '
+                        '[Default: write all values]',
+                        action='store_true',
+                        dest='skip_zero_results',
+                        default=False)
+
+    output.add_argument('--skip_results_component',
+                        help='Name of a Var or Constraint not to write.  May be given '
+                        'multiple times.  [Default: write all components]',
+                        action='append',
+                        dest='skip_results_components',
+                        metavar='COMPONENT',
+                        default=[])
+
+    output.add_argument('--results_db',
+                        help='Also record the solution as a new run in this SQLite database '
+                        '(created if necessary), for querying across many runs.  '
+                        '[Default: do not use a results database]',
+                        action='store',
+                        dest='results_db',
+                        metavar='DBFILE',
+                        default=None)
+
+    output.add_argument('--run_name',
+                        help='Label under which to record this run in the results database.  '
+                        '[Default: the base name of the first dot_dat file]',
+                        action='store',
+                        dest='run_name',
+                        default=None)
+
+    output.add_argument('--save_solution',
+                        help='Also save the solution values (and reduced costs and duals) '
+                        'to this file, as arrays that later tools may read without the '
+                        'model or the dot_dat files.  [Default: do not save]',
+                        action='store',
+                        dest='save_solution',
+                        metavar='FILE',
+                        default=None)
+
+    output.add_argument('--solution_component',
+                        help='Save only this Var or Constraint to the --save_solution '
+                        'file.  May be specified multiple times.  [Default: save all '
+                        'components]',
+                        action='append',
+                        dest='solution_components',
+                        metavar='COMPONENT',
+                        default=[])
+
+    output.add_argument('--timeseries',
+                        help='Also write V_FlowIn, V_FlowOut, and V_Activity as dense '
+                        '(key x season x time_of_day) .npy arrays, with their keys and '
+                        'slice order, into this directory.  [Default: do not write]',
+                        action='store',
+                        dest='timeseries',
+                        metavar='DIR',
+                        default=None)
+
+    output.add_argument('--cost_breakdown',
+                        help='Also write the loan, fixed, and marginal costs of every '
+                        '(period, tech, vintage), discounted and undiscounted, to this '
+                        'CSV file.  [Default: do not write]',
+                        action='store',
+                        dest='cost_breakdown',
+                        metavar='FILE',
+                        default=None)
+
     options = parser.parse_args()
+
+    check_diagram_arguments(parser, options)
+
+    # Solver discovery happens only now, after argv is parsed (so that --help
+    # and argument errors are instant), and probes only what is needed.
+    if options.solver is None:
+        options.solver = find_default_solver()
+        if 'NONE' == options.solver:
+            SE.write('\nNOTICE: Coopr did not find any suitable solvers.  Temoa will '
+                     'not be able to solve any models.  If you need help, ask on the '
+                     'Temoa Project forum: http://temoaproject.org/\n\n')
+
+    elif options.solver not in SF.services():
+        parser.error("unknown solver '{}'.  See 'pyomo --help-solvers' for a list "
+                     'of solvers with which Coopr can interface.'.format(options.solver))
+
+    elif not solver_available(options.solver):
+        SE.write("\nWarning: Coopr is unable to find the solver '{}' on this "
+                 'system.\n\n'.format(options.solver))
+
     return options
 
+
+class _LazyModelModule(ModuleType):
+    """\
+Stand-in for a model module (see lazy_model_module) that creates the module's
+'model' attribute the first time it is requested.
+"""
+
+    def __init__(self, module, create):
+        ModuleType.__init__(self, module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+
+        # Python 2 clears the globals of a module object when it is garbage
+        # collected, which would break every function defined in it.  Keep
+        # the original alive.
+        self._lazy_module = module
+        self._lazy_create = create
+
+    def __getattr__(self, name):
+        # Only called when normal attribute lookup fails.
+        if 'model' != name:
+            raise AttributeError("'%s' module has no attribute '%s'"
+                                 % (self.__name__, name))
+
+        model = self._lazy_create()
+        self.model = model
+        self._lazy_module.model = model
+        return model
+
+
+def lazy_model_module(module_name, create):
+    """\
+Replace the already-imported module 'module_name' with an equivalent module
+whose 'model' attribute is created by calling 'create()' on first access.
+
+Declaring the abstract Temoa model is not free, and many importers (graphing
+and results tools, worker processes) only need the helper functions that live
+alongside it.  Both "from temoa_model import model" and Coopr's own
+"getattr(module, 'model')" continue to work unchanged.
+"""
+    from sys import modules
+
+    module = modules[module_name]
+    if not isinstance(module, _LazyModelModule):
+        modules[module_name] = _LazyModelModule(module, create)
+
 # End miscellaneous routines
 ###############################################################################
 
@@ -1274,7 +1573,9 @@ def temoa_solve(model_data):
     from time import clock
 
     from coopr.opt import SolverFactory, SolverManagerFactory
-    from coopr.pyomo import ModelData
+    from dat_cache import read_dat_files
+    from input_columns import is_columnar
+    from input_db import INPUT_DB_SUFFIXES, parse_filters
     from utils import results_writer
     from pformat_results import pformat_results
 
@@ -1289,7 +1590,7 @@ def temoa_solve(model_data):
         opt.keepFiles = options.keepPyomoLP
         opt.generateSymbolicLabels = options.useSymbolLabels
         if options.generateSolverLP:
-            opt.options.wlp = path.basename(options.dot_dat[0])[:-4] + '.lp'
+            opt.options.wlp = input_name(options.dot_dat[0]) + '.lp'
             SE.write('\nSolver will write file: {}\n\n'.format(opt.options.wlp))
 
     elif options.solver != 'NONE':
@@ -1303,13 +1604,20 @@ def temoa_solve(model_data):
     begin = clock()
     duration = lambda: clock() - begin
 
-    mdata = ModelData()
     for f in dot_dats:
-        if f[-4:] != '.dat':
-            msg = "\n\nExpecting a dot dat (e.g., data.dat) file, found '{}'\n"
+        if not (f[-4:] == '.dat' or f.lower().endswith(INPUT_DB_SUFFIXES)
+                or is_columnar(f)):
+            msg = ("\n\nExpecting a dot dat (e.g., data.dat) file, an input "
+                   "database (e.g., data.sqlite), or a columnar input directory "
+                   "(e.g., data.columns), found '{}'\n")
             raise SystemExit(msg.format(f))
-        mdata.add(f)
-    mdata.read(model_data.model)
+    # Unchanged files are read from the parse cache; see dat_cache
+    try:
+        filters = parse_filters(options.input_filters)
+    except ValueError, e:
+        raise SystemExit('\n\n' + str(e))
+    mdata = read_dat_files(model_data.model, dot_dats,
+                           use_cache=not options.no_cache, filters=filters)
     SE.write('\r[%8.2f\n' % duration())
 
     SE.write('[        ] Creating Temoa model instance.')
@@ -1320,11 +1628,24 @@ def temoa_solve(model_data):
 
     SE.write('[        ] Solving.')
     SE.flush()
-    if opt:
+    fingerprint = cached = None
+    if not options.no_cache:
+        from solve_cache import cached_results, solve_fingerprint, store_results
+
+        fingerprint = solve_fingerprint(dot_dats, model_data.model, options)
+        cached = cached_results(fingerprint)
+
+    if cached is not None:
+        model_data.result = cached
+        SE.write('\r[%8.2f] Solving: reused the cached results of an identical '
+                 'run.\n' % duration())
+    elif opt:
         model_data.result = solver_manager.solve(model_data.instance, opt=opt, tee=tee,
                                   suffixes=['dual', 'rc'])
 		# result = opt.solve(instance)
         SE.write('\r[%8.2f\n' % duration())
+        if fingerprint:
+            store_results(fingerprint, model_data.result, model_data.instance)
     else:
         SE.write('\r---------- Not solving: no available solver\n')
         raise SystemExit
@@ -1332,18 +1653,79 @@ def temoa_solve(model_data):
     SE.write('[        ] Formatting results.')
     SE.flush()
     # ... print the easier-to-read/parse format
-    results_writer(model_data.result, model_data.instance)
+    results_writer(model_data.result, model_data.instance,
+                   file=options.results_file,
+                   fmt=options.results_format,
+                   skip_zero=options.skip_zero_results,
+                   skip_components=options.skip_results_components)
+    if options.results_db:
+        from results_db import write_results_db
+
+        run_name = options.run_name or input_name(dot_dats[0])
+        write_results_db(options.results_db, model_data.result,
+                         model_data.instance, dot_dats=dot_dats,
+                         solver=options.solver, name=run_name,
+                         skip_zero=options.skip_zero_results,
+                         skip_components=options.skip_results_components)
+    if (options.save_solution or options.timeseries or options.cost_breakdown
+            or options.save_graph):
+        from solution import model_results
+
+        # Translate the solver's labels once, rather than in each load_solution
+        solution_results = model_results(model_data.instance, model_data.result)
+    if options.save_solution:
+        from solution import load_solution, save_solution
+
+        sol = load_solution(model_data.instance, solution_results,
+                            components=options.solution_components or None)
+        save_solution(sol, options.save_solution)
+    if options.timeseries:
+        from solution import load_solution
+        from timeseries import TIMESERIES_COMPONENTS, slice_axes, write_timeseries
+
+        sol = load_solution(model_data.instance, solution_results,
+                            components=TIMESERIES_COMPONENTS)
+        seasons, times_of_day, segfrac = slice_axes(model_data.instance)
+        write_timeseries(options.timeseries, sol, seasons, times_of_day, segfrac)
+    if options.cost_breakdown:
+        from cost_breakdown import attribute_costs, cost_coefficients, \
+            write_cost_breakdown
+        from solution import load_solution
+
+        coefficients = cost_coefficients(model_data.instance)
+        sol = load_solution(model_data.instance, solution_results,
+                            components=set(c.variable for c in coefficients))
+        write_cost_breakdown(options.cost_breakdown,
+                             attribute_costs(coefficients, sol))
+    if options.save_graph:
+        from graph_model import GRAPH_COMPONENTS, GraphModel, save_graph
+        from solution import load_solution
+
+        graph = GraphModel.from_instance(model_data.instance)
+        graph.load_results(load_solution(model_data.instance, solution_results,
+                                         components=GRAPH_COMPONENTS))
+        save_graph(graph, options.save_graph)
     # updated_results = instance.update_results(result)
     # formatted_results = pformat_results(instance, updated_results)
     SE.write('\r[%8.2f\n' % duration())
     # SO.write(formatted_results)
 
     if options.graph_format:
+        # Graphviz support (and its multiprocessing machinery) is only loaded
+        # when diagrams are actually requested.
+        from temoa_graphviz import CreateModelDiagrams
+
         SE.write('[        ] Creating Temoa model diagrams.')
         SE.flush()
-        instance.load(result)
-        CreateModelDiagrams(instance, options)
+        # results_writer has already loaded the solution into the instance
+        summary = CreateModelDiagrams(model_data.instance, options)
         SE.write('\r[%8.2f\n' % duration())
+        for family, images, unchanged, seconds, failed in summary:
+            if images or unchanged:
+                SE.write('           %-34s %6d images  %8.2f s rendering  '
+                         '(%d unchanged)\n' % (family, images, seconds, unchanged))
+            for dot_fname in failed:
+                SE.write('           Graphviz failed to render %s\n' % dot_fname)
 
     if not (SO.isatty() or SE.isatty()):
         SO.write("\n\nNotice: You are not receiving 'standard error' messages."
@@ -303,7 +303,8 @@ def temoa_create_model_container(model):
     return model_data
 
 
-model = temoa_create_model()
+# The model itself is only declared when first used; see lazy_model_module
+lazy_model_module(__name__, temoa_create_model)
 
 
 if '__main__' == __name__:
@@ -314,5 +315,5 @@ if '__main__' == __name__:
 
     # Calling this script directly enables a cleaner formatting than Pyomo's
     # default output, but (currently) forces the choice of solver to GLPK.
-    model_data = temoa_create_model_container(model)
+    model_data = temoa_create_model_container(temoa_create_model())
     temoa_solve(model_data)
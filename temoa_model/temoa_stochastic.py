@@ -62,9 +62,17 @@ TODO: update with LaTeX version of equation.
 def Objective_rule(M):
     return sum(M.StochasticPointCost[pp] for pp in M.time_optimize)
 
-M = model = temoa_create_model('TEMOA Stochastic')
 
-M.StochasticPointCost = Var(M.time_optimize, within=NonNegativeReals)
-M.StochasticPointCostConstraint = Constraint(M.time_optimize, rule=StochasticPointObjective_rule)
+def temoa_create_stochastic_model(name='TEMOA Stochastic'):
+    M = temoa_create_model(name)
 
-M.TotalCost = Objective(rule=Objective_rule, sense=minimize)
+    M.StochasticPointCost = Var(M.time_optimize, within=NonNegativeReals)
+    M.StochasticPointCostConstraint = Constraint(M.time_optimize, rule=StochasticPointObjective_rule)
+
+    M.TotalCost = Objective(rule=Objective_rule, sense=minimize)
+
+    return M
+
+
+# PySP asks for 'model'; it is only declared then.  See lazy_model_module
+lazy_model_module(__name__, temoa_create_stochastic_model)
@@ -0,0 +1,116 @@
+"""\
+Dense time-series export of the time-sliced variables.
+
+V_FlowOut, V_FlowIn, and V_Activity are indexed by season and time of day, but
+the solver (and so the results files) report them as one sparse element per
+slice.  Dispatch plots and grid studies instead want, per (period, tech,
+vintage, ...) key, a dense season x time_of_day grid.  write_timeseries pivots
+each component into a float64 array of shape (keys, seasons, times of day) and
+writes it as <component>.npy, which numpy.load may memory-map
+(mmap_mode='r'), so that arr[k] is one contiguous read.  Alongside are
+<component>.keys, the tab separated key of each row, and timeseries.json, which
+records the slice order and the SegFrac of each slice:
+
+  {"seasons": [...], "times_of_day": [...], "segfrac": [[...], ...],
+   "components": {"V_FlowOut": {"dims": ["period", "tech", ...],
+                                "shape": [n, ns, nd]}, ...}}
+
+Slices with no solution value (e.g., a zero flow left out of the solution) are
+zero.
+"""
+
+__all__ = ('TIMESERIES_COMPONENTS', 'dense_timeseries', 'slice_axes',
+           'write_timeseries')
+
+from array import array
+
+from results_schema import COMPONENT_INDICES, DIMENSION_COLUMNS
+
+TIMESERIES_COMPONENTS = ('V_FlowIn', 'V_FlowOut', 'V_Activity')
+
+_letter_column = dict(DIMENSION_COLUMNS)
+
+
+def slice_axes(instance):
+    """\
+Return (seasons, times_of_day, segfrac) of a model instance: the two sorted
+slice axes, and the SegFrac of each slice as a list of rows, one per season.
+This is the slice order write_timeseries uses.
+"""
+    from coopr.pyomo import value
+
+    seasons = sorted(instance.time_season)
+    times_of_day = sorted(instance.time_of_day)
+    segfrac = [[value(instance.SegFrac[s, d]) for d in times_of_day]
+               for s in seasons]
+
+    return seasons, times_of_day, segfrac
+
+
+def dense_timeseries(cv, seasons, times_of_day):
+    """\
+Pivot the solution.ComponentValues 'cv' of a time-sliced component into a dense
+array.  Returns (keys, data), where keys are the sorted index tuples without
+the season and time of day, and data is an array('d') of shape (len(keys),
+len(seasons), len(times_of_day)) in row-major order.
+"""
+    letters = COMPONENT_INDICES[cv.name]
+    s_pos, d_pos = letters.index('s'), letters.index('d')
+    rest = [pos for pos in range(len(letters)) if pos not in (s_pos, d_pos)]
+
+    key_of = lambda index: tuple(index[pos] for pos in rest)
+    keys = sorted(set(key_of(index) for index in cv.keys))
+
+    n_s, n_d = len(seasons), len(times_of_day)
+    row = dict((key, n * n_s * n_d) for n, key in enumerate(keys))
+    slice_offset = dict(
+        ((s, d), i * n_d + j)
+        for i, s in enumerate(seasons)
+        for j, d in enumerate(times_of_day)
+    )
+
+    data = array('d', (0.0,)) * (len(keys) * n_s * n_d)
+    for index, val in zip(cv.keys, cv.values):
+        if val != val:    # NaN: no value reported
+            continue
+        data[row[key_of(index)] + slice_offset[index[s_pos], index[d_pos]]] = val
+
+    return keys, data
+
+
+def write_timeseries(dname, sol, seasons, times_of_day, segfrac=None,
+                     components=TIMESERIES_COMPONENTS):
+    """\
+Write the dense time series of the named components of the
+solution.SolutionArrays 'sol' into the directory dname (created if
+necessary).  See slice_axes for the axes and segfrac of a model instance.
+"""
+    import json
+    import os
+
+    from utils import write_npy_array
+
+    if not os.path.isdir(dname):
+        os.makedirs(dname)
+
+    meta = dict(seasons=seasons, times_of_day=times_of_day, segfrac=segfrac,
+                components=dict())
+
+    for name in components:
+        if name not in sol:
+            continue
+        keys, data = dense_timeseries(sol[name], seasons, times_of_day)
+        shape = (len(keys), len(seasons), len(times_of_day))
+        base = os.path.join(dname, name)
+
+        write_npy_array(base + '.npy', data, shape)
+        with open(base + '.keys', 'w') as f:
+            f.writelines('\t'.join(str(i) for i in key) + '\n' for key in keys)
+
+        meta['components'][name] = dict(
+            dims=[_letter_column[l] for l in COMPONENT_INDICES[name]
+                  if l not in 'sd'],
+            shape=shape)
+
+    with open(os.path.join(dname, 'timeseries.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
@@ -1,12 +1,285 @@
 
-__all__ = ['results_writer']
+__all__ = ['results_writer', 'component_arrays', 'has_reduced_costs', 'write_npy',
+           'write_npy_array', 'read_npy']
 #import sys
 #import time
 import types
+from array import array
 from coopr.pyomo import *
+from os import path
+from struct import pack
+from sys import byteorder
 
+# The output formats results_writer understands.  'txt' is the original space
+# delimited format; 'csv' and 'npy' are columnar and written in bulk.
+RESULTS_FORMATS = ('txt', 'csv', 'npy')
 
-def results_writer(results, instance, file=None, mode='w'):
+_inf = float('inf')
+_nan = float('nan')
+
+
+def _float(val, default=_nan):
+    if val is None:
+        return default
+    return float(val)
+
+
+def has_reduced_costs(instance):
+    """\
+Return a boolean (True or False) whether the solver returned reduced costs:
+whether any Var component of the instance has the Rc suffix.  Loading a
+solution declares the suffix on a component when any of its elements receives
+a reduced cost, so this is checked per component, never per element.
+"""
+    for v in instance.active_components(Var):
+        if getattr(instance, v).suffix_defined('Rc'):
+            return True
+    return False
+
+
+def component_arrays(component, ctype, has_rc=False, skip_zero=False):
+    """\
+Pull the values of one Var or Constraint component into columns.
+
+Returns (names, indices, lower, value, upper, extra), where names and indices
+are lists of element names and index tuples (None for a singleton component),
+and the other four are array('d') columns of the same length.  'extra'
+holds the reduced cost (Var) or the dual (Constraint).  Unavailable numbers are
+NaN; missing bounds are -inf/+inf.  With skip_zero, elements whose value is
+(effectively) zero are left out.
+"""
+    names, indices = [], []
+    lower, val, upper, extra = array('d'), array('d'), array('d'), array('d')
+
+    # Whether this component has reduced costs is known from the component;
+    # the elements it has none for read as None (NaN)
+    rc = has_rc and Var is ctype and component.suffix_defined('Rc')
+
+    if type(component.index) is types.NoneType:
+        items = ((None, component),)
+    else:
+        items = component.iteritems()
+
+    for index, item in items:
+        if Var is ctype:
+            v = _float(item.value)
+            lb, ub = item.lb, item.ub
+            x = _float(component.get_suffix_value('Rc', index)) if rc else _nan
+        else:
+            v = _float(item.body())
+            lb = item.lower() if item.lower is not None else None
+            ub = item.upper() if item.upper is not None else None
+            x = _float(item.dual)
+
+        if skip_zero and not abs(v) > 1e-15:   # "not >" so NaN is skipped
+            continue
+
+        names.append(item.name)
+        indices.append(index)
+        lower.append(_float(lb, -_inf))
+        val.append(v)
+        upper.append(_float(ub, _inf))
+        extra.append(x)
+
+    return names, indices, lower, val, upper, extra
+
+
+# array typecode -> .npy descr
+_npy_descr = {'d': '<f8', 'i': '<i4'}
+
+
+def _npy_header(shape, fortran_order, typecode='d'):
+    header = "{'descr': '%s', 'fortran_order': %s, 'shape': (%s), }" % (
+        _npy_descr[typecode], fortran_order, ''.join('%d, ' % n for n in shape))
+    # magic (6) + version (2) + header length (2) + header must align to 16
+    header += ' ' * (15 - (10 + len(header)) % 16) + '\n'
+    return '\x93NUMPY\x01\x00' + pack('<H', len(header)) + header
+
+
+def write_npy(fname, columns, mode='w'):
+    """\
+Write equal-length array('d') columns as a 2-D float64 array (one column per
+item in columns) in NumPy's .npy format, so that the result may be loaded or
+memory-mapped with numpy.load, without needing NumPy to write it.
+"""
+    nrows = columns and len(columns[0]) or 0
+    data = array('d')
+    for col in columns:
+        data.extend(col)
+    # Column-major ("Fortran") order lets each column be copied in one go.
+    write_npy_array(fname, data, (nrows, len(columns)), mode, fortran_order=True)
+
+
+def write_npy_array(fname, data, shape, mode='w', fortran_order=False):
+    """\
+Write the array('d') (or array('i')) 'data', holding the elements of an array
+of the given shape in row-major (C) order (or column-major, with
+fortran_order), in NumPy's .npy format.  'data' itself is left unchanged
+(on big-endian machines, a byte-swapped copy is written).
+"""
+    if 'big' == byteorder:
+        data = array(data.typecode, data)
+        data.byteswap()
+
+    with open(fname, mode + 'b') as f:
+        f.write(_npy_header(shape, fortran_order, data.typecode))
+        data.tofile(f)
+
+
+def _c_order(data, shape):
+    """\
+Reorder the elements of a column-major array of the given shape into
+row-major order.  The elements with first index i are every shape[0]th one
+from offset i, forming the column-major array of shape[1:].
+"""
+    if len(shape) < 2:
+        return data
+    n = shape[0]
+    reordered = array(data.typecode)
+    for i in xrange(n):
+        reordered.extend(_c_order(data[i::n], shape[1:]))
+    return reordered
+
+
+def read_npy(fname):
+    """\
+Read a float64 or int32 .npy file (such as write_npy_array and write_npy write)
+into an array('d') or array('i'), without needing NumPy.  The file is
+memory-mapped, so its contents are copied only once, straight into the array.
+Returns (data, shape), with data in row-major (C) order, whatever the file's
+order.
+"""
+    from ast import literal_eval
+    from mmap import mmap, ACCESS_READ
+    from struct import unpack
+
+    typecodes = dict((descr, code) for code, descr in _npy_descr.iteritems())
+
+    with open(fname, 'rb') as f:
+        if 0 == path.getsize(fname):
+            raise ValueError("Empty file '%s' is not a .npy file" % fname)
+        mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+        try:
+            if '\x93NUMPY' != mm[:6]:
+                raise ValueError("'%s' is not a .npy file" % fname)
+            hlen, = unpack('<H', mm[8:10])
+            header = literal_eval(mm[10:10 + hlen])
+            if header['descr'] not in typecodes:
+                msg = "Unsupported .npy layout in '%s': %s"
+                raise ValueError(msg % (fname, header))
+            data = array(typecodes[header['descr']])
+            data.fromstring(buffer(mm, 10 + hlen))
+        finally:
+            mm.close()
+
+    if 'big' == byteorder:
+        data.byteswap()
+    if header['fortran_order']:
+        data = _c_order(data, header['shape'])
+    return data, header['shape']
+
+
+def _write_txt(fp, instance, has_rc, skip_zero, skip_components):
+    def bound(x, inf):
+        return x is None and inf or x
+
+    # Variables
+    for v in instance.active_components(Var):
+        if v in skip_components:
+            continue
+        varobject = getattr(instance, v)
+        lines = [
+            '',
+            "\"Variable: %s\", \"Notes: %s\"" % (v, varobject.doc),
+            "\"%s\" LOWER VALUE UPPER REDUCED-COST" % v,
+        ]
+        # Special condition for singleton Variable which has no index
+        if type(varobject.index) is types.NoneType:
+            items = ((None, v, varobject),)
+        else:
+            items = ((index, varobject[index].name, varobject[index])
+                     for index in sorted(varobject.keys()))
+        var_rc = has_rc and varobject.suffix_defined('Rc')
+
+        for index, name, item in items:
+            if skip_zero and not abs(item.value or 0) > 1e-15:
+                continue
+            rc = varobject.get_suffix_value('Rc', index) if var_rc else None
+            lines.append("\"%s\" %s %s %s %s" % (
+                name, bound(item.lb, '-INF'), item.value,
+                bound(item.ub, '+INF'), 'NaN' if rc is None else rc))
+        fp.write('\n'.join(lines))
+        fp.write('\n')
+
+    # Constraints (duals, if available)
+    for c in instance.active_components(Constraint):
+        if c in skip_components:
+            continue
+        cobject = getattr(instance, c)
+        lines = [
+            '',
+            "\"Constraint: %s\", \"Notes: %s\"" % (c, cobject.doc),
+            "\"%s\" LOWER VALUE UPPER DUAL" % c,
+        ]
+        # Special condition for singleton Constraint which has no index
+        if cobject.index is None:
+            items = ((cobject.name, cobject[None]),)
+        else:
+            items = ((cobject[index].name, cobject[index])
+                     for index in sorted(cobject.keys()))
+
+        for name, item in items:
+            body = item.body()
+            if skip_zero and not abs(body or 0) > 1e-15:
+                continue
+            lines.append("\"%s\" %s %s %s %s" % (
+                name,
+                item.lower is None and '-INF' or item.lower(),
+                body,
+                item.upper is None and '+INF' or item.upper(),
+                item.dual))
+        fp.write('\n'.join(lines))
+        fp.write('\n')
+
+
+def _write_csv(fp, instance, has_rc, skip_zero, skip_components):
+    from csv import writer
+
+    out = writer(fp)
+    out.writerow(('type', 'component', 'name', 'lower', 'value', 'upper',
+                  'rc_or_dual'))
+    for kind, ctype in (('var', Var), ('con', Constraint)):
+        for c in instance.active_components(ctype):
+            if c in skip_components:
+                continue
+            names, indices, lower, val, upper, extra = component_arrays(
+                getattr(instance, c), ctype, has_rc, skip_zero)
+            n = len(names)
+            out.writerows(zip([kind] * n, [c] * n, names, lower, val, upper, extra))
+
+
+def _write_npy(dname, instance, has_rc, skip_zero, skip_components):
+    import os
+
+    if not os.path.isdir(dname):
+        os.makedirs(dname)
+
+    for ctype in (Var, Constraint):
+        for c in instance.active_components(ctype):
+            if c in skip_components:
+                continue
+            names, indices, lower, val, upper, extra = component_arrays(
+                getattr(instance, c), ctype, has_rc, skip_zero)
+            base = os.path.join(dname, c)
+            # columns: lower, value, upper, rc (Var) or dual (Constraint)
+            write_npy(base + '.npy', (lower, val, upper, extra))
+            with open(base + '.names', 'w') as f:
+                f.write('\n'.join(names))
+                f.write('\n')
+
+
+def results_writer(results, instance, file=None, mode='w', fmt='txt',
+                   skip_zero=False, skip_components=()):
     """\
 results_writer is  a function that writes the results of solve process for the
 temoa models.
@@ -19,14 +292,44 @@ instance, results returned by the solver and prints the
 4. Constraints [lower bound, value, upper bound, dual (if available)]
 in space delimited format. FILE is the name of the output file.
 MODE is write mode: 'w' (write) or 'a' (append). The defaults are:
-(FILE: results.txt, MODE: 'w')\
+(FILE: results.txt, MODE: 'w')
+
+FMT selects the output format (see RESULTS_FORMATS):
+  'txt' - the space delimited format described above
+  'csv' - one row per element: type, component, name, lower, value, upper,
+          and reduced cost or dual.  Only the variables and constraints are
+          written.  (FILE default: results.csv)
+  'npy' - FILE is a directory (default: results_npy) that receives, per
+          component, a <name>.npy float64 array with the columns lower, value,
+          upper, and reduced cost or dual, plus a <name>.names file listing the
+          element names in row order.
+SKIP_ZERO leaves out elements with a (effectively) zero value, and
+SKIP_COMPONENTS is a collection of Var and Constraint names not to write.\
     """
+    if fmt not in RESULTS_FORMATS:
+        msg = "Unknown results format '%s'.  Known formats: %s"
+        raise ValueError(msg % (fmt, ', '.join(RESULTS_FORMATS)))
+
+    instance.load(results)
+    skip_components = set(skip_components)
+    # Whether the solver returned reduced costs is checked once, up front.
+    has_rc = has_reduced_costs(instance)
+
+    if 'npy' == fmt:
+        _write_npy(file or 'results_npy', instance, has_rc, skip_zero,
+                   skip_components)
+        return
+
+    if 'csv' == fmt:
+        with open(file or 'results.csv', mode + 'b') as fp:
+            _write_csv(fp, instance, has_rc, skip_zero, skip_components)
+        return
+
     if file is not None:
         fp = open(file, mode)
     else:
         fp = open('results.txt', mode)
 
-    instance.load(results)
     print >>fp, '\"', instance.name, '\"'
     print >>fp, '\"Model Documentation: ', instance.doc, '\"'
     print >>fp, '\"Solver Summary\"'
@@ -43,59 +346,6 @@ MODE is write mode: 'w' (write) or 'a' (append). The defaults are:
 # which does not return objective values. We evaluate the Objective
 # expression instead.
     print >>fp, "\"Value: %s\"" % (obj[obj.keys()[0]][None].expr())
-    # Variables
-    for v in instance.active_components(Var):
-        varobject = getattr(instance, v)
-        print >> fp, ""
-        print >> fp, "\"Variable: %s\", \"Notes: %s\"" % (v, varobject.doc)
-        print >> fp, "\"" + v + "\"", 'LOWER', 'VALUE', 'UPPER', 'REDUCED-COST'
-    # Special condition for singleton Variable which has no index
-        if type(varobject.index) is types.NoneType:
-            print>>fp, "\"" + v + "\"", varobject.lb is None and '-INF' or varobject.lb, \
-                varobject.value, varobject.ub is None and '+INF' or varobject.ub,
-# FIXME: check if solver returned reduced cost. THIS IS EXPENSIVE: SHOULD CHECK ONLY ONCE!!
-            try:
-                print >> fp, varobject.get_suffix_value('Rc')
-            except KeyError:
-                print >> fp, 'NaN'
-        else:
-            keys = sorted(varobject.keys())
-            for index in keys:
-                print >> fp, "\"" + varobject[index].name + "\"", \
-                    varobject[index].lb is None and '-INF' or varobject[index].lb, \
-                    varobject[index].value, varobject[index].ub is None and '+INF' or varobject[index].ub,
-# FIXME: check if solver returned reduced cost. THIS IS EXPENSIVE: SHOULD CHECK ONLY ONCE!!
-                try:
-                    print >> fp, varobject[index].get_suffix_value('Rc')
-                except KeyError:
-                    print >> fp, 'NaN'
 
-    # Constraints (duals, if available)
-#    print >> fp, "\n\nConstraints\n"
-    for c in instance.active_components(Constraint):
-        cobject = getattr(instance, c)
-        print >> fp, ""
-        print >> fp, "\"Constraint: %s\", \"Notes: %s\"" % (c, cobject.doc)
-        print >> fp, "\"" + c + "\"", 'LOWER', 'VALUE', 'UPPER', 'DUAL'
-    # Special condition for singleton Constraint which has no index
-#        if type(cobject.index()) is dict and cobject.index().keys()[0] is None:
-        if cobject.index is None:
-            print >> fp, "\"" + cobject.name + "\"", \
-                cobject.lower() is None and '-INF' or cobject.lower(), \
-                cobject.body(), \
-                cobject[None].upper is None and '+INF' or cobject[None].upper(), \
-                cobject[None].dual
-            #print "singleton"
-            #print "\"" + cobject.name + "\"", \
-            #cobject.lower() is None and '-INF' or cobject.lower(), \
-            #cobject.body(), \
-            #cobject[None].upper is None and '+INF' or cobject[None].upper(), \
-            #cobject[None].dual
-        else:
-            keys = sorted(cobject.keys())
-            for index in keys:
-                print >> fp, "\"" + cobject[index].name + "\"", \
-                cobject[index].lower is None and '-INF' or cobject[index].lower(), \
-                cobject[index].body(), \
-                cobject[index].upper is None and '+INF' or cobject[index].upper(), \
-                cobject[index].dual
+    _write_txt(fp, instance, has_rc, skip_zero, skip_components)
+    fp.close()